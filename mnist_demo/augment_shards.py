@@ -0,0 +1,176 @@
+# ABOUTME: Materializes epochs of augmented training samples into packed-bit shards keyed by augmentation settings.
+# ABOUTME: The trainer streams shards through memmaps so runs sharing augmentation settings skip augmenting entirely.
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+import json
+from pathlib import Path
+import sys
+from typing import Protocol
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from mnist_demo.mnist_tools import IMAGE_PIXELS
+from mnist_demo.mnist_tools import PACKED_IMAGE_BYTES
+
+
+SHARD_VERSION = 2
+SHARD_MANIFEST_FILE = "augment_shards.json"
+SHARD_CHUNK_SAMPLES = 4096
+
+
+class AugmentedSource(Protocol):
+    def __len__(self) -> int: ...
+
+    def augmentation_key(self) -> str: ...
+
+    def item_labels(self, epoch: int | None = None) -> np.ndarray: ...
+
+    def get_batch(self, indices: Sequence[int], epoch: int | None = None) -> tuple[torch.Tensor, torch.Tensor]: ...
+
+
+def shard_epoch_file(epoch: int) -> str:
+    return f"epoch_{epoch:04d}_bits_u8.bin"
+
+
+def shard_labels_file(epoch: int) -> str:
+    # Stochastic sampling deals different base samples each epoch, so labels are stored per epoch too.
+    return f"epoch_{epoch:04d}_labels_u8.bin"
+
+
+_worker_source: AugmentedSource | None = None
+
+
+def _init_shard_worker(source: AugmentedSource) -> None:
+    global _worker_source
+    _worker_source = source
+
+
+def _write_shard_chunk(source: AugmentedSource, shard_dir: Path, epoch: int, start: int, stop: int) -> None:
+    features, _ = source.get_batch(range(start, stop), epoch=epoch)
+    packed = np.packbits(features.numpy() > 0.5, axis=1, bitorder="little")
+    shard = np.memmap(shard_dir / shard_epoch_file(epoch), dtype=np.uint8, mode="r+", shape=(len(source), PACKED_IMAGE_BYTES))
+    shard[start:stop] = packed
+    shard.flush()
+
+
+def _write_shard_chunk_in_worker(shard_dir: Path, epoch: int, start: int, stop: int) -> None:
+    assert _worker_source is not None
+    _write_shard_chunk(_worker_source, shard_dir, epoch, start, stop)
+
+
+def materialize_augment_shards(
+    source: AugmentedSource,
+    shard_root: Path,
+    epochs: int,
+    *,
+    jobs: int = 1,
+) -> dict[str, object]:
+    if epochs <= 0:
+        raise ValueError("epochs must be positive")
+    if jobs <= 0:
+        raise ValueError("jobs must be positive")
+
+    samples = len(source)
+    shard_dir = shard_root / source.augmentation_key()
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    (shard_dir / SHARD_MANIFEST_FILE).unlink(missing_ok=True)
+
+    for epoch in range(epochs):
+        source.item_labels(epoch).astype(np.uint8).tofile(shard_dir / shard_labels_file(epoch))
+        with (shard_dir / shard_epoch_file(epoch)).open("wb") as handle:
+            handle.truncate(samples * PACKED_IMAGE_BYTES)
+
+    chunks = [
+        (epoch, start, min(start + SHARD_CHUNK_SAMPLES, samples))
+        for epoch in range(epochs)
+        for start in range(0, samples, SHARD_CHUNK_SAMPLES)
+    ]
+    if jobs == 1:
+        for epoch, start, stop in chunks:
+            _write_shard_chunk(source, shard_dir, epoch, start, stop)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_shard_worker, initargs=(source,)) as pool:
+            for result in [pool.submit(_write_shard_chunk_in_worker, shard_dir, *chunk) for chunk in chunks]:
+                result.result()
+
+    manifest = {
+        "augmentation_key": source.augmentation_key(),
+        "epochs": epochs,
+        "packed_bytes": PACKED_IMAGE_BYTES,
+        "samples": samples,
+        "shard_version": SHARD_VERSION,
+    }
+    # Written last, so a shard directory without a manifest is an interrupted run.
+    (shard_dir / SHARD_MANIFEST_FILE).write_text(json.dumps(manifest, indent=2, sort_keys=True) + "\n", encoding="ascii")
+    return manifest
+
+
+class MaterializedAugmentDataset(Dataset[tuple[torch.Tensor, torch.Tensor]]):
+    def __init__(self, shard_root: Path, augmentation_key: str) -> None:
+        self.shard_dir = shard_root / augmentation_key
+        manifest_path = self.shard_dir / SHARD_MANIFEST_FILE
+        if not manifest_path.is_file():
+            raise ValueError(f"no materialized augmentation shards at {self.shard_dir}")
+        manifest = json.loads(manifest_path.read_text(encoding="ascii"))
+        if manifest.get("shard_version") != SHARD_VERSION or manifest.get("augmentation_key") != augmentation_key:
+            raise ValueError(f"{manifest_path} does not describe shards for key {augmentation_key}")
+
+        self.samples = int(manifest["samples"])
+        self.epochs = int(manifest["epochs"])
+        self._shards: dict[int, np.ndarray] = {}
+        self._labels: dict[int, np.ndarray] = {}
+        self._epoch = torch.zeros((), dtype=torch.int64).share_memory_()
+
+    @property
+    def epoch(self) -> int:
+        return int(self._epoch)
+
+    def set_epoch(self, epoch: int) -> None:
+        epoch = max(0, int(epoch))
+        if epoch >= self.epochs:
+            raise ValueError(f"only {self.epochs} epochs were materialized, epoch {epoch} requested")
+        self._epoch.fill_(epoch)
+
+    def __len__(self) -> int:
+        return self.samples
+
+    def _shard(self, epoch: int) -> np.ndarray:
+        if epoch not in self._shards:
+            self._shards[epoch] = np.memmap(
+                self.shard_dir / shard_epoch_file(epoch),
+                dtype=np.uint8,
+                mode="r",
+                shape=(self.samples, PACKED_IMAGE_BYTES),
+            )
+        return self._shards[epoch]
+
+    def _epoch_labels(self, epoch: int) -> np.ndarray:
+        if epoch not in self._labels:
+            self._labels[epoch] = np.memmap(
+                self.shard_dir / shard_labels_file(epoch),
+                dtype=np.uint8,
+                mode="r",
+                shape=(self.samples,),
+            )
+        return self._labels[epoch]
+
+    def get_batch(self, indices: Sequence[int], epoch: int | None = None) -> tuple[torch.Tensor, torch.Tensor]:
+        index_array = np.asarray(indices, dtype=np.int64)
+        epoch = self.epoch if epoch is None else epoch
+        bits = np.unpackbits(self._shard(epoch)[index_array], axis=1, count=IMAGE_PIXELS, bitorder="little")
+        return torch.from_numpy(bits.astype(np.float32)), torch.from_numpy(self._epoch_labels(epoch)[index_array].astype(np.int64))
+
+    def __getitems__(self, indices: list[int]) -> tuple[torch.Tensor, torch.Tensor]:
+        return self.get_batch(indices)
+
+    def __getitem__(self, index: int) -> tuple[torch.Tensor, torch.Tensor]:
+        features, labels = self.get_batch([index])
+        return features[0], labels[0]
@@ -3,6 +3,13 @@
 
 from __future__ import annotations
 
+from collections.abc import Sequence
+
+import numpy as np
+
+from mnist_demo.mnist_tools import FRAME_HEADER
+from mnist_demo.mnist_tools import PACKED_IMAGE_BYTES
+
 
 def _line_cells(start: tuple[int, int], stop: tuple[int, int]) -> list[tuple[int, int]]:
     row0, col0 = start
@@ -51,3 +58,154 @@ def stroke_cells(
                 if 0 <= brush_row < rows and 0 <= brush_col < cols:
                     cells.add((brush_row, brush_col))
     return cells
+
+
+def _segment_line_cells(starts: np.ndarray, stops: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Closed form of _line_cells: the longer axis (columns on ties) advances every step and
+    # the other axis sits at floor((2 * k * minor + major - 1) / (2 * major)).
+    deltas = stops - starts
+    lengths = np.abs(deltas)
+    steps = np.where(deltas < 0, -1, 1)
+    col_major = lengths[:, 1] >= lengths[:, 0]
+    major = lengths.max(axis=1)
+    minor = lengths.min(axis=1)
+
+    counts = major + 1
+    segment = np.repeat(np.arange(starts.shape[0]), counts)
+    k = np.arange(segment.shape[0]) - np.repeat(np.cumsum(counts) - counts, counts)
+    major_k = major[segment]
+    minor_k = ((2 * k * minor[segment]) + np.maximum(major_k - 1, 0)) // np.maximum(2 * major_k, 1)
+
+    along_minor = col_major[segment]
+    rows = starts[segment, 0] + (steps[segment, 0] * np.where(along_minor, minor_k, k))
+    cols = starts[segment, 1] + (steps[segment, 1] * np.where(along_minor, k, minor_k))
+    return rows, cols
+
+
+def rasterize_segments(
+    starts: Sequence[tuple[int, int]] | np.ndarray,
+    stops: Sequence[tuple[int, int]] | np.ndarray,
+    radius: int,
+    shape: tuple[int, int],
+) -> np.ndarray:
+    rows, cols = shape
+    if rows <= 0 or cols <= 0:
+        raise ValueError("rows and cols must be positive")
+    if radius < 0:
+        raise ValueError("radius must be non-negative")
+
+    start_array = np.asarray(starts, dtype=np.int64).reshape(-1, 2)
+    stop_array = np.asarray(stops, dtype=np.int64).reshape(-1, 2)
+    if start_array.shape != stop_array.shape:
+        raise ValueError("starts and stops must have the same length")
+
+    # Centers up to radius cells off the canvas still reach it, so mark them on a padded grid.
+    padded = np.zeros((rows + (2 * radius), cols + (2 * radius)), dtype=bool)
+    line_rows, line_cols = _segment_line_cells(start_array, stop_array)
+    line_rows += radius
+    line_cols += radius
+    inside = (line_rows >= 0) & (line_rows < padded.shape[0]) & (line_cols >= 0) & (line_cols < padded.shape[1])
+    padded[line_rows[inside], line_cols[inside]] = True
+
+    if radius == 0:
+        return padded
+    # Separable square max filter: spread along columns, then along rows.
+    spread = np.zeros((padded.shape[0], cols), dtype=bool)
+    for offset in range(2 * radius + 1):
+        spread |= padded[:, offset:offset + cols]
+    mask = np.zeros((rows, cols), dtype=bool)
+    for offset in range(2 * radius + 1):
+        mask |= spread[offset:offset + rows]
+    return mask
+
+
+def rasterize_polyline(
+    points: Sequence[tuple[int, int]] | np.ndarray,
+    radius: int,
+    shape: tuple[int, int],
+) -> np.ndarray:
+    point_array = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+    if point_array.shape[0] == 0:
+        raise ValueError("points must not be empty")
+    if point_array.shape[0] == 1:
+        return rasterize_segments(point_array, point_array, radius, shape)
+    return rasterize_segments(point_array[:-1], point_array[1:], radius, shape)
+
+
+CANVAS_SIDE = 28
+
+
+# Live drawing surface: one int bitmask per row (bit c is column c) plus the LSB-first packed
+# payload, its XOR checksum, and the set of payload bytes changed since the last emit.
+class Canvas:
+    _brush_rows: dict[int, list[int]] = {}
+
+    def __init__(self) -> None:
+        self.rows = [0] * CANVAS_SIDE
+        self._payload = bytearray(PACKED_IMAGE_BYTES)
+        self.checksum = 0
+        self._dirty: set[int] = set()
+
+    @classmethod
+    def _brush(cls, radius: int) -> list[int]:
+        # Row mask of a brush centered on column c, stored at index c + radius and clipped to the canvas.
+        if radius not in cls._brush_rows:
+            width = (1 << ((2 * radius) + 1)) - 1
+            limit = (1 << CANVAS_SIDE) - 1
+            cls._brush_rows[radius] = [
+                ((width << (col - radius)) if col >= radius else (width >> (radius - col))) & limit
+                for col in range(-radius, CANVAS_SIDE + radius)
+            ]
+        return cls._brush_rows[radius]
+
+    def _set_row(self, row: int, mask: int) -> None:
+        diff = self.rows[row] ^ mask
+        if not diff:
+            return
+        self.rows[row] = mask
+
+        bit_offset = row * CANVAS_SIDE
+        shifted = diff << bit_offset
+        first = (bit_offset + (diff & -diff).bit_length() - 1) // 8
+        last = (bit_offset + diff.bit_length() - 1) // 8
+        for index in range(first, last + 1):
+            changed = (shifted >> (8 * index)) & 0xFF
+            if changed:
+                self._payload[index] ^= changed
+                self.checksum ^= changed
+                self._dirty.add(index)
+
+    def clear(self) -> None:
+        for row in range(CANVAS_SIDE):
+            self._set_row(row, 0)
+
+    def draw_stroke(self, start: tuple[int, int], stop: tuple[int, int], *, radius: int) -> None:
+        if radius < 0:
+            raise ValueError("radius must be non-negative")
+
+        brush = self._brush(radius)
+        updates: dict[int, int] = {}
+        for row, col in _line_cells(start, stop):
+            if col < -radius or col >= CANVAS_SIDE + radius:
+                continue
+            bits = brush[col + radius]
+            for brush_row in range(max(row - radius, 0), min(row + radius + 1, CANVAS_SIDE)):
+                updates[brush_row] = updates.get(brush_row, 0) | bits
+        for row, bits in updates.items():
+            self._set_row(row, self.rows[row] | bits)
+
+    @property
+    def payload(self) -> bytes:
+        return bytes(self._payload)
+
+    def bits(self) -> list[int]:
+        return [(self.rows[row] >> col) & 1 for row in range(CANVAS_SIDE) for col in range(CANVAS_SIDE)]
+
+    def frame(self) -> bytes:
+        self._dirty.clear()
+        return FRAME_HEADER + bytes(self._payload) + bytes([self.checksum])
+
+    def pop_delta(self) -> list[tuple[int, int]]:
+        delta = [(index, self._payload[index]) for index in sorted(self._dirty)]
+        self._dirty.clear()
+        return delta
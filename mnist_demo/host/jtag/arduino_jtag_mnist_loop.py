@@ -30,9 +30,8 @@ DEFAULT_SYSTEM_CONSOLE = "/mnt/c/altera_lite/25.1std/quartus/sopc_builder/bin/sy
 if str(REPO_ROOT) not in sys.path:
     sys.path.insert(0, str(REPO_ROOT))
 
-from mnist_demo.mnist_tools import FRAME_BYTES
-from mnist_demo.mnist_tools import FRAME_HEADER
-from mnist_demo.mnist_tools import parse_uart_frame
+from mnist_demo.mnist_tools import FrameDecoder
+from mnist_demo.mnist_tools import unpack_binary_image
 
 
 def discover_serial_port() -> str | None:
@@ -47,28 +46,6 @@ def open_serial(port: str, baud: int, timeout_s: float = 0.1) -> serial.Serial:
     return serial.Serial(port=port, baudrate=baud, timeout=timeout_s)
 
 
-def pop_next_frame(buffer: bytearray) -> list[int] | None:
-    while True:
-        header_index = buffer.find(FRAME_HEADER)
-        if header_index < 0:
-            if len(buffer) > len(FRAME_HEADER):
-                del buffer[:-len(FRAME_HEADER)]
-            return None
-
-        if header_index > 0:
-            del buffer[:header_index]
-
-        if len(buffer) < FRAME_BYTES:
-            return None
-
-        frame = bytes(buffer[:FRAME_BYTES])
-        del buffer[:FRAME_BYTES]
-        try:
-            return parse_uart_frame(frame)
-        except ValueError:
-            del buffer[:1]
-
-
 def write_bits_file(bits: list[int], path: Path) -> None:
     lines = [str(int(bit)) for bit in bits]
     path.write_text("\n".join(lines) + "\n", encoding="ascii")
@@ -388,6 +365,12 @@ def build_arg_parser() -> argparse.ArgumentParser:
     parser.add_argument("--auto-program", action="store_true")
     parser.add_argument("--no-persistent-mmio", action="store_true")
     parser.add_argument("--once", action="store_true")
+    parser.add_argument(
+        "--capture-file",
+        type=Path,
+        default=None,
+        help="append the raw serial stream to this file (replay with mnist_tools.parse_uart_capture)",
+    )
     return parser
 
 
@@ -414,6 +397,10 @@ def main() -> int:
 
     serial_retry_count = 0
     frame_count = 0
+    capture = None
+    if args.capture_file is not None:
+        args.capture_file.parent.mkdir(parents=True, exist_ok=True)
+        capture = args.capture_file.open("ab")
 
     while True:
         port = args.serial_port or discover_serial_port()
@@ -433,7 +420,7 @@ def main() -> int:
 
         print(f"[serial] connected {port} @ {args.baud}")
         serial_retry_count = 0
-        frame_buffer = bytearray()
+        frame_decoder = FrameDecoder()
 
         try:
             while True:
@@ -445,14 +432,11 @@ def main() -> int:
 
                 if not chunk:
                     continue
+                if capture is not None:
+                    capture.write(chunk)
 
-                frame_buffer.extend(chunk)
-
-                while True:
-                    bits = pop_next_frame(frame_buffer)
-                    if bits is None:
-                        break
-
+                for payload in frame_decoder.feed(chunk):
+                    bits = unpack_binary_image(payload)
                     frame_count += 1
                     write_bits_file(bits, bits_file)
 
@@ -478,6 +462,13 @@ def main() -> int:
                         return 0
         finally:
             serial_link.close()
+            if capture is not None:
+                capture.flush()
+            counters = frame_decoder.counters()
+            print(
+                "[serial] decoder "
+                + " ".join(f"{name}={value}" for name, value in counters.items())
+            )
 
         time.sleep(args.reconnect_delay_s)
 
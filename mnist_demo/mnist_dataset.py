@@ -0,0 +1,207 @@
+# ABOUTME: Loads MNIST once from local IDX/npz files (or OpenML as a last resort) into a memory-mapped uint8 cache.
+# ABOUTME: The trainer and dataset exporters open the cache in milliseconds without a network connection.
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+from pathlib import Path
+import sys
+
+import numpy as np
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from mnist_demo.mnist_tools import IMAGE_PIXELS
+
+
+MNIST_TRAIN_SAMPLES = 60000
+MNIST_TEST_SAMPLES = 10000
+MNIST_SAMPLES = MNIST_TRAIN_SAMPLES + MNIST_TEST_SAMPLES
+MNIST_CACHE_ENV = "MNIST_DEMO_DATA_DIR"
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent / "data" / "mnist"
+CACHE_VERSION = 1
+PIXELS_FILE = "mnist_pixels_u8.bin"
+LABELS_FILE = "mnist_labels_u8.bin"
+MANIFEST_FILE = "mnist_cache.json"
+IDX_FILES = (
+    ("train-images-idx3-ubyte", "train-labels-idx1-ubyte"),
+    ("t10k-images-idx3-ubyte", "t10k-labels-idx1-ubyte"),
+)
+NPZ_FILE = "mnist.npz"
+IDX_DTYPES = {
+    0x08: np.dtype(np.uint8),
+    0x09: np.dtype(np.int8),
+    0x0B: np.dtype(">i2"),
+    0x0C: np.dtype(">i4"),
+    0x0D: np.dtype(">f4"),
+    0x0E: np.dtype(">f8"),
+}
+
+
+def default_cache_dir() -> Path:
+    configured = os.environ.get(MNIST_CACHE_ENV, "")
+    return Path(configured) if configured else DEFAULT_CACHE_DIR
+
+
+def read_idx(path: Path) -> np.ndarray:
+    raw = gzip.decompress(path.read_bytes()) if path.suffix == ".gz" else path.read_bytes()
+    if len(raw) < 4 or raw[0] != 0 or raw[1] != 0:
+        raise ValueError(f"{path} is not an IDX file")
+    if raw[2] not in IDX_DTYPES:
+        raise ValueError(f"{path} uses unsupported IDX type 0x{raw[2]:02x}")
+
+    dtype = IDX_DTYPES[raw[2]]
+    dims = raw[3]
+    header_bytes = 4 + (4 * dims)
+    shape = tuple(int(size) for size in np.frombuffer(raw, dtype=">u4", count=dims, offset=4))
+    data = np.frombuffer(raw, dtype=dtype, offset=header_bytes)
+    if data.size != int(np.prod(shape)):
+        raise ValueError(f"{path} holds {data.size} values, header declares {shape}")
+    return data.reshape(shape)
+
+
+def _find_idx(source_dir: Path, stem: str) -> Path | None:
+    for name in (stem, f"{stem}.gz", stem.replace("-idx", ".idx"), f"{stem.replace('-idx', '.idx')}.gz"):
+        if (source_dir / name).is_file():
+            return source_dir / name
+    return None
+
+
+def _checked_split(images: np.ndarray, labels: np.ndarray, samples: int, source: str) -> tuple[np.ndarray, np.ndarray]:
+    images = images.reshape(images.shape[0], -1)
+    if images.shape != (samples, IMAGE_PIXELS) or labels.shape != (samples,):
+        raise ValueError(f"{source} has shape {images.shape}/{labels.shape}, expected ({samples}, {IMAGE_PIXELS})")
+    if images.dtype != np.uint8 and (images.min() < 0 or images.max() > 255 or np.any(images != np.round(images))):
+        raise ValueError(f"{source} pixels are not 0..255 integers")
+    return images.astype(np.uint8), labels.astype(np.uint8)
+
+
+def load_mnist_source(source_dir: Path | None = None) -> tuple[np.ndarray, np.ndarray, str]:
+    if source_dir is not None:
+        idx_paths = [(_find_idx(source_dir, images), _find_idx(source_dir, labels)) for images, labels in IDX_FILES]
+        if all(images is not None and labels is not None for images, labels in idx_paths):
+            splits = [
+                _checked_split(read_idx(images), read_idx(labels), samples, str(images))
+                for (images, labels), samples in zip(idx_paths, (MNIST_TRAIN_SAMPLES, MNIST_TEST_SAMPLES))
+            ]
+            return np.concatenate([splits[0][0], splits[1][0]]), np.concatenate([splits[0][1], splits[1][1]]), "idx"
+
+        if (source_dir / NPZ_FILE).is_file():
+            with np.load(source_dir / NPZ_FILE) as archive:
+                train = _checked_split(archive["x_train"], archive["y_train"], MNIST_TRAIN_SAMPLES, NPZ_FILE)
+                test = _checked_split(archive["x_test"], archive["y_test"], MNIST_TEST_SAMPLES, NPZ_FILE)
+            return np.concatenate([train[0], test[0]]), np.concatenate([train[1], test[1]]), "npz"
+
+    try:
+        from sklearn.datasets import fetch_openml
+    except ImportError as import_error:
+        raise RuntimeError(
+            "no local MNIST IDX or npz files found and scikit-learn is unavailable for the OpenML fallback"
+        ) from import_error
+
+    features, labels = fetch_openml(
+        "mnist_784",
+        version=1,
+        as_frame=False,
+        return_X_y=True,
+        parser="liac-arff",
+    )
+    images, labels = _checked_split(np.asarray(features), np.asarray(labels).astype(np.int64), MNIST_SAMPLES, "openml")
+    return images, labels, "openml"
+
+
+def _digest(pixels: np.ndarray, labels: np.ndarray) -> str:
+    digest = hashlib.sha256()
+    digest.update(memoryview(np.ascontiguousarray(pixels)).cast("B"))
+    digest.update(memoryview(np.ascontiguousarray(labels)).cast("B"))
+    return digest.hexdigest()
+
+
+def build_mnist_cache(cache_dir: Path | None = None, source_dir: Path | None = None) -> dict[str, object]:
+    cache_dir = cache_dir or default_cache_dir()
+    pixels, labels, source = load_mnist_source(source_dir if source_dir is not None else cache_dir)
+
+    # Everything is written into a staging directory beside the cache and renamed into place with
+    # the manifest last, so an interrupted build never leaves a manifest next to partial arrays.
+    # The cache directory itself may hold the IDX/npz sources, so files are moved, not the folder.
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    staging = cache_dir / f".{MANIFEST_FILE}.{os.getpid()}.partial"
+    staging.mkdir(exist_ok=True)
+    pixels.tofile(staging / PIXELS_FILE)
+    labels.tofile(staging / LABELS_FILE)
+    manifest = {
+        "cache_version": CACHE_VERSION,
+        "image_pixels": IMAGE_PIXELS,
+        "samples": MNIST_SAMPLES,
+        "sha256": _digest(pixels, labels),
+        "source": source,
+        "test_samples": MNIST_TEST_SAMPLES,
+        "train_samples": MNIST_TRAIN_SAMPLES,
+    }
+    (staging / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2, sort_keys=True) + "\n", encoding="ascii")
+
+    (cache_dir / MANIFEST_FILE).unlink(missing_ok=True)
+    for name in (PIXELS_FILE, LABELS_FILE, MANIFEST_FILE):
+        (staging / name).replace(cache_dir / name)
+    staging.rmdir()
+    return manifest
+
+
+def open_mnist_cache(cache_dir: Path | None = None, *, verify: bool = False) -> tuple[np.ndarray, np.ndarray, dict[str, object]]:
+    cache_dir = cache_dir or default_cache_dir()
+    manifest = json.loads((cache_dir / MANIFEST_FILE).read_text(encoding="ascii"))
+    if manifest.get("cache_version") != CACHE_VERSION:
+        raise ValueError(f"{cache_dir / MANIFEST_FILE} has unsupported cache version {manifest.get('cache_version')}")
+
+    samples = int(manifest["samples"])
+    if manifest.get("image_pixels") != IMAGE_PIXELS or samples != MNIST_SAMPLES:
+        raise ValueError(f"{cache_dir / MANIFEST_FILE} describes {samples}x{manifest.get('image_pixels')} images, rebuild the MNIST cache")
+    for name, expected_bytes in ((PIXELS_FILE, samples * IMAGE_PIXELS), (LABELS_FILE, samples)):
+        actual_bytes = (cache_dir / name).stat().st_size
+        if actual_bytes != expected_bytes:
+            raise ValueError(f"{cache_dir / name} holds {actual_bytes} bytes, expected {expected_bytes}, rebuild the MNIST cache")
+    pixels = np.memmap(cache_dir / PIXELS_FILE, dtype=np.uint8, mode="r", shape=(samples, IMAGE_PIXELS))
+    labels = np.memmap(cache_dir / LABELS_FILE, dtype=np.uint8, mode="r", shape=(samples,))
+    if verify and _digest(pixels, labels) != manifest["sha256"]:
+        raise ValueError(f"{cache_dir} checksum mismatch, rebuild the MNIST cache")
+    return pixels, labels, manifest
+
+
+def load_mnist(cache_dir: Path | None = None) -> tuple[np.ndarray, np.ndarray]:
+    cache_dir = cache_dir or default_cache_dir()
+    if not (cache_dir / MANIFEST_FILE).is_file():
+        build_mnist_cache(cache_dir)
+    pixels, labels, _ = open_mnist_cache(cache_dir)
+    return pixels, labels
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=("build", "verify", "info"))
+    parser.add_argument("--cache-dir", type=Path, default=None, help=f"defaults to ${MNIST_CACHE_ENV} or data/mnist")
+    parser.add_argument(
+        "--source-dir",
+        type=Path,
+        default=None,
+        help="directory holding the four IDX files (optionally .gz) or mnist.npz; falls back to OpenML",
+    )
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    if args.command == "build":
+        manifest = build_mnist_cache(args.cache_dir, args.source_dir)
+    else:
+        _, _, manifest = open_mnist_cache(args.cache_dir, verify=args.command == "verify")
+    print(json.dumps(manifest, sort_keys=True))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
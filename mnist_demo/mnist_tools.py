@@ -3,12 +3,31 @@
 
 from __future__ import annotations
 
+import binascii
+from collections.abc import Sequence
+from dataclasses import dataclass
+from pathlib import Path
+import re
+
+import numpy as np
+
 
 IMAGE_PIXELS = 28 * 28
 PACKED_IMAGE_BYTES = IMAGE_PIXELS // 8
 FRAME_HEADER = bytes([0xA5, 0x5A])
 FRAME_BYTES = len(FRAME_HEADER) + PACKED_IMAGE_BYTES + 1
 
+STROKE_FRAME_MAGIC = bytes([0xA5, 0xC3])
+STROKE_FRAME_VERSION = 1
+STROKE_PAYLOAD_RAW = 0
+STROKE_PAYLOAD_RLE = 1
+STROKE_PAYLOAD_DELTA = 2
+# magic, version, payload kind, little-endian sequence number, body length
+STROKE_FRAME_HEADER_BYTES = len(STROKE_FRAME_MAGIC) + 5
+STROKE_FRAME_OVERHEAD = STROKE_FRAME_HEADER_BYTES + 2
+STROKE_FRAME_MAX_BODY = PACKED_IMAGE_BYTES
+_ZERO_RUN = re.compile(rb"\x00{2,}")
+
 
 def pack_binary_image(bits: list[int] | list[bool]) -> bytes:
     if len(bits) != IMAGE_PIXELS:
@@ -32,12 +51,44 @@ def unpack_binary_image(payload: bytes) -> list[int]:
     return bits
 
 
+def _as_packed_array(payload: bytes | bytearray | memoryview | np.ndarray) -> np.ndarray:
+    if isinstance(payload, np.ndarray):
+        packed = payload
+    else:
+        packed = np.frombuffer(payload, dtype=np.uint8)
+    if packed.dtype != np.uint8:
+        raise ValueError(f"expected uint8 packed bytes, got {packed.dtype}")
+    if packed.size % PACKED_IMAGE_BYTES != 0:
+        raise ValueError(f"expected a multiple of {PACKED_IMAGE_BYTES} bytes, got {packed.size}")
+    return packed.reshape(-1, PACKED_IMAGE_BYTES)
+
+
+def pack_binary_images(bits: np.ndarray) -> np.ndarray:
+    images = np.asarray(bits)
+    if images.ndim != 2 or images.shape[1] != IMAGE_PIXELS:
+        raise ValueError(f"expected [N, {IMAGE_PIXELS}] pixels, got {images.shape}")
+    return np.packbits(images != 0, axis=1, bitorder="little")
+
+
+def unpack_binary_images(payload: bytes | bytearray | memoryview | np.ndarray) -> np.ndarray:
+    packed = _as_packed_array(payload)
+    return np.unpackbits(packed, axis=1, bitorder="little")
+
+
+def xor_checksum(payload: bytes | bytearray | memoryview) -> int:
+    # Fold the payload as one integer so the XOR runs in C instead of per byte.
+    value = int.from_bytes(payload, "little")
+    width = len(payload)
+    while width > 1:
+        half = (width + 1) // 2
+        value = (value & ((1 << (half * 8)) - 1)) ^ (value >> (half * 8))
+        width = half
+    return value
+
+
 def build_uart_frame(bits: list[int] | list[bool]) -> bytes:
     payload = pack_binary_image(bits)
-    checksum = 0
-    for byte in payload:
-        checksum ^= byte
-    return FRAME_HEADER + payload + bytes([checksum])
+    return FRAME_HEADER + payload + bytes([xor_checksum(payload)])
 
 
 def parse_uart_frame(frame: bytes) -> list[int]:
@@ -47,14 +98,367 @@ def parse_uart_frame(frame: bytes) -> list[int]:
         raise ValueError("invalid frame header")
 
     payload = frame[len(FRAME_HEADER):-1]
-    checksum = 0
-    for byte in payload:
-        checksum ^= byte
-    if checksum != frame[-1]:
+    if xor_checksum(payload) != frame[-1]:
         raise ValueError("invalid frame checksum")
     return unpack_binary_image(payload)
 
 
+# Bytes are copied once into a fixed FRAME_BYTES buffer. A frame that fails its
+# checksum only replays its own tail, so the work per byte stays bounded.
+class FrameDecoder:
+    def __init__(self) -> None:
+        self._frame = bytearray(FRAME_BYTES)
+        self._fill = 0
+        self._dropping = False
+        self.frames_decoded = 0
+        self.resyncs = 0
+        self.checksum_failures = 0
+        self.bytes_dropped = 0
+
+    def reset(self) -> None:
+        self._fill = 0
+        self._dropping = False
+
+    def counters(self) -> dict[str, int]:
+        return {
+            "bytes_dropped": self.bytes_dropped,
+            "checksum_failures": self.checksum_failures,
+            "frames_decoded": self.frames_decoded,
+            "resyncs": self.resyncs,
+        }
+
+    def _drop(self, count: int) -> None:
+        if count <= 0:
+            return
+        if not self._dropping:
+            self.resyncs += 1
+            self._dropping = True
+        self.bytes_dropped += count
+
+    def feed(self, data: bytes | bytearray) -> list[bytes]:
+        payloads: list[bytes] = []
+        pending: list[tuple[bytes | bytearray, int]] = [(data, 0)]
+        header_len = len(FRAME_HEADER)
+
+        while pending:
+            chunk, position = pending.pop()
+            while position < len(chunk):
+                if self._fill == 0:
+                    header_index = chunk.find(FRAME_HEADER, position)
+                    if header_index < 0:
+                        tail = len(chunk) - 1
+                        if chunk[tail] == FRAME_HEADER[0]:
+                            self._drop(tail - position)
+                            self._frame[0] = chunk[tail]
+                            self._fill = 1
+                        else:
+                            self._drop(len(chunk) - position)
+                        break
+                    self._drop(header_index - position)
+                    position = header_index
+                elif self._fill < header_len and chunk[position] != FRAME_HEADER[self._fill]:
+                    self._drop(self._fill)
+                    self._fill = 0
+                    continue
+
+                take = min(FRAME_BYTES - self._fill, len(chunk) - position)
+                self._frame[self._fill:self._fill + take] = chunk[position:position + take]
+                self._fill += take
+                position += take
+                if self._fill < FRAME_BYTES:
+                    break
+
+                self._fill = 0
+                payload = bytes(self._frame[header_len:-1])
+                if xor_checksum(payload) == self._frame[-1]:
+                    payloads.append(payload)
+                    self.frames_decoded += 1
+                    self._dropping = False
+                    continue
+
+                self.checksum_failures += 1
+                self._drop(1)
+                pending.append((chunk, position))
+                chunk, position = bytes(self._frame[1:]), 0
+
+        return payloads
+
+
+_CAPTURE_CHUNK_FRAMES = 1 << 16
+
+
+def _valid_frame_headers(stream: np.ndarray, headers: np.ndarray) -> np.ndarray:
+    valid = np.zeros(headers.shape[0], dtype=bool)
+    complete = headers + FRAME_BYTES <= stream.shape[0]
+    window = np.arange(len(FRAME_HEADER), FRAME_BYTES)
+    candidates = np.flatnonzero(complete)
+    for start in range(0, candidates.shape[0], _CAPTURE_CHUNK_FRAMES):
+        chunk = candidates[start:start + _CAPTURE_CHUNK_FRAMES]
+        frames = stream[headers[chunk, None] + window]
+        # payload XOR checksum folds to zero exactly when the checksum matches
+        valid[chunk] = np.bitwise_xor.reduce(frames, axis=1) == 0
+    return valid
+
+
+# Same acceptance rule as FrameDecoder: a valid frame consumes its bytes, a bad or truncated
+# header is rejected and the scan resumes one byte later.
+def parse_uart_stream(data: bytes | bytearray | memoryview | np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    stream = data.reshape(-1) if isinstance(data, np.ndarray) else np.frombuffer(data, dtype=np.uint8)
+    if stream.dtype != np.uint8:
+        raise ValueError(f"expected uint8 bytes, got {stream.dtype}")
+    if stream.shape[0] < len(FRAME_HEADER):
+        return np.zeros((0, IMAGE_PIXELS), dtype=np.uint8), np.zeros(0, dtype=np.int64)
+
+    headers = np.flatnonzero((stream[:-1] == FRAME_HEADER[0]) & (stream[1:] == FRAME_HEADER[1]))
+    valid = _valid_frame_headers(stream, headers)
+    valid_offsets = headers[valid]
+
+    if valid_offsets.shape[0] < 2 or np.all(np.diff(valid_offsets) >= FRAME_BYTES):
+        accepted = valid_offsets
+    else:
+        following = np.searchsorted(valid_offsets, valid_offsets + FRAME_BYTES).tolist()
+        chain: list[int] = []
+        index = 0
+        while index < len(following):
+            chain.append(index)
+            index = following[index]
+        accepted = valid_offsets[chain]
+
+    rejected = headers[~valid]
+    if accepted.size:
+        enclosing = np.searchsorted(accepted, rejected, side="right") - 1
+        covered = (enclosing >= 0) & (rejected < accepted[np.maximum(enclosing, 0)] + FRAME_BYTES)
+        rejected = rejected[~covered]
+
+    payloads = stream[accepted[:, None] + np.arange(len(FRAME_HEADER), len(FRAME_HEADER) + PACKED_IMAGE_BYTES)]
+    return unpack_binary_images(payloads), rejected.astype(np.int64)
+
+
+def parse_uart_capture(path: Path) -> tuple[np.ndarray, np.ndarray]:
+    if path.stat().st_size == 0:
+        return parse_uart_stream(b"")
+    return parse_uart_stream(np.memmap(path, dtype=np.uint8, mode="r"))
+
+
+def crc16_ccitt(data: bytes | bytearray | memoryview) -> int:
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+# Token stream: a control byte below 0x80 carries (c + 1) literal bytes, a
+# control byte at or above 0x80 expands to ((c & 0x7F) + 1) zero bytes.
+def rle_encode_payload(payload: bytes | bytearray) -> bytes:
+    encoded = bytearray()
+
+    def emit_literals(start: int, stop: int) -> None:
+        for chunk_start in range(start, stop, 0x80):
+            chunk_stop = min(chunk_start + 0x80, stop)
+            encoded.append(chunk_stop - chunk_start - 1)
+            encoded.extend(payload[chunk_start:chunk_stop])
+
+    position = 0
+    for match in _ZERO_RUN.finditer(payload):
+        emit_literals(position, match.start())
+        run = match.end() - match.start()
+        while run > 0:
+            step = min(run, 0x80)
+            encoded.append(0x80 | (step - 1))
+            run -= step
+        position = match.end()
+    emit_literals(position, len(payload))
+    return bytes(encoded)
+
+
+def rle_decode_payload(encoded: bytes | bytearray, size: int = PACKED_IMAGE_BYTES) -> bytes:
+    decoded = bytearray()
+    position = 0
+    while position < len(encoded):
+        control = encoded[position]
+        position += 1
+        if control & 0x80:
+            decoded.extend(bytes((control & 0x7F) + 1))
+        else:
+            literal_stop = position + control + 1
+            if literal_stop > len(encoded):
+                raise ValueError("truncated literal run")
+            decoded.extend(encoded[position:literal_stop])
+            position = literal_stop
+        if len(decoded) > size:
+            raise ValueError(f"run-length payload expands past {size} bytes")
+    if len(decoded) != size:
+        raise ValueError(f"run-length payload expands to {len(decoded)} bytes, expected {size}")
+    return bytes(decoded)
+
+
+def _xor_payloads(left: bytes, right: bytes) -> bytes:
+    value = int.from_bytes(left, "little") ^ int.from_bytes(right, "little")
+    return value.to_bytes(len(left), "little")
+
+
+def build_stroke_frame(kind: int, sequence: int, body: bytes) -> bytes:
+    if kind not in (STROKE_PAYLOAD_RAW, STROKE_PAYLOAD_RLE, STROKE_PAYLOAD_DELTA):
+        raise ValueError(f"unsupported stroke payload kind {kind}")
+    if len(body) > STROKE_FRAME_MAX_BODY:
+        raise ValueError(f"stroke frame body is {len(body)} bytes, limit is {STROKE_FRAME_MAX_BODY}")
+
+    checked = bytes([STROKE_FRAME_VERSION, kind]) + (sequence & 0xFFFF).to_bytes(2, "little") + bytes([len(body)]) + body
+    return STROKE_FRAME_MAGIC + checked + crc16_ccitt(checked).to_bytes(2, "little")
+
+
+def parse_stroke_frame(frame: bytes | bytearray) -> tuple[int, int, bytes]:
+    if len(frame) < STROKE_FRAME_OVERHEAD:
+        raise ValueError("stroke frame is too short")
+    if frame[:len(STROKE_FRAME_MAGIC)] != STROKE_FRAME_MAGIC:
+        raise ValueError("invalid stroke frame magic")
+
+    version, kind, sequence_low, sequence_high, length = frame[len(STROKE_FRAME_MAGIC):STROKE_FRAME_HEADER_BYTES]
+    if version != STROKE_FRAME_VERSION:
+        raise ValueError(f"unsupported stroke frame version {version}")
+    if kind not in (STROKE_PAYLOAD_RAW, STROKE_PAYLOAD_RLE, STROKE_PAYLOAD_DELTA):
+        raise ValueError(f"unsupported stroke payload kind {kind}")
+    if len(frame) != STROKE_FRAME_OVERHEAD + length:
+        raise ValueError(f"expected {STROKE_FRAME_OVERHEAD + length} bytes, got {len(frame)}")
+
+    checked = frame[len(STROKE_FRAME_MAGIC):-2]
+    if crc16_ccitt(checked) != int.from_bytes(frame[-2:], "little"):
+        raise ValueError("invalid stroke frame crc")
+    return kind, sequence_low | (sequence_high << 8), bytes(frame[STROKE_FRAME_HEADER_BYTES:-2])
+
+
+def decode_stroke_payload(kind: int, body: bytes, previous: bytes | None) -> bytes:
+    if kind == STROKE_PAYLOAD_RAW:
+        if len(body) != PACKED_IMAGE_BYTES:
+            raise ValueError(f"raw stroke payload must be {PACKED_IMAGE_BYTES} bytes")
+        return body
+    if kind == STROKE_PAYLOAD_RLE:
+        return rle_decode_payload(body)
+    if previous is None:
+        raise ValueError("delta stroke payload without a previous frame")
+    return _xor_payloads(previous, rle_decode_payload(body))
+
+
+class StrokeFrameEncoder:
+    def __init__(self, *, keyframe_interval: int = 32, allow_delta: bool = True) -> None:
+        if keyframe_interval <= 0:
+            raise ValueError("keyframe_interval must be positive")
+        self.keyframe_interval = keyframe_interval
+        self.allow_delta = allow_delta
+        self.sequence = 0
+        self._previous: bytes | None = None
+        self._deltas_since_keyframe = 0
+
+    def encode(self, payload: bytes) -> bytes:
+        if len(payload) != PACKED_IMAGE_BYTES:
+            raise ValueError(f"expected {PACKED_IMAGE_BYTES} bytes, got {len(payload)}")
+
+        candidates = [
+            (STROKE_PAYLOAD_RAW, bytes(payload)),
+            (STROKE_PAYLOAD_RLE, rle_encode_payload(payload)),
+        ]
+        if (
+            self.allow_delta
+            and self._previous is not None
+            and self._deltas_since_keyframe < self.keyframe_interval
+        ):
+            candidates.append((STROKE_PAYLOAD_DELTA, rle_encode_payload(_xor_payloads(self._previous, payload))))
+        kind, body = min(candidates, key=lambda candidate: len(candidate[1]))
+
+        frame = build_stroke_frame(kind, self.sequence, body)
+        self.sequence = (self.sequence + 1) & 0xFFFF
+        self._previous = bytes(payload)
+        self._deltas_since_keyframe = (self._deltas_since_keyframe + 1) if kind == STROKE_PAYLOAD_DELTA else 0
+        return frame
+
+
+# Reference receiver model: hunts for the magic, checks the CRC, and only applies
+# a delta frame when it directly follows the last frame it reconstructed.
+class StrokeFrameReceiver:
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._start = 0
+        self._dropping = False
+        self._previous: bytes | None = None
+        self._next_sequence: int | None = None
+        self.frames_decoded = 0
+        self.resyncs = 0
+        self.crc_failures = 0
+        self.decode_errors = 0
+        self.deltas_skipped = 0
+        self.bytes_dropped = 0
+
+    def counters(self) -> dict[str, int]:
+        return {
+            "bytes_dropped": self.bytes_dropped,
+            "crc_failures": self.crc_failures,
+            "decode_errors": self.decode_errors,
+            "deltas_skipped": self.deltas_skipped,
+            "frames_decoded": self.frames_decoded,
+            "resyncs": self.resyncs,
+        }
+
+    def _drop(self, count: int) -> None:
+        if count <= 0:
+            return
+        if not self._dropping:
+            self.resyncs += 1
+            self._dropping = True
+        self.bytes_dropped += count
+        self._start += count
+
+    def feed(self, data: bytes | bytearray) -> list[bytes]:
+        buffer = self._buffer
+        buffer.extend(data)
+        payloads: list[bytes] = []
+
+        while True:
+            magic_index = buffer.find(STROKE_FRAME_MAGIC, self._start)
+            if magic_index < 0:
+                keep = 1 if buffer and buffer[-1] == STROKE_FRAME_MAGIC[0] else 0
+                self._drop(len(buffer) - keep - self._start)
+                break
+            self._drop(magic_index - self._start)
+            if len(buffer) - magic_index < STROKE_FRAME_HEADER_BYTES:
+                break
+
+            length = buffer[magic_index + STROKE_FRAME_HEADER_BYTES - 1]
+            if length > STROKE_FRAME_MAX_BODY:
+                self._drop(1)
+                continue
+            frame_stop = magic_index + STROKE_FRAME_OVERHEAD + length
+            if len(buffer) < frame_stop:
+                break
+
+            frame = buffer[magic_index:frame_stop]
+            if crc16_ccitt(frame[len(STROKE_FRAME_MAGIC):-2]) != int.from_bytes(frame[-2:], "little"):
+                self.crc_failures += 1
+                self._drop(1)
+                continue
+
+            # The CRC passed, so anything parse/decode rejects is a well-formed but unusable frame.
+            try:
+                kind, sequence, body = parse_stroke_frame(frame)
+                if kind == STROKE_PAYLOAD_DELTA and sequence != self._next_sequence:
+                    self.deltas_skipped += 1
+                    self._start = frame_stop
+                    continue
+                payload = decode_stroke_payload(kind, body, self._previous)
+            except ValueError:
+                self.decode_errors += 1
+                self._drop(1)
+                continue
+
+            self._start = frame_stop
+            self._dropping = False
+            self._previous = payload
+            self._next_sequence = (sequence + 1) & 0xFFFF
+            self.frames_decoded += 1
+            payloads.append(payload)
+
+        if self._start > 0 and self._start * 2 >= len(buffer):
+            del buffer[:self._start]
+            self._start = 0
+        return payloads
+
+
 def quantize_q8_8(value: float) -> int:
     scaled = int(round(value * 256.0))
     if scaled > 0x7FFF:
@@ -64,10 +468,114 @@ def quantize_q8_8(value: float) -> int:
     return scaled
 
 
+def quantize_q8_8_array(values: object) -> tuple[np.ndarray, int, int]:
+    if hasattr(values, "detach"):
+        values = values.detach().cpu().numpy()
+    scaled = np.rint(np.asarray(values, dtype=np.float64) * 256.0)
+    if not np.all(np.isfinite(scaled)):
+        raise ValueError("values must be finite")
+
+    saturated_high = int(np.count_nonzero(scaled > 0x7FFF))
+    saturated_low = int(np.count_nonzero(scaled < -0x8000))
+    quantized = np.clip(scaled, -0x8000, 0x7FFF).astype(np.int32)
+    return quantized, saturated_high, saturated_low
+
+
 def to_u16_hex(value: int) -> str:
     return f"{value & 0xFFFF:04x}"
 
 
+def _tile_order_array(tile_order: Sequence[int] | None, tile_count: int) -> np.ndarray | None:
+    if tile_order is None:
+        return None
+    order = np.asarray(tile_order, dtype=np.int64)
+    if order.shape != (tile_count,) or not np.array_equal(np.sort(order), np.arange(tile_count)):
+        raise ValueError(f"tile_order must be a permutation of range({tile_count})")
+    return order
+
+
+def _ragged_tile_mask(
+    input_size: int,
+    output_size: int,
+    tile_width: int,
+    order: np.ndarray | None,
+) -> np.ndarray:
+    tile_count = -(-output_size // tile_width)
+    cols = np.arange(tile_count * tile_width).reshape(tile_count, 1, tile_width)
+    valid = cols < output_size
+    if order is not None:
+        valid = valid[order]
+    return np.broadcast_to(valid, (tile_count, input_size, tile_width))
+
+
+def tile_weight_matrix(
+    matrix: np.ndarray,
+    tile_width: int,
+    *,
+    pad_to_tile: bool = False,
+    tile_order: Sequence[int] | None = None,
+) -> np.ndarray:
+    weights = np.asarray(matrix)
+    if weights.ndim != 2:
+        raise ValueError(f"expected a 2D matrix, got shape {weights.shape}")
+    if tile_width <= 0:
+        raise ValueError("tile_width must be positive")
+
+    input_size, output_size = weights.shape
+    tile_count = -(-output_size // tile_width)
+    order = _tile_order_array(tile_order, tile_count)
+    ragged = (tile_count * tile_width) != output_size
+
+    if ragged:
+        padded = np.zeros((input_size, tile_count * tile_width), dtype=weights.dtype)
+        padded[:, :output_size] = weights
+    else:
+        padded = weights
+    tiles = padded.reshape(input_size, tile_count, tile_width).transpose(1, 0, 2)
+    if order is not None:
+        tiles = tiles[order]
+
+    if pad_to_tile or not ragged:
+        return tiles.reshape(-1)
+    return tiles[_ragged_tile_mask(input_size, output_size, tile_width, order)]
+
+
+def untile_weight_matrix(
+    flattened: np.ndarray,
+    input_size: int,
+    output_size: int,
+    tile_width: int,
+    *,
+    pad_to_tile: bool = False,
+    tile_order: Sequence[int] | None = None,
+) -> np.ndarray:
+    if input_size < 0 or output_size < 0:
+        raise ValueError("input_size and output_size must be non-negative")
+    if tile_width <= 0:
+        raise ValueError("tile_width must be positive")
+
+    tiled = np.asarray(flattened).reshape(-1)
+    tile_count = -(-output_size // tile_width)
+    order = _tile_order_array(tile_order, tile_count)
+    ragged = (tile_count * tile_width) != output_size
+    expected = (tile_count * tile_width if pad_to_tile else output_size) * input_size
+    if tiled.shape[0] != expected:
+        raise ValueError(f"unexpected flattened length: expected {expected}, input has {tiled.shape[0]}")
+
+    if ragged and not pad_to_tile:
+        tiles = np.zeros((tile_count, input_size, tile_width), dtype=tiled.dtype)
+        tiles[_ragged_tile_mask(input_size, output_size, tile_width, order)] = tiled
+    else:
+        tiles = tiled.reshape(tile_count, input_size, tile_width)
+    if order is not None:
+        unordered = np.empty_like(tiles)
+        unordered[order] = tiles
+        tiles = unordered
+
+    matrix = tiles.transpose(1, 0, 2).reshape(input_size, tile_count * tile_width)
+    return np.ascontiguousarray(matrix[:, :output_size])
+
+
 def flatten_weights_for_tiles(
     matrix: list[list[int]],
     tile_width: int,
@@ -77,19 +585,25 @@ def flatten_weights_for_tiles(
     if tile_width <= 0:
         raise ValueError("tile_width must be positive")
 
-    input_size = len(matrix)
     output_size = len(matrix[0])
     for row in matrix:
         if len(row) != output_size:
             raise ValueError("matrix rows must have equal length")
+    return tile_weight_matrix(np.asarray(matrix, dtype=np.int64), tile_width).tolist()
 
-    flattened: list[int] = []
-    for tile_start in range(0, output_size, tile_width):
-        tile_stop = min(tile_start + tile_width, output_size)
-        for input_index in range(input_size):
-            for output_index in range(tile_start, tile_stop):
-                flattened.append(matrix[input_index][output_index])
-    return flattened
+
+def unflatten_weights_for_tiles(
+    flattened: list[int],
+    input_size: int,
+    output_size: int,
+    tile_width: int,
+) -> list[list[int]]:
+    return untile_weight_matrix(
+        np.asarray(flattened, dtype=np.int64),
+        input_size,
+        output_size,
+        tile_width,
+    ).tolist()
 
 
 def compute_tile_words(
@@ -105,3 +619,253 @@ def compute_tile_words(
         raise ValueError("include_outputs must be non-negative")
 
     return input_size + (input_size * output_tile_width) + output_tile_width + include_outputs
+
+
+UB_TILE_ORDERS = ("ascending", "descending", "serpentine")
+UB_STEADY_STATE_INFERENCES = 2
+
+
+@dataclass(frozen=True)
+class UbRegion:
+    kind: str
+    layer: int
+    tile: int | None
+    start: int
+    stop: int
+
+
+@dataclass(frozen=True)
+class UbResidency:
+    layer: int
+    tiles: tuple[int, ...]
+    regions: tuple[UbRegion, ...]
+    loaded_words: int
+
+
+@dataclass(frozen=True)
+class UbPlan:
+    unified_buffer_width: int
+    tile_width: int
+    reset_between_residencies: bool
+    tiles_per_residency: tuple[int, ...]
+    tile_orders: tuple[str, ...]
+    peak_words: int
+    residencies: tuple[UbResidency, ...]
+    residencies_per_inference: float
+    input_loads_per_inference: float
+    weight_tile_loads_per_inference: float
+    weight_words_per_inference: float
+    host_words_per_inference: float
+    load_cycles_per_inference: float
+
+
+def _layer_tile_widths(output_size: int, tile_width: int) -> list[int]:
+    return [min(tile_width, output_size - start) for start in range(0, output_size, tile_width)]
+
+
+def _ordered_tiles(tile_count: int, tile_order: str, inference: int) -> list[int]:
+    tiles = list(range(tile_count))
+    if tile_order == "descending" or (tile_order == "serpentine" and inference % 2 == 1):
+        tiles.reverse()
+    return tiles
+
+
+def _validate_ub_layers(
+    layers: Sequence[tuple[int, int]],
+    unified_buffer_width: int,
+    tile_width: int,
+) -> None:
+    if not layers:
+        raise ValueError("layers must not be empty")
+    if unified_buffer_width <= 0:
+        raise ValueError("unified_buffer_width must be positive")
+    if tile_width <= 0:
+        raise ValueError("tile_width must be positive")
+    for input_size, output_size in layers:
+        if output_size <= 0:
+            raise ValueError("output_size must be positive")
+        slot_width = min(tile_width, output_size)
+        words = compute_tile_words(input_size, slot_width, slot_width)
+        if words > unified_buffer_width:
+            raise ValueError(f"a {input_size}x{tile_width} tile needs {words} words, unified buffer holds {unified_buffer_width}")
+
+
+def max_tiles_per_residency(input_size: int, output_size: int, unified_buffer_width: int, tile_width: int) -> int:
+    widths = _layer_tile_widths(output_size, tile_width)
+    slot_width = min(tile_width, output_size)
+    fitting = (unified_buffer_width - input_size) // ((input_size * slot_width) + (2 * slot_width))
+    return max(1, min(len(widths), fitting))
+
+
+# Models the unified buffer over back-to-back inferences: each residency holds the layer input
+# followed by one (weights, bias) slot per tile, laid out like compute_tile_words, and then the
+# words the VPU writes back for the residency's outputs. Even layers sit at the bottom of the
+# buffer and odd layers at the top, so a region is only reloaded when the words at its
+# addresses no longer hold it.
+def schedule_unified_buffer(
+    layers: Sequence[tuple[int, int]],
+    unified_buffer_width: int,
+    tile_width: int,
+    *,
+    tiles_per_residency: Sequence[int] | None = None,
+    tile_orders: Sequence[str] | None = None,
+    reset_between_residencies: bool = False,
+) -> UbPlan:
+    _validate_ub_layers(layers, unified_buffer_width, tile_width)
+    if tiles_per_residency is None:
+        tiles_per_residency = [1] * len(layers)
+    if tile_orders is None:
+        tile_orders = ["ascending"] * len(layers)
+    if len(tiles_per_residency) != len(layers) or len(tile_orders) != len(layers):
+        raise ValueError("tiles_per_residency and tile_orders need one entry per layer")
+
+    footprints: list[int] = []
+    for (input_size, output_size), group in zip(layers, tiles_per_residency):
+        if group <= 0:
+            raise ValueError("tiles_per_residency must be positive")
+        slot_width = min(tile_width, output_size)
+        footprints.append(compute_tile_words(input_size, slot_width * group, slot_width * group))
+        if footprints[-1] > unified_buffer_width:
+            raise ValueError(f"{group} tiles of a {input_size}-input layer do not fit in the unified buffer")
+    for order in tile_orders:
+        if order not in UB_TILE_ORDERS:
+            raise ValueError(f"unsupported tile order {order}")
+
+    live: list[tuple[int, int, tuple[object, ...]]] = []
+    steady: list[UbResidency] = []
+    totals = {"residencies": 0, "input_loads": 0, "weight_tile_loads": 0, "weight_words": 0, "host_words": 0, "cycles": 0}
+    steady_start = 2
+
+    def clobber(start: int, stop: int) -> None:
+        live[:] = [region for region in live if region[1] <= start or region[0] >= stop]
+
+    def load(start: int, stop: int, key: tuple[object, ...]) -> int:
+        if (start, stop, key) in live:
+            return 0
+        clobber(start, stop)
+        live.append((start, stop, key))
+        return stop - start
+
+    for inference in range(steady_start + UB_STEADY_STATE_INFERENCES):
+        counting = inference >= steady_start
+        for layer, ((input_size, output_size), group, order) in enumerate(zip(layers, tiles_per_residency, tile_orders)):
+            widths = _layer_tile_widths(output_size, tile_width)
+            # Slots are only as wide as the layer, matching the footprint sized above.
+            slot_width = min(tile_width, output_size)
+            slot_words = (input_size * slot_width) + slot_width
+            base = 0 if layer % 2 == 0 else unified_buffer_width - footprints[layer]
+            tiles = _ordered_tiles(len(widths), order, inference)
+
+            for group_start in range(0, len(tiles), group):
+                if reset_between_residencies:
+                    live.clear()
+                group_tiles = tiles[group_start:group_start + group]
+                regions = [UbRegion("input", layer, None, base, base + input_size)]
+                loaded = load(base, base + input_size, ("input", layer, inference))
+                cycles = -(-loaded // 2)
+                input_loaded = loaded > 0
+                weight_loads = 0
+                weight_words = 0
+                for tile in group_tiles:
+                    slot = base + input_size + ((tile % group) * slot_words)
+                    weights_stop = slot + (input_size * widths[tile])
+                    bias_stop = weights_stop + widths[tile]
+                    regions.append(UbRegion("weights", layer, tile, slot, weights_stop))
+                    regions.append(UbRegion("bias", layer, tile, weights_stop, bias_stop))
+                    tile_words = load(slot, weights_stop, ("weights", layer, tile))
+                    tile_words += load(weights_stop, bias_stop, ("bias", layer, tile))
+                    if tile_words:
+                        weight_loads += 1
+                        weight_words += tile_words
+                        cycles += -(-tile_words // 2)
+                loaded += weight_words
+                # Outputs are written by the VPU, not the host: they cost no load words but evict
+                # whatever another layer kept at those addresses.
+                outputs_start = base + input_size + (group * slot_words)
+                outputs_stop = outputs_start + sum(widths[tile] for tile in group_tiles)
+                regions.append(UbRegion("outputs", layer, None, outputs_start, outputs_stop))
+                clobber(outputs_start, outputs_stop)
+
+                if counting:
+                    totals["residencies"] += 1
+                    totals["input_loads"] += int(input_loaded)
+                    totals["weight_tile_loads"] += weight_loads
+                    totals["weight_words"] += weight_words
+                    totals["host_words"] += loaded
+                    totals["cycles"] += cycles
+                    if inference == steady_start:
+                        steady.append(UbResidency(layer, tuple(group_tiles), tuple(regions), loaded))
+
+    return UbPlan(
+        unified_buffer_width=unified_buffer_width,
+        tile_width=tile_width,
+        reset_between_residencies=reset_between_residencies,
+        tiles_per_residency=tuple(tiles_per_residency),
+        tile_orders=tuple(tile_orders),
+        peak_words=min(unified_buffer_width, max(footprints[0::2]) + max(footprints[1::2], default=0)),
+        residencies=tuple(steady),
+        residencies_per_inference=totals["residencies"] / UB_STEADY_STATE_INFERENCES,
+        input_loads_per_inference=totals["input_loads"] / UB_STEADY_STATE_INFERENCES,
+        weight_tile_loads_per_inference=totals["weight_tile_loads"] / UB_STEADY_STATE_INFERENCES,
+        weight_words_per_inference=totals["weight_words"] / UB_STEADY_STATE_INFERENCES,
+        host_words_per_inference=totals["host_words"] / UB_STEADY_STATE_INFERENCES,
+        load_cycles_per_inference=totals["cycles"] / UB_STEADY_STATE_INFERENCES,
+    )
+
+
+def _plan_cost(plan: UbPlan) -> tuple[float, float, float, int]:
+    return (
+        plan.load_cycles_per_inference,
+        plan.weight_tile_loads_per_inference,
+        plan.residencies_per_inference,
+        plan.peak_words,
+    )
+
+
+# Coordinate descent over per-layer (tiles per residency, tile order) choices: each pass re-plans
+# one layer with the others held fixed and keeps any strictly cheaper plan, until a full pass
+# changes nothing. Layers only interact through evictions across the shared buffer, so this
+# costs sum(choices per layer) schedules per pass instead of their product.
+def plan_unified_buffer(
+    layers: Sequence[tuple[int, int]],
+    unified_buffer_width: int,
+    tile_width: int,
+    *,
+    reset_between_residencies: bool = False,
+) -> UbPlan:
+    _validate_ub_layers(layers, unified_buffer_width, tile_width)
+    choices = [
+        [
+            (group, order)
+            for group in range(1, max_tiles_per_residency(input_size, output_size, unified_buffer_width, tile_width) + 1)
+            for order in UB_TILE_ORDERS
+        ]
+        for input_size, output_size in layers
+    ]
+
+    def schedule(groups: Sequence[int], orders: Sequence[str]) -> UbPlan:
+        return schedule_unified_buffer(
+            layers,
+            unified_buffer_width,
+            tile_width,
+            tiles_per_residency=groups,
+            tile_orders=orders,
+            reset_between_residencies=reset_between_residencies,
+        )
+
+    groups = [1] * len(layers)
+    orders = [UB_TILE_ORDERS[0]] * len(layers)
+    best = schedule(groups, orders)
+    improved = True
+    while improved:
+        improved = False
+        for layer, layer_choices in enumerate(choices):
+            for group, order in layer_choices:
+                if (group, order) == (groups[layer], orders[layer]):
+                    continue
+                trial_groups = [*groups[:layer], group, *groups[layer + 1:]]
+                trial_orders = [*orders[:layer], order, *orders[layer + 1:]]
+                plan = schedule(trial_groups, trial_orders)
+                if _plan_cost(plan) < _plan_cost(best):
+                    best, groups, orders, improved = plan, trial_groups, trial_orders, True
+    return best
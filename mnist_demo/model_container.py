@@ -0,0 +1,257 @@
+# ABOUTME: Packs the quantized MNIST model into a single memory-mappable binary container file.
+# ABOUTME: Converts between the container and the memh file set consumed by the RTL $readmemh flow.
+
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass
+import hashlib
+import json
+from pathlib import Path
+import struct
+import sys
+
+import numpy as np
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from mnist_demo.mnist_tools import to_u16_hex
+from mnist_demo.mnist_tools import untile_weight_matrix
+
+
+MODEL_MAGIC = b"TTPUQMDL"
+MODEL_VERSION = 1
+MODEL_CONTAINER_NAME = "model_q8_8.tpum"
+SECTION_ALIGNMENT = 64
+SECTION_DTYPE = np.dtype("<i2")
+SECTION_NAMES = ("w1_tiled", "b1", "w2_tiled", "b2")
+MEMH_FILES = {
+    "w1_tiled": "w1_tiled_q8_8.memh",
+    "b1": "b1_q8_8.memh",
+    "w2_tiled": "w2_tiled_q8_8.memh",
+    "b2": "b2_q8_8.memh",
+}
+SUMMARY_FILE = "summary.json"
+DEFAULT_MODEL_DIR = Path(__file__).resolve().parent / "data" / "model" / "reference"
+# magic, version, header size, input/hidden/output size, tile width, Q integer/fraction bits,
+# (offset, count) per section, (offset, length) of the summary JSON, and the SHA-256 of the payload.
+HEADER = struct.Struct("<8sHHIIIIBB2x" + ("QQ" * len(SECTION_NAMES)) + "QQ32s")
+
+
+@dataclass(frozen=True)
+class ModelContainer:
+    path: Path
+    input_size: int
+    hidden_size: int
+    output_size: int
+    tile_width: int
+    q_format: tuple[int, int]
+    content_hash: str
+    summary: dict[str, object]
+    summary_bytes: bytes
+    w1_tiled: np.ndarray
+    b1: np.ndarray
+    w2_tiled: np.ndarray
+    b2: np.ndarray
+
+    def matrices(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        w1 = untile_weight_matrix(self.w1_tiled, self.input_size, self.hidden_size, self.tile_width)
+        w2 = untile_weight_matrix(self.w2_tiled, self.hidden_size, self.output_size, self.tile_width)
+        return w1, np.asarray(self.b1), w2, np.asarray(self.b2)
+
+
+def _align(offset: int) -> int:
+    return -(-offset // SECTION_ALIGNMENT) * SECTION_ALIGNMENT
+
+
+def _expected_section_sizes(input_size: int, hidden_size: int, output_size: int) -> dict[str, int]:
+    return {
+        "w1_tiled": input_size * hidden_size,
+        "b1": hidden_size,
+        "w2_tiled": hidden_size * output_size,
+        "b2": output_size,
+    }
+
+
+def write_model_container(
+    path: Path,
+    sections: dict[str, np.ndarray],
+    summary_bytes: bytes,
+) -> str:
+    summary = json.loads(summary_bytes.decode("ascii"))
+    input_size = int(summary["input_size"])
+    hidden_size = int(summary["hidden_size"])
+    output_size = int(summary["output_size"])
+    tile_width = int(summary["tile_width"])
+
+    expected_sizes = _expected_section_sizes(input_size, hidden_size, output_size)
+    encoded: list[bytes] = []
+    for name in SECTION_NAMES:
+        values = np.asarray(sections[name]).reshape(-1)
+        if values.shape[0] != expected_sizes[name]:
+            raise ValueError(f"{name} size mismatch against model summary")
+        if values.size and (values.min() < -0x8000 or values.max() > 0x7FFF):
+            raise ValueError(f"{name} values do not fit in signed 16 bits")
+        encoded.append(values.astype(SECTION_DTYPE).tobytes())
+
+    digest = hashlib.sha256()
+    layout: list[int] = []
+    offset = _align(HEADER.size)
+    for name, payload in zip(SECTION_NAMES, encoded):
+        layout.extend([offset, expected_sizes[name]])
+        digest.update(payload)
+        offset = _align(offset + len(payload))
+    summary_offset = offset
+    digest.update(summary_bytes)
+
+    header = HEADER.pack(
+        MODEL_MAGIC,
+        MODEL_VERSION,
+        HEADER.size,
+        input_size,
+        hidden_size,
+        output_size,
+        tile_width,
+        8,
+        8,
+        *layout,
+        summary_offset,
+        len(summary_bytes),
+        digest.digest(),
+    )
+
+    blob = bytearray(summary_offset + len(summary_bytes))
+    blob[:HEADER.size] = header
+    for section_offset, payload in zip(layout[0::2], encoded):
+        blob[section_offset:section_offset + len(payload)] = payload
+    blob[summary_offset:] = summary_bytes
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(bytes(blob))
+    return digest.hexdigest()
+
+
+def open_model_container(path: Path, *, verify: bool = True) -> ModelContainer:
+    with path.open("rb") as f:
+        header = f.read(HEADER.size)
+    if len(header) != HEADER.size:
+        raise ValueError(f"{path} is too small to be a model container")
+
+    fields = HEADER.unpack(header)
+    magic, version, header_size, input_size, hidden_size, output_size, tile_width, q_int, q_frac = fields[:9]
+    if magic != MODEL_MAGIC:
+        raise ValueError(f"{path} is not a model container")
+    if version != MODEL_VERSION or header_size != HEADER.size:
+        raise ValueError(f"unsupported model container version {version}")
+
+    layout = fields[9:9 + (2 * len(SECTION_NAMES))]
+    summary_offset, summary_length, stored_hash = fields[9 + (2 * len(SECTION_NAMES)):]
+    expected_sizes = _expected_section_sizes(input_size, hidden_size, output_size)
+
+    arrays: dict[str, np.ndarray] = {}
+    for index, name in enumerate(SECTION_NAMES):
+        offset, count = layout[2 * index], layout[(2 * index) + 1]
+        if count != expected_sizes[name]:
+            raise ValueError(f"{name} size mismatch against container header")
+        arrays[name] = np.memmap(path, dtype=SECTION_DTYPE, mode="r", offset=offset, shape=(count,))
+
+    with path.open("rb") as f:
+        f.seek(summary_offset)
+        summary_bytes = f.read(summary_length)
+    if len(summary_bytes) != summary_length:
+        raise ValueError(f"{path} is truncated")
+
+    if verify:
+        digest = hashlib.sha256()
+        for name in SECTION_NAMES:
+            digest.update(memoryview(arrays[name]).cast("B"))
+        digest.update(summary_bytes)
+        if digest.digest() != stored_hash:
+            raise ValueError(f"{path} content hash mismatch")
+
+    return ModelContainer(
+        path=path,
+        input_size=input_size,
+        hidden_size=hidden_size,
+        output_size=output_size,
+        tile_width=tile_width,
+        q_format=(q_int, q_frac),
+        content_hash=stored_hash.hex(),
+        summary=json.loads(summary_bytes.decode("ascii")),
+        summary_bytes=summary_bytes,
+        **arrays,
+    )
+
+
+def read_s16_memh(path: Path) -> np.ndarray:
+    words = path.read_text(encoding="ascii").split()
+    raw = np.array([int(word, 16) for word in words], dtype=np.int64) & 0xFFFF
+    return np.where(raw >= 0x8000, raw - 0x10000, raw).astype(np.int16)
+
+
+def write_s16_memh(path: Path, values: np.ndarray) -> None:
+    lines = [to_u16_hex(int(value)) for value in np.asarray(values).reshape(-1).tolist()]
+    path.write_text("\n".join(lines) + "\n", encoding="ascii")
+
+
+def memh_to_container(model_dir: Path, path: Path) -> str:
+    sections = {name: read_s16_memh(model_dir / file_name) for name, file_name in MEMH_FILES.items()}
+    summary_bytes = (model_dir / SUMMARY_FILE).read_bytes()
+    return write_model_container(path, sections, summary_bytes)
+
+
+def container_to_memh(path: Path, model_dir: Path) -> None:
+    container = open_model_container(path)
+    model_dir.mkdir(parents=True, exist_ok=True)
+    for name, file_name in MEMH_FILES.items():
+        write_s16_memh(model_dir / file_name, getattr(container, name))
+    # The stored bytes, not a re-serialization, so pack -> unpack reproduces summary.json exactly.
+    (model_dir / SUMMARY_FILE).write_bytes(container.summary_bytes)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    pack = subparsers.add_parser("pack", help="convert a memh model directory into a container")
+    pack.add_argument("--model-dir", type=Path, default=DEFAULT_MODEL_DIR)
+    pack.add_argument("--output", type=Path, default=None)
+
+    unpack = subparsers.add_parser("unpack", help="write the memh model files back out of a container")
+    unpack.add_argument("container", type=Path)
+    unpack.add_argument("--output-dir", type=Path, required=True)
+
+    info = subparsers.add_parser("info", help="print the container header")
+    info.add_argument("container", type=Path)
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    if args.command == "pack":
+        output = args.output or (args.model_dir / MODEL_CONTAINER_NAME)
+        content_hash = memh_to_container(args.model_dir, output)
+        print(json.dumps({"container": str(output), "content_hash": content_hash}, sort_keys=True))
+    elif args.command == "unpack":
+        container_to_memh(args.container, args.output_dir)
+        print(f"wrote memh model files to {args.output_dir}")
+    else:
+        container = open_model_container(args.container)
+        print(
+            json.dumps(
+                {
+                    "content_hash": container.content_hash,
+                    "hidden_size": container.hidden_size,
+                    "input_size": container.input_size,
+                    "output_size": container.output_size,
+                    "q_format": f"Q{container.q_format[0]}.{container.q_format[1]}",
+                    "tile_width": container.tile_width,
+                },
+                sort_keys=True,
+            )
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
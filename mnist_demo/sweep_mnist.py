@@ -0,0 +1,213 @@
+# ABOUTME: Runs grid or random hyper-parameter sweeps of train_mnist.py across a process pool.
+# ABOUTME: Trials share the memory-mapped MNIST and packed-bit caches and feed one accuracy leaderboard.
+
+from __future__ import annotations
+
+import argparse
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import contextlib
+import csv
+import itertools
+import json
+import math
+from pathlib import Path
+import sys
+import time
+
+import numpy as np
+import torch
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from mnist_demo import train_mnist
+from mnist_demo.mnist_dataset import load_mnist
+
+
+TRIAL_FILE = "trial.json"
+LEADERBOARD_FIELDS = ("rank", "trial", "accuracy", "wall_seconds", "hidden_size", "epochs", "parameters", "error")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "spec",
+        type=Path,
+        help="JSON sweep spec: {search: grid|random, base: {...}, parameters: {...}, trials, seed}",
+    )
+    parser.add_argument("--sweep-dir", type=Path, default=Path("artifacts/sweeps/latest"))
+    parser.add_argument("--jobs", type=int, default=1, help="trials trained at the same time")
+    parser.add_argument("--threads-per-trial", type=int, default=1, help="torch intra-op threads in each worker")
+    return parser.parse_args()
+
+
+def sample_parameter(name: str, space: object, rng: np.random.Generator) -> object:
+    if isinstance(space, list):
+        return space[int(rng.integers(len(space)))]
+    if isinstance(space, dict) and "uniform" in space:
+        low, high = space["uniform"]
+        return float(rng.uniform(low, high))
+    if isinstance(space, dict) and "log_uniform" in space:
+        low, high = space["log_uniform"]
+        return float(math.exp(rng.uniform(math.log(low), math.log(high))))
+    if isinstance(space, dict) and "int_uniform" in space:
+        low, high = space["int_uniform"]
+        return int(rng.integers(low, high + 1))
+    raise ValueError(f"parameter {name} needs a list of values or a uniform/log_uniform/int_uniform range")
+
+
+def _check_trial_values(trials: list[dict[str, object]]) -> list[dict[str, object]]:
+    # Trainer flags take scalars or comma-separated lists, so a value may be a flat list at most.
+    for parameters in trials:
+        for name, value in parameters.items():
+            values = value if isinstance(value, (list, tuple)) else [value]
+            if any(isinstance(item, (list, tuple, dict)) for item in values):
+                raise ValueError(f"parameter {name} must be a scalar or a flat list, got {value!r}")
+    return trials
+
+
+def expand_trials(spec: dict[str, object]) -> list[dict[str, object]]:
+    # Spec keys are trainer flags with or without dashes; trials use the argparse (underscore) names.
+    search = spec.get("search", "grid")
+    base = {name.replace("-", "_"): value for name, value in dict(spec.get("base", {})).items()}
+    parameters = {name.replace("-", "_"): value for name, value in dict(spec.get("parameters", {})).items()}
+    if search == "grid":
+        for name, values in parameters.items():
+            if not isinstance(values, list) or not values:
+                raise ValueError(f"grid parameter {name} needs a non-empty list of values")
+        names = sorted(parameters)
+        combos = itertools.product(*(parameters[name] for name in names))
+        return _check_trial_values([{**base, **dict(zip(names, combo))} for combo in combos])
+    if search == "random":
+        trials = int(spec.get("trials", 0))
+        if trials <= 0:
+            raise ValueError("random search needs a positive trials count")
+        rng = np.random.default_rng(int(spec.get("seed", 0)))
+        return _check_trial_values(
+            [
+                {**base, **{name: sample_parameter(name, parameters[name], rng) for name in sorted(parameters)}}
+                for _ in range(trials)
+            ]
+        )
+    raise ValueError(f"unsupported search: {search}")
+
+
+def trial_argv(parameters: dict[str, object], output_dir: Path) -> list[str]:
+    # true/false values toggle store_true flags such as async_eval; lists become comma-separated.
+    argv: list[str] = []
+    for name, value in sorted(parameters.items()):
+        flag = f"--{name.replace('_', '-')}"
+        if value is True:
+            argv.append(flag)
+        elif isinstance(value, (list, tuple)):
+            argv.extend([flag, ",".join(str(item) for item in value)])
+        elif value is not False and value is not None:
+            argv.extend([flag, str(value)])
+    return [*argv, "--output-dir", str(output_dir)]
+
+
+def _init_trial_worker(threads: int) -> None:
+    torch.set_num_threads(threads)
+
+
+def run_trial(trial: str, parameters: dict[str, object], trial_dir: Path) -> dict[str, object]:
+    trial_dir.mkdir(parents=True, exist_ok=True)
+    result: dict[str, object] = {"parameters": parameters, "trial": trial}
+    started = time.perf_counter()
+    try:
+        with (trial_dir / "train.log").open("w", encoding="utf-8") as log:
+            with contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+                train_mnist.main(trial_argv(parameters, trial_dir))
+        summary = json.loads((trial_dir / "summary.json").read_text(encoding="ascii"))
+        result.update(
+            {
+                "accuracy": summary["accuracy"],
+                "epochs": summary["epochs"],
+                "hidden_size": summary["hidden_size"],
+            }
+        )
+    except (Exception, SystemExit) as error:
+        # A failing trial, including argparse rejecting a mistyped flag, is recorded on the leaderboard
+        # and the rest of the sweep carries on.
+        result["error"] = f"{type(error).__name__}: {error}"
+    # Wall time of the whole trainer run, including data loading and the final exact evaluation.
+    result["wall_seconds"] = time.perf_counter() - started
+    (trial_dir / TRIAL_FILE).write_text(json.dumps(result, indent=2, sort_keys=True) + "\n", encoding="ascii")
+    return result
+
+
+def write_leaderboard(sweep_dir: Path, results: list[dict[str, object]]) -> list[dict[str, object]]:
+    ranked = sorted(results, key=lambda result: (-float(result.get("accuracy", -1.0)), str(result["trial"])))
+    leaderboard = [{"rank": rank, **result} for rank, result in enumerate(ranked, start=1)]
+    (sweep_dir / "leaderboard.json").write_text(json.dumps(leaderboard, indent=2, sort_keys=True) + "\n", encoding="ascii")
+    with (sweep_dir / "leaderboard.csv").open("w", encoding="utf-8", newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=LEADERBOARD_FIELDS)
+        writer.writeheader()
+        for row in leaderboard:
+            csv_row = {name: row.get(name, "") for name in LEADERBOARD_FIELDS}
+            csv_row["parameters"] = json.dumps(row["parameters"], sort_keys=True)
+            writer.writerow(csv_row)
+    return leaderboard
+
+
+def run_sweep(spec: dict[str, object], sweep_dir: Path, *, jobs: int, threads_per_trial: int) -> list[dict[str, object]]:
+    if jobs <= 0 or threads_per_trial <= 0:
+        raise ValueError("jobs and threads_per_trial must be positive")
+
+    trials = expand_trials(spec)
+    if jobs > 1:
+        # Pool workers already fill the cores; nested loader or materialize processes would oversubscribe them.
+        for parameters in trials:
+            if int(parameters.get("num_workers") or 0) > 0 or int(parameters.get("materialize_jobs") or 1) > 1:
+                raise ValueError("num_workers and materialize_jobs must stay at their defaults when jobs > 1")
+    sweep_dir.mkdir(parents=True, exist_ok=True)
+    shared = {"bit_cache_dir": str(sweep_dir / "bit_cache")}
+    # Build the MNIST cache once up front so workers only ever open the memory map.
+    for cache_dir in sorted({str(parameters.get("mnist_cache_dir") or "") for parameters in trials}):
+        load_mnist(Path(cache_dir) if cache_dir else None)
+
+    results: list[dict[str, object]] = []
+    queued: list[tuple[str, dict[str, object], Path]] = []
+    for index, parameters in enumerate(trials):
+        trial = f"trial_{index:03d}"
+        trial_dir = sweep_dir / trial
+        parameters = {**shared, **parameters}
+        previous = trial_dir / TRIAL_FILE
+        if previous.is_file():
+            result = json.loads(previous.read_text(encoding="ascii"))
+            if result.get("parameters") == parameters and "error" not in result:
+                results.append(result)
+                continue
+        queued.append((trial, parameters, trial_dir))
+
+    leaderboard = write_leaderboard(sweep_dir, results)
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_trial_worker, initargs=(threads_per_trial,)) as pool:
+        submitted: dict[Future[dict[str, object]], tuple[str, dict[str, object], Path]] = {
+            pool.submit(run_trial, *trial): trial for trial in queued
+        }
+        for future in as_completed(submitted):
+            try:
+                result = future.result()
+            except BrokenProcessPool as error:
+                # A worker killed outright (e.g. by the OOM killer) breaks the pool; every trial still
+                # pending fails the same way and is retried by the next run of the sweep.
+                trial, parameters, _ = submitted[future]
+                result = {"error": f"{type(error).__name__}: {error}", "parameters": parameters, "trial": trial}
+            results.append(result)
+            # Rewritten after every trial so an interrupted sweep still leaves a current leaderboard.
+            leaderboard = write_leaderboard(sweep_dir, results)
+
+    return leaderboard
+
+
+def main() -> int:
+    args = parse_args()
+    spec = json.loads(args.spec.read_text(encoding="utf-8"))
+    leaderboard = run_sweep(spec, args.sweep_dir, jobs=args.jobs, threads_per_trial=args.threads_per_trial)
+    print(json.dumps(leaderboard, indent=2, sort_keys=True))
+    return 0 if all("error" not in result for result in leaderboard) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
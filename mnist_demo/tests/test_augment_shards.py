@@ -0,0 +1,76 @@
+# ABOUTME: Verifies materialized augmentation shards replay exactly what live augmentation produces.
+# ABOUTME: Covers the shard key, epoch bounds, and the multi-process materializer.
+
+from __future__ import annotations
+
+import unittest
+from pathlib import Path
+import sys
+import tempfile
+
+import numpy as np
+import torch
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from mnist_demo import augment_shards
+from mnist_demo import train_mnist
+
+
+def make_dataset(seed: int = 5, **sampling: object) -> train_mnist.SpectrumBinaryMnistDataset:
+    rng = np.random.default_rng(4)
+    return train_mnist.SpectrumBinaryMnistDataset(
+        raw_x=rng.integers(0, 256, size=(30, 784), dtype=np.uint8),
+        raw_y=rng.integers(0, 10, size=30),
+        training=True,
+        augment_copies=1,
+        augment_mode="strong",
+        threshold_values=[0.2, 0.4],
+        augment_strengths=[0.0, 1.0],
+        seed=seed,
+        **sampling,
+    )
+
+
+class AugmentShardsTest(unittest.TestCase):
+    def test_shards_match_live_augmentation(self) -> None:
+        dataset = make_dataset()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            manifest = augment_shards.materialize_augment_shards(dataset, Path(temp_dir), 2, jobs=2)
+            shards = augment_shards.MaterializedAugmentDataset(Path(temp_dir), dataset.augmentation_key())
+            self.assertEqual(manifest["samples"], len(dataset))
+            self.assertEqual(len(shards), len(dataset))
+
+            indices = list(range(len(dataset)))
+            for epoch in range(2):
+                dataset.set_epoch(epoch)
+                shards.set_epoch(epoch)
+                live_x, live_y = dataset.get_batch(indices)
+                shard_x, shard_y = shards.get_batch(indices)
+                self.assertTrue(torch.equal(live_x, shard_x))
+                self.assertTrue(torch.equal(live_y, shard_y))
+
+            with self.assertRaises(ValueError):
+                shards.set_epoch(2)
+
+    def test_stochastic_shards_replay_each_epochs_samples(self) -> None:
+        dataset = make_dataset(sampling_mode="stochastic", samples_per_epoch=12)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            augment_shards.materialize_augment_shards(dataset, Path(temp_dir), 3)
+            shards = augment_shards.MaterializedAugmentDataset(Path(temp_dir), dataset.augmentation_key())
+            for epoch in range(3):
+                live_x, live_y = dataset.get_batch(range(12), epoch=epoch)
+                shard_x, shard_y = shards.get_batch(range(12), epoch=epoch)
+                self.assertTrue(torch.equal(live_x, shard_x))
+                self.assertTrue(torch.equal(live_y, shard_y))
+
+    def test_key_tracks_augmentation_settings(self) -> None:
+        self.assertEqual(make_dataset().augmentation_key(), make_dataset().augmentation_key())
+        self.assertNotEqual(make_dataset().augmentation_key(), make_dataset(seed=6).augmentation_key())
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with self.assertRaises(ValueError):
+                augment_shards.MaterializedAugmentDataset(Path(temp_dir), make_dataset().augmentation_key())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,9 +7,16 @@ from pathlib import Path
 import sys
 import unittest
 
+import numpy as np
+
 sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
 
+from mnist_demo.brush_tools import Canvas
+from mnist_demo.brush_tools import rasterize_polyline
+from mnist_demo.brush_tools import rasterize_segments
 from mnist_demo.brush_tools import stroke_cells
+from mnist_demo.mnist_tools import build_uart_frame
+from mnist_demo.mnist_tools import pack_binary_image
 
 
 class BrushToolsTest(unittest.TestCase):
@@ -28,6 +35,54 @@ class BrushToolsTest(unittest.TestCase):
         cells = stroke_cells((5, 5), (5, 7), rows=28, cols=28, radius=0)
         self.assertEqual(cells, {(5, 5), (5, 6), (5, 7)})
 
+    def test_rasterize_polyline_matches_stroke_cells_union(self) -> None:
+        rng = np.random.default_rng(9)
+        for _ in range(300):
+            points = [tuple(int(value) for value in point) for point in rng.integers(-4, 32, size=(int(rng.integers(2, 7)), 2))]
+            radius = int(rng.integers(0, 3))
+            shape = (int(rng.integers(5, 29)), int(rng.integers(5, 29)))
+
+            expected = np.zeros(shape, dtype=bool)
+            for start, stop in zip(points[:-1], points[1:]):
+                for row, col in stroke_cells(start, stop, rows=shape[0], cols=shape[1], radius=radius):
+                    expected[row, col] = True
+
+            np.testing.assert_array_equal(rasterize_polyline(points, radius, shape), expected)
+
+    def test_rasterize_polyline_single_point_and_empty_segments(self) -> None:
+        mask = rasterize_polyline([(0, 0)], 1, (28, 28))
+        self.assertEqual({(int(row), int(col)) for row, col in zip(*np.nonzero(mask))}, {(0, 0), (0, 1), (1, 0), (1, 1)})
+        self.assertFalse(rasterize_segments([], [], 2, (28, 28)).any())
+        with self.assertRaises(ValueError):
+            rasterize_polyline([], 1, (28, 28))
+
+    def test_canvas_tracks_payload_checksum_and_dirty_bytes(self) -> None:
+        canvas = Canvas()
+        expected = np.zeros((28, 28), dtype=bool)
+        previous = bytes(98)
+        strokes = [((3, -2), (3, 30), 1), ((0, 27), (27, 0), 2), ((27, 27), (27, 27), 0), ((10, 5), (14, 6), 1)]
+
+        for start, stop, radius in strokes:
+            canvas.draw_stroke(start, stop, radius=radius)
+            for row, col in stroke_cells(start, stop, rows=28, cols=28, radius=radius):
+                expected[row, col] = True
+
+            payload = pack_binary_image(expected.reshape(-1).tolist())
+            self.assertEqual(canvas.payload, payload)
+            self.assertEqual(canvas.bits(), expected.reshape(-1).astype(int).tolist())
+            self.assertEqual(
+                canvas.pop_delta(),
+                [(index, payload[index]) for index in range(98) if payload[index] != previous[index]],
+            )
+            previous = payload
+
+        self.assertEqual(canvas.pop_delta(), [])
+        self.assertEqual(canvas.frame(), build_uart_frame(expected.reshape(-1).tolist()))
+
+        canvas.clear()
+        self.assertEqual(canvas.payload, bytes(98))
+        self.assertEqual(canvas.checksum, 0)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,106 @@
+# ABOUTME: Verifies the offline MNIST cache built from local IDX or npz files.
+# ABOUTME: Locks the uint8 memmap layout, train-then-test ordering, and checksum validation.
+
+from __future__ import annotations
+
+import gzip
+from pathlib import Path
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from mnist_demo.mnist_dataset import LABELS_FILE
+from mnist_demo.mnist_dataset import MNIST_SAMPLES
+from mnist_demo.mnist_dataset import MNIST_TRAIN_SAMPLES
+from mnist_demo.mnist_dataset import PIXELS_FILE
+from mnist_demo.mnist_dataset import build_mnist_cache
+from mnist_demo.mnist_dataset import load_mnist
+from mnist_demo.mnist_dataset import open_mnist_cache
+from mnist_demo.mnist_dataset import read_idx
+
+
+def write_idx(path: Path, values: np.ndarray) -> None:
+    header = bytes([0, 0, 0x08, values.ndim]) + np.asarray(values.shape, dtype=">u4").tobytes()
+    blob = header + values.astype(np.uint8).tobytes()
+    path.write_bytes(gzip.compress(blob, compresslevel=1) if path.suffix == ".gz" else blob)
+
+
+class MnistDatasetTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp_dir = Path(self._tmp.name)
+        rng = np.random.default_rng(11)
+        self.pixels = np.zeros((MNIST_SAMPLES, 28, 28), dtype=np.uint8)
+        self.pixels[::997] = rng.integers(0, 256, size=self.pixels[::997].shape, dtype=np.uint8)
+        self.labels = (np.arange(MNIST_SAMPLES) % 10).astype(np.uint8)
+
+    def tearDown(self) -> None:
+        self._tmp.cleanup()
+
+    def test_idx_sources_build_train_then_test_memmap(self) -> None:
+        source = self.tmp_dir / "source"
+        source.mkdir()
+        train, test = slice(0, MNIST_TRAIN_SAMPLES), slice(MNIST_TRAIN_SAMPLES, MNIST_SAMPLES)
+        write_idx(source / "train-images-idx3-ubyte.gz", self.pixels[train])
+        write_idx(source / "train-labels-idx1-ubyte", self.labels[train])
+        write_idx(source / "t10k-images-idx3-ubyte", self.pixels[test])
+        write_idx(source / "t10k-labels-idx1-ubyte.gz", self.labels[test])
+        np.testing.assert_array_equal(read_idx(source / "t10k-labels-idx1-ubyte.gz"), self.labels[test])
+
+        cache = self.tmp_dir / "cache"
+        manifest = build_mnist_cache(cache, source)
+        pixels, labels = load_mnist(cache)
+
+        self.assertEqual(manifest["source"], "idx")
+        self.assertIsInstance(pixels, np.memmap)
+        self.assertEqual((pixels.shape, pixels.dtype), ((MNIST_SAMPLES, 784), np.uint8))
+        np.testing.assert_array_equal(pixels, self.pixels.reshape(MNIST_SAMPLES, 784))
+        np.testing.assert_array_equal(labels, self.labels)
+
+    def test_npz_source_and_checksum_mismatch(self) -> None:
+        cache = self.tmp_dir / "cache"
+        cache.mkdir()
+        np.savez(
+            cache / "mnist.npz",
+            x_train=self.pixels[:MNIST_TRAIN_SAMPLES],
+            y_train=self.labels[:MNIST_TRAIN_SAMPLES],
+            x_test=self.pixels[MNIST_TRAIN_SAMPLES:],
+            y_test=self.labels[MNIST_TRAIN_SAMPLES:],
+        )
+
+        pixels, labels = load_mnist(cache)
+        np.testing.assert_array_equal(pixels[::997], self.pixels[::997].reshape(-1, 784))
+        self.assertEqual(open_mnist_cache(cache, verify=True)[2]["source"], "npz")
+        del pixels, labels
+
+        corrupt = bytearray((cache / LABELS_FILE).read_bytes())
+        corrupt[5] ^= 0x01
+        (cache / LABELS_FILE).write_bytes(bytes(corrupt))
+        with self.assertRaises(ValueError):
+            open_mnist_cache(cache, verify=True)
+
+    def test_truncated_cache_is_rejected_without_verify(self) -> None:
+        cache = self.tmp_dir / "cache"
+        cache.mkdir()
+        np.savez(
+            cache / "mnist.npz",
+            x_train=self.pixels[:MNIST_TRAIN_SAMPLES],
+            y_train=self.labels[:MNIST_TRAIN_SAMPLES],
+            x_test=self.pixels[MNIST_TRAIN_SAMPLES:],
+            y_test=self.labels[MNIST_TRAIN_SAMPLES:],
+        )
+        build_mnist_cache(cache)
+        self.assertEqual(sorted(path.name for path in cache.iterdir() if path.name.startswith(".")), [])
+
+        with (cache / PIXELS_FILE).open("r+b") as pixels_file:
+            pixels_file.truncate(784 * 100)
+        with self.assertRaises(ValueError):
+            load_mnist(cache)
+
+
+if __name__ == "__main__":
+    unittest.main()
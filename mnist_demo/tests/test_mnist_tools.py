@@ -1,20 +1,45 @@
 # ABOUTME: Verifies the deterministic data-format and quantization helpers for the MNIST demo.
 # ABOUTME: Keeps the binary packing and fixed-point conventions stable before RTL integration.
 
+import itertools
 from pathlib import Path
 import sys
+import tempfile
 import unittest
 
+import numpy as np
+
 sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
 
+from mnist_demo.mnist_tools import FrameDecoder
+from mnist_demo.mnist_tools import STROKE_PAYLOAD_DELTA
+from mnist_demo.mnist_tools import STROKE_PAYLOAD_RAW
+from mnist_demo.mnist_tools import STROKE_PAYLOAD_RLE
+from mnist_demo.mnist_tools import UB_TILE_ORDERS
+from mnist_demo.mnist_tools import StrokeFrameEncoder
+from mnist_demo.mnist_tools import StrokeFrameReceiver
+from mnist_demo.mnist_tools import build_stroke_frame
 from mnist_demo.mnist_tools import build_uart_frame
 from mnist_demo.mnist_tools import compute_tile_words
 from mnist_demo.mnist_tools import flatten_weights_for_tiles
+from mnist_demo.mnist_tools import parse_stroke_frame
+from mnist_demo.mnist_tools import parse_uart_capture
 from mnist_demo.mnist_tools import parse_uart_frame
 from mnist_demo.mnist_tools import pack_binary_image
+from mnist_demo.mnist_tools import pack_binary_images
+from mnist_demo.mnist_tools import plan_unified_buffer
 from mnist_demo.mnist_tools import quantize_q8_8
+from mnist_demo.mnist_tools import quantize_q8_8_array
+from mnist_demo.mnist_tools import rle_decode_payload
+from mnist_demo.mnist_tools import rle_encode_payload
+from mnist_demo.mnist_tools import schedule_unified_buffer
+from mnist_demo.mnist_tools import tile_weight_matrix
 from mnist_demo.mnist_tools import to_u16_hex
 from mnist_demo.mnist_tools import unpack_binary_image
+from mnist_demo.mnist_tools import unflatten_weights_for_tiles
+from mnist_demo.mnist_tools import unpack_binary_images
+from mnist_demo.mnist_tools import untile_weight_matrix
+from mnist_demo.mnist_tools import xor_checksum
 
 
 class MnistToolsTest(unittest.TestCase):
@@ -31,6 +56,30 @@ class MnistToolsTest(unittest.TestCase):
         with self.assertRaises(ValueError):
             pack_binary_image([0] * 783)
 
+    def test_pack_binary_images_matches_single_image_layout(self) -> None:
+        rng = np.random.default_rng(3)
+        images = (rng.random((5, 28 * 28)) < 0.2).astype(np.uint8)
+
+        packed = pack_binary_images(images)
+
+        self.assertEqual(packed.shape, (5, 98))
+        for row in range(images.shape[0]):
+            self.assertEqual(packed[row].tobytes(), pack_binary_image(images[row].tolist()))
+        np.testing.assert_array_equal(unpack_binary_images(packed), images)
+
+    def test_unpack_binary_images_accepts_concatenated_bytes(self) -> None:
+        first = [(index % 5) == 0 for index in range(28 * 28)]
+        second = [(index % 7) == 1 for index in range(28 * 28)]
+        payload = memoryview(pack_binary_image(first) + pack_binary_image(second))
+
+        unpacked = unpack_binary_images(payload)
+
+        self.assertEqual(unpacked.shape, (2, 28 * 28))
+        self.assertEqual(unpacked[0].tolist(), unpack_binary_image(pack_binary_image(first)))
+        self.assertEqual(unpacked[1].tolist(), [int(bit) for bit in second])
+        with self.assertRaises(ValueError):
+            unpack_binary_images(bytes(97))
+
     def test_quantize_q8_8_clips_and_rounds(self) -> None:
         self.assertEqual(quantize_q8_8(1.0), 0x0100)
         self.assertEqual(quantize_q8_8(-1.0), -0x0100)
@@ -38,6 +87,24 @@ class MnistToolsTest(unittest.TestCase):
         self.assertEqual(quantize_q8_8(200.0), 0x7FFF)
         self.assertEqual(quantize_q8_8(-200.0), -0x8000)
 
+    def test_quantize_q8_8_array_matches_scalar_and_counts_saturation(self) -> None:
+        rng = np.random.default_rng(9)
+        values = np.concatenate(
+            [
+                rng.uniform(-100.0, 100.0, size=500),
+                np.array([0.5 / 256.0, 1.5 / 256.0, -2.5 / 256.0, 127.998, 127.999, -128.002, 300.0, -300.0]),
+            ]
+        ).astype(np.float32)
+
+        quantized, saturated_high, saturated_low = quantize_q8_8_array(values.reshape(-1, 1))
+
+        self.assertEqual(quantized.shape, (values.shape[0], 1))
+        self.assertEqual(
+            quantized.ravel().tolist(),
+            [quantize_q8_8(float(value)) for value in values.tolist()],
+        )
+        self.assertEqual((saturated_high, saturated_low), (2, 2))
+
     def test_to_u16_hex_uses_twos_complement(self) -> None:
         self.assertEqual(to_u16_hex(0), "0000")
         self.assertEqual(to_u16_hex(0x0100), "0100")
@@ -54,6 +121,71 @@ class MnistToolsTest(unittest.TestCase):
             2354,
         )
 
+    def test_schedule_unified_buffer_matches_rtl_tile_reloads(self) -> None:
+        plan = schedule_unified_buffer([(784, 64), (64, 10)], 4096, 2, reset_between_residencies=True)
+
+        self.assertEqual(plan.residencies_per_inference, 37)
+        self.assertEqual(plan.input_loads_per_inference, 37)
+        self.assertEqual(
+            plan.host_words_per_inference,
+            (32 * compute_tile_words(784, 2, 0)) + (5 * compute_tile_words(64, 2, 0)),
+        )
+        first = plan.residencies[0]
+        self.assertEqual(first.loaded_words, compute_tile_words(784, 2, 0))
+        self.assertEqual(
+            [(region.kind, region.start, region.stop) for region in first.regions],
+            [("input", 0, 784), ("weights", 784, 2352), ("bias", 2352, 2354), ("outputs", 2354, 2356)],
+        )
+        self.assertEqual(plan.peak_words, compute_tile_words(784, 2, 2) + compute_tile_words(64, 2, 2))
+
+    def test_plan_unified_buffer_keeps_weights_resident_when_they_fit(self) -> None:
+        layers = [(784, 64), (64, 10)]
+        baseline = schedule_unified_buffer(layers, 4096, 2)
+        planned = plan_unified_buffer(layers, 4096, 2)
+
+        self.assertLess(planned.load_cycles_per_inference, baseline.load_cycles_per_inference)
+        self.assertLessEqual(planned.peak_words, 4096)
+        self.assertEqual(planned.tiles_per_residency[1], 5)
+
+        roomy = plan_unified_buffer(layers, 65536, 2)
+        self.assertEqual(roomy.weight_words_per_inference, 0)
+        self.assertEqual(roomy.host_words_per_inference, 784 + 64)
+
+        with self.assertRaises(ValueError):
+            plan_unified_buffer(layers, 2048, 2)
+        with self.assertRaises(ValueError):
+            plan_unified_buffer([(784, 2)], compute_tile_words(784, 2, 0), 2)
+
+    def test_narrow_output_layer_stays_inside_the_unified_buffer(self) -> None:
+        layers = [(784, 64), (64, 1)]
+        for plan in (schedule_unified_buffer(layers, 4096, 2), plan_unified_buffer(layers, 4096, 2)):
+            self.assertLessEqual(plan.peak_words, 4096)
+            for residency in plan.residencies:
+                for region in residency.regions:
+                    self.assertGreaterEqual(region.start, 0)
+                    self.assertLessEqual(region.stop, 4096)
+            top = [residency for residency in plan.residencies if residency.layer == 1][0]
+            self.assertEqual(top.regions[-1].stop, 4096)
+
+    def test_plan_unified_buffer_matches_exhaustive_search(self) -> None:
+        layers = [(96, 8), (8, 8), (8, 4)]
+        exhaustive = min(
+            (
+                schedule_unified_buffer(layers, 640, 2, tiles_per_residency=groups, tile_orders=orders)
+                for groups in itertools.product(range(1, 3), range(1, 5), range(1, 3))
+                for orders in itertools.product(UB_TILE_ORDERS, repeat=len(layers))
+            ),
+            key=lambda plan: (
+                plan.load_cycles_per_inference,
+                plan.weight_tile_loads_per_inference,
+                plan.residencies_per_inference,
+                plan.peak_words,
+            ),
+        )
+        planned = plan_unified_buffer(layers, 640, 2)
+        self.assertEqual(planned.load_cycles_per_inference, exhaustive.load_cycles_per_inference)
+        self.assertEqual(planned.weight_tile_loads_per_inference, exhaustive.weight_tile_loads_per_inference)
+
     def test_flatten_weights_for_two_wide_tiles(self) -> None:
         matrix = [
             [1, 2, 3, 4],
@@ -66,6 +198,55 @@ class MnistToolsTest(unittest.TestCase):
             [1, 2, 5, 6, 9, 10, 3, 4, 7, 8, 11, 12],
         )
 
+    def test_tile_weight_matrix_pads_and_reorders_ragged_tiles(self) -> None:
+        matrix = np.array(
+            [
+                [1, 2, 3],
+                [4, 5, 6],
+            ]
+        )
+
+        self.assertEqual(tile_weight_matrix(matrix, 2).tolist(), [1, 2, 4, 5, 3, 6])
+        self.assertEqual(
+            tile_weight_matrix(matrix, 2, pad_to_tile=True).tolist(),
+            [1, 2, 4, 5, 3, 0, 6, 0],
+        )
+        self.assertEqual(
+            tile_weight_matrix(matrix, 2, pad_to_tile=True, tile_order=[1, 0]).tolist(),
+            [3, 0, 6, 0, 1, 2, 4, 5],
+        )
+        with self.assertRaises(ValueError):
+            tile_weight_matrix(matrix, 2, tile_order=[0, 0])
+
+    def test_untile_weight_matrix_inverts_every_layout(self) -> None:
+        matrix = np.arange(7 * 11, dtype=np.int16).reshape(7, 11)
+
+        for tile_width in (1, 2, 3, 4, 11, 16):
+            tile_count = -(-11 // tile_width)
+            tile_order = list(reversed(range(tile_count)))
+            for pad_to_tile in (False, True):
+                tiled = tile_weight_matrix(matrix, tile_width, pad_to_tile=pad_to_tile, tile_order=tile_order)
+                restored = untile_weight_matrix(
+                    tiled,
+                    7,
+                    11,
+                    tile_width,
+                    pad_to_tile=pad_to_tile,
+                    tile_order=tile_order,
+                )
+                np.testing.assert_array_equal(restored, matrix)
+
+    def test_unflatten_weights_for_tiles_round_trip(self) -> None:
+        matrix = [
+            [1, 2, 3, 4, 5],
+            [6, 7, 8, 9, 10],
+        ]
+        flattened = flatten_weights_for_tiles(matrix, tile_width=2)
+
+        self.assertEqual(unflatten_weights_for_tiles(flattened, 2, 5, 2), matrix)
+        with self.assertRaises(ValueError):
+            unflatten_weights_for_tiles(flattened[:-1], 2, 5, 2)
+
     def test_uart_frame_round_trip(self) -> None:
         bits = [index & 1 for index in range(28 * 28)]
 
@@ -83,6 +264,133 @@ class MnistToolsTest(unittest.TestCase):
         with self.assertRaises(ValueError):
             parse_uart_frame(bytes(frame))
 
+    def test_xor_checksum_matches_bytewise_xor(self) -> None:
+        payload = bytes((index * 37) & 0xFF for index in range(98))
+        expected = 0
+        for byte in payload:
+            expected ^= byte
+
+        self.assertEqual(xor_checksum(payload), expected)
+        self.assertEqual(xor_checksum(b""), 0)
+
+    def test_frame_decoder_reassembles_split_frames(self) -> None:
+        bits = [index & 1 for index in range(28 * 28)]
+        stream = build_uart_frame(bits) * 2
+        decoder = FrameDecoder()
+
+        payloads = []
+        for start in range(0, len(stream), 7):
+            payloads.extend(decoder.feed(stream[start:start + 7]))
+
+        self.assertEqual(payloads, [pack_binary_image(bits)] * 2)
+        self.assertEqual(decoder.resyncs, 0)
+        self.assertEqual(decoder.bytes_dropped, 0)
+
+    def test_frame_decoder_resyncs_after_noise_and_bad_checksum(self) -> None:
+        good_bits = [(index % 3) == 0 for index in range(28 * 28)]
+        good = build_uart_frame(good_bits)
+        corrupt = bytearray(build_uart_frame([0] * (28 * 28)))
+        corrupt[-1] ^= 0x01
+        # The truncated frame swallows the start of the next good one.
+        stream = b"\x00\xa5\x11" + bytes(corrupt[:40]) + good + bytes(corrupt) + good
+        decoder = FrameDecoder()
+
+        payloads = decoder.feed(stream)
+
+        self.assertEqual(payloads, [pack_binary_image(good_bits)] * 2)
+        self.assertEqual(decoder.frames_decoded, 2)
+        self.assertEqual(decoder.checksum_failures, 2)
+        self.assertEqual(decoder.resyncs, 2)
+        self.assertEqual(decoder.bytes_dropped, 3 + 40 + len(corrupt))
+
+    def test_parse_uart_capture_matches_frame_decoder(self) -> None:
+        rng = np.random.default_rng(8)
+        images = (rng.random((3, 28 * 28)) < 0.3).astype(np.uint8)
+        frames = [build_uart_frame(image.tolist()) for image in images]
+        corrupt = bytearray(frames[1])
+        corrupt[50] ^= 0x40
+        parts = [b"\x13\xa5", frames[0], bytes(corrupt[:30]), frames[1], b"\xa5\x5a\x00", bytes(corrupt), frames[2], frames[0][:60]]
+        stream = b"".join(parts)
+        offsets = np.cumsum([0] + [len(part) for part in parts])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            capture = Path(tmp) / "capture.bin"
+            capture.write_bytes(stream)
+            decoded, rejected = parse_uart_capture(capture)
+
+        np.testing.assert_array_equal(decoded, images[[0, 1, 2]])
+        np.testing.assert_array_equal(
+            decoded,
+            unpack_binary_images(b"".join(FrameDecoder().feed(stream))),
+        )
+        self.assertEqual(rejected.tolist(), [offsets[2], offsets[4], offsets[5], offsets[7]])
+
+    def test_rle_payload_round_trip(self) -> None:
+        rng = np.random.default_rng(6)
+        payloads = [bytes(98), bytes([0xFF]) * 98, bytes([1, 0] * 49)]
+        for density in (0.02, 0.2, 0.9):
+            payloads.append(bytes(np.packbits(rng.random(784) < density, bitorder="little")))
+
+        for payload in payloads:
+            encoded = rle_encode_payload(payload)
+            self.assertEqual(rle_decode_payload(encoded), payload)
+        self.assertEqual(len(rle_encode_payload(bytes(98))), 1)
+
+        with self.assertRaises(ValueError):
+            rle_decode_payload(rle_encode_payload(bytes(97)))
+
+    def test_stroke_encoder_picks_smallest_payload_and_keyframes(self) -> None:
+        encoder = StrokeFrameEncoder(keyframe_interval=2)
+        dense = bytes(np.packbits(np.random.default_rng(1).random(784) < 0.5, bitorder="little"))
+        blank = bytes(98)
+        stroke = bytearray(dense)
+        stroke[40] ^= 0x10
+
+        kinds = [parse_stroke_frame(encoder.encode(payload))[0] for payload in (blank, dense, stroke, stroke, stroke)]
+
+        self.assertEqual(
+            kinds,
+            [STROKE_PAYLOAD_RLE, STROKE_PAYLOAD_RAW, STROKE_PAYLOAD_DELTA, STROKE_PAYLOAD_DELTA, STROKE_PAYLOAD_RAW],
+        )
+        self.assertEqual(encoder.sequence, 5)
+
+    def test_stroke_receiver_resyncs_and_waits_for_keyframe_after_gap(self) -> None:
+        encoder = StrokeFrameEncoder(keyframe_interval=3)
+        canvas = np.zeros(784, dtype=bool)
+        payloads: list[bytes] = []
+        for index in range(8):
+            canvas[index * 90:(index * 90) + 12] = True
+            payloads.append(bytes(np.packbits(canvas, bitorder="little")))
+        frames = [encoder.encode(payload) for payload in payloads]
+
+        corrupt = bytearray(frames[1])
+        corrupt[-3] ^= 0x01
+        stream = b"\xa5\x00\x13" + frames[0] + bytes(corrupt) + b"".join(frames[2:6]) + frames[7]
+
+        receiver = StrokeFrameReceiver()
+        decoded: list[bytes] = []
+        for offset in range(0, len(stream), 7):
+            decoded.extend(receiver.feed(stream[offset:offset + 7]))
+
+        kinds = [parse_stroke_frame(frame)[0] for frame in frames]
+        self.assertEqual(kinds, [STROKE_PAYLOAD_RLE, *[STROKE_PAYLOAD_DELTA] * 3, STROKE_PAYLOAD_RLE, *[STROKE_PAYLOAD_DELTA] * 3])
+        self.assertEqual(decoded, [payloads[0], payloads[4], payloads[5]])
+        self.assertEqual(receiver.crc_failures, 1)
+        self.assertEqual(receiver.decode_errors, 0)
+        self.assertEqual(receiver.deltas_skipped, 3)
+
+    def test_stroke_receiver_counts_decode_errors_apart_from_crc_failures(self) -> None:
+        keyframe = StrokeFrameEncoder().encode(bytes(98))
+        bad_raw_length = build_stroke_frame(STROKE_PAYLOAD_RAW, 1, bytes(10))
+        bad_rle = build_stroke_frame(STROKE_PAYLOAD_RLE, 2, b"\xff")
+
+        receiver = StrokeFrameReceiver()
+        decoded = receiver.feed(bad_raw_length + bad_rle + keyframe)
+
+        self.assertEqual(decoded, [bytes(98)])
+        self.assertEqual(receiver.counters()["crc_failures"], 0)
+        self.assertEqual(receiver.counters()["decode_errors"], 2)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,97 @@
+# ABOUTME: Verifies the single-file quantized model container against the checked-in memh reference model.
+# ABOUTME: Locks the memh round trip, memory-mapped section layout, and content-hash corruption checks.
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from mnist_demo.mnist_tools import untile_weight_matrix
+from mnist_demo.model_container import MEMH_FILES
+from mnist_demo.model_container import SECTION_ALIGNMENT
+from mnist_demo.model_container import SUMMARY_FILE
+from mnist_demo.model_container import container_to_memh
+from mnist_demo.model_container import memh_to_container
+from mnist_demo.model_container import open_model_container
+from mnist_demo.model_container import read_s16_memh
+
+
+REFERENCE_DIR = Path(__file__).resolve().parents[1] / "data" / "model" / "reference"
+
+
+class ModelContainerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp_dir = Path(self._tmp.name)
+        self.container_path = self.tmp_dir / "model.tpum"
+        self.content_hash = memh_to_container(REFERENCE_DIR, self.container_path)
+
+    def tearDown(self) -> None:
+        self._tmp.cleanup()
+
+    def test_sections_are_aligned_memmaps_of_the_memh_values(self) -> None:
+        container = open_model_container(self.container_path)
+
+        self.assertEqual(container.content_hash, self.content_hash)
+        self.assertEqual((container.input_size, container.hidden_size, container.output_size), (784, 64, 10))
+        self.assertEqual(container.q_format, (8, 8))
+        for name, file_name in MEMH_FILES.items():
+            section = getattr(container, name)
+            self.assertIsInstance(section, np.memmap)
+            self.assertEqual(section.offset % SECTION_ALIGNMENT, 0)
+            np.testing.assert_array_equal(section, read_s16_memh(REFERENCE_DIR / file_name))
+
+        w1, _, _, _ = container.matrices()
+        np.testing.assert_array_equal(
+            w1,
+            untile_weight_matrix(read_s16_memh(REFERENCE_DIR / "w1_tiled_q8_8.memh"), 784, 64, 2),
+        )
+
+    def test_round_trip_reproduces_memh_files(self) -> None:
+        output_dir = self.tmp_dir / "memh"
+        container_to_memh(self.container_path, output_dir)
+
+        for file_name in [*MEMH_FILES.values(), "summary.json"]:
+            self.assertEqual(
+                (output_dir / file_name).read_bytes(),
+                (REFERENCE_DIR / file_name).read_bytes(),
+                file_name,
+            )
+
+    def test_round_trip_keeps_summary_bytes_verbatim(self) -> None:
+        model_dir = self.tmp_dir / "compact"
+        model_dir.mkdir()
+        for file_name in MEMH_FILES.values():
+            (model_dir / file_name).write_bytes((REFERENCE_DIR / file_name).read_bytes())
+        summary = json.loads((REFERENCE_DIR / SUMMARY_FILE).read_text(encoding="ascii"))
+        summary_bytes = json.dumps(dict(reversed(list(summary.items()))), separators=(",", ":")).encode("ascii")
+        (model_dir / SUMMARY_FILE).write_bytes(summary_bytes)
+
+        memh_to_container(model_dir, self.container_path)
+        output_dir = self.tmp_dir / "memh"
+        container_to_memh(self.container_path, output_dir)
+        self.assertEqual((output_dir / SUMMARY_FILE).read_bytes(), summary_bytes)
+
+    def test_corrupt_section_fails_hash_check(self) -> None:
+        container = open_model_container(self.container_path)
+        offset = int(container.b2.offset)
+        del container
+
+        blob = bytearray(self.container_path.read_bytes())
+        blob[offset] ^= 0x01
+        self.container_path.write_bytes(bytes(blob))
+
+        with self.assertRaises(ValueError):
+            open_model_container(self.container_path)
+        open_model_container(self.container_path, verify=False)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+# ABOUTME: Verifies sweep specs expand into the expected trainer trials and command lines.
+# ABOUTME: Checks leaderboard ranking puts failed trials after every successful one.
+
+from __future__ import annotations
+
+import json
+import os
+import unittest
+from pathlib import Path
+import sys
+import tempfile
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from mnist_demo import sweep_mnist
+from mnist_demo import train_mnist
+
+
+def _crash_trial(trial: str, parameters: dict[str, object], trial_dir: Path) -> dict[str, object]:
+    os._exit(1)
+
+
+class SweepMnistTest(unittest.TestCase):
+    def test_grid_expands_every_combination_over_the_base(self) -> None:
+        trials = sweep_mnist.expand_trials(
+            {
+                "search": "grid",
+                "base": {"max-iter": 3},
+                "parameters": {"hidden-size": [16, 32], "learning_rate": [1e-3, 1e-2, 1e-1]},
+            }
+        )
+        self.assertEqual(len(trials), 6)
+        self.assertEqual(trials[0], {"hidden_size": 16, "learning_rate": 1e-3, "max_iter": 3})
+        self.assertEqual({trial["max_iter"] for trial in trials}, {3})
+
+    def test_random_search_is_seeded_and_bounded(self) -> None:
+        spec = {
+            "search": "random",
+            "trials": 5,
+            "seed": 3,
+            "parameters": {
+                "hidden-size": [16, 32, 64],
+                "learning-rate": {"log_uniform": [1e-4, 1e-2]},
+                "augment-copies": {"int_uniform": [0, 2]},
+            },
+        }
+        trials = sweep_mnist.expand_trials(spec)
+        self.assertEqual(trials, sweep_mnist.expand_trials(spec))
+        for trial in trials:
+            self.assertIn(trial["hidden_size"], (16, 32, 64))
+            self.assertTrue(1e-4 <= trial["learning_rate"] <= 1e-2)
+            self.assertIn(trial["augment_copies"], (0, 1, 2))
+
+        with self.assertRaises(ValueError):
+            sweep_mnist.expand_trials({"search": "random", "trials": 2, "parameters": {"seed": {"normal": [0, 1]}}})
+
+    def test_trial_argv_parses_as_trainer_arguments(self) -> None:
+        argv = sweep_mnist.trial_argv(
+            {"hidden_size": 32, "async_eval": True, "resume": False, "learning_rate": 0.002},
+            Path("out/trial_000"),
+        )
+        args = train_mnist.parse_args(argv)
+        self.assertEqual(args.hidden_size, 32)
+        self.assertTrue(args.async_eval)
+        self.assertFalse(args.resume)
+        self.assertEqual(args.learning_rate, 0.002)
+        self.assertEqual(args.output_dir, Path("out/trial_000"))
+
+    def test_list_values_become_comma_separated_flags(self) -> None:
+        trials = sweep_mnist.expand_trials(
+            {"base": {"threshold-weights": [2.5, 1.0]}, "parameters": {"strength-weights": [[1, 3], [3, 1]]}}
+        )
+        args = train_mnist.parse_args(sweep_mnist.trial_argv(trials[0], Path("out")))
+        self.assertEqual(args.threshold_weights, "2.5,1.0")
+        self.assertEqual(args.strength_weights, "1,3")
+
+        with self.assertRaises(ValueError):
+            sweep_mnist.expand_trials({"base": {"threshold-weights": [[2.5], 1.0]}})
+        with self.assertRaises(ValueError):
+            sweep_mnist.expand_trials({"base": {"affine-cache-steps": {"angle": 1}}})
+
+    def test_unknown_flag_fails_only_its_trial(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            trial_dir = Path(temp_dir) / "trial_000"
+            result = sweep_mnist.run_trial("trial_000", {"hidden_sise": 4}, trial_dir)
+            written = json.loads((trial_dir / sweep_mnist.TRIAL_FILE).read_text(encoding="ascii"))
+            log = (trial_dir / "train.log").read_text(encoding="utf-8")
+
+        self.assertTrue(result["error"].startswith("SystemExit"))
+        self.assertEqual(written, result)
+        self.assertIn("--hidden-sise", log)
+
+    def test_parallel_sweep_rejects_nested_worker_processes(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for base in ({"num-workers": 2}, {"materialize-jobs": 2}):
+                with self.assertRaisesRegex(ValueError, "jobs > 1"):
+                    sweep_mnist.run_sweep({"base": base}, Path(temp_dir), jobs=2, threads_per_trial=1)
+
+    def test_broken_pool_is_recorded_per_trial(self) -> None:
+        spec = {"parameters": {"hidden-size": [16, 32]}}
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with mock.patch.object(sweep_mnist, "load_mnist"), mock.patch.object(sweep_mnist, "run_trial", _crash_trial):
+                leaderboard = sweep_mnist.run_sweep(spec, Path(temp_dir), jobs=1, threads_per_trial=1)
+            written = json.loads((Path(temp_dir) / "leaderboard.json").read_text(encoding="ascii"))
+
+        self.assertEqual([row["trial"] for row in leaderboard], ["trial_000", "trial_001"])
+        self.assertTrue(all(row["error"].startswith("BrokenProcessPool") for row in leaderboard))
+        self.assertEqual(written, leaderboard)
+
+    def test_leaderboard_ranks_by_accuracy_with_failures_last(self) -> None:
+        results = [
+            {"trial": "trial_000", "parameters": {}, "accuracy": 0.91, "wall_seconds": 2.0},
+            {"trial": "trial_001", "parameters": {}, "error": "ValueError: bad", "wall_seconds": 0.1},
+            {"trial": "trial_002", "parameters": {}, "accuracy": 0.95, "wall_seconds": 3.0},
+        ]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            leaderboard = sweep_mnist.write_leaderboard(Path(temp_dir), results)
+            written = json.loads((Path(temp_dir) / "leaderboard.json").read_text(encoding="ascii"))
+            self.assertTrue((Path(temp_dir) / "leaderboard.csv").is_file())
+
+        self.assertEqual([row["trial"] for row in leaderboard], ["trial_002", "trial_000", "trial_001"])
+        self.assertEqual([row["rank"] for row in written], [1, 2, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
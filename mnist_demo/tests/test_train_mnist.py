@@ -6,9 +6,12 @@ from __future__ import annotations
 import unittest
 from pathlib import Path
 import sys
+import tempfile
+import time
 from unittest import mock
 
 import numpy as np
+import torch
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
 
@@ -44,23 +47,27 @@ class TrainMnistTest(unittest.TestCase):
             self.assertEqual(class_counts[str(digit)], 3)
             self.assertEqual(int(np.sum(subset_y == digit)), 3)
 
-    def test_load_binarized_mnist_balanced_split(self) -> None:
-        features = np.zeros((70000, 8), dtype=np.float32)
-        labels = np.array([index % 10 for index in range(70000)], dtype=np.int64)
-
-        with mock.patch(
-            "mnist_demo.train_mnist.fetch_openml",
-            return_value=(features, labels),
-        ):
-            train_x, train_y, test_x, test_y, train_counts, test_counts = train_mnist.load_binarized_mnist(
+    def test_load_mnist_grayscale_balanced_split(self) -> None:
+        labels = (np.arange(70000) % 10).astype(np.uint8)
+        pixels = np.zeros((70000, 28, 28), dtype=np.uint8)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache_dir = Path(temp_dir)
+            np.savez(
+                cache_dir / "mnist.npz",
+                x_train=pixels[:60000],
+                y_train=labels[:60000],
+                x_test=pixels[60000:],
+                y_test=labels[60000:],
+            )
+            train_x, train_y, test_x, test_y, train_counts, test_counts = train_mnist.load_mnist_grayscale(
                 train_limit=2000,
                 test_limit=1000,
-                pixel_threshold=-1.0,
                 seed=5,
                 split_mode="balanced",
+                cache_dir=cache_dir,
             )
 
-        self.assertEqual(train_x.shape[0], 2000)
+        self.assertEqual((train_x.shape, train_x.dtype), ((2000, 784), np.uint8))
         self.assertEqual(test_x.shape[0], 1000)
         for digit in range(10):
             self.assertEqual(train_counts[str(digit)], 200)
@@ -68,6 +75,423 @@ class TrainMnistTest(unittest.TestCase):
             self.assertEqual(int(np.sum(train_y == digit)), 200)
             self.assertEqual(int(np.sum(test_y == digit)), 100)
 
+    def test_quantize_model_parameters_matches_exact_eval_parameters(self) -> None:
+        torch.manual_seed(3)
+        model = train_mnist.QuantizedMnistMLP(input_size=16, hidden_size=6, output_size=4)
+        with torch.no_grad():
+            model.fc1.weight[0, 0] = 200.0
+            model.fc2.bias[1] = -150.0
+
+        quantized, saturation = train_mnist.quantize_model_parameters(model)
+        w1, b1, w2, b2 = train_mnist.extract_quantized_parameters(model)
+
+        np.testing.assert_array_equal(quantized["w1"], w1.numpy())
+        np.testing.assert_array_equal(quantized["b1"], b1.numpy())
+        np.testing.assert_array_equal(quantized["w2"], w2.numpy())
+        np.testing.assert_array_equal(quantized["b2"], b2.numpy())
+        self.assertEqual(saturation["w1"], {"saturated_high": 1, "saturated_low": 0, "values": 96})
+        self.assertEqual(saturation["b2"], {"saturated_high": 0, "saturated_low": 1, "values": 4})
+
+    def test_raw_threshold_binarization_matches_float_intensity_comparison(self) -> None:
+        pixels = np.resize(np.arange(256, dtype=np.uint8), 784)
+        intensities = (pixels.astype(np.float32) / 255.0).clip(0.0, 1.0)
+        thresholds = [raw / 255.0 for raw in range(256)] + [-0.5, 0.1, 0.19607843, 0.5, 1.5]
+
+        for threshold in thresholds:
+            expected = (intensities > min(max(threshold, 0.0), 1.0)).astype(np.float32)
+            raw = train_mnist.grayscale_threshold_raw(threshold)
+            np.testing.assert_array_equal(train_mnist.binarize_grayscale(pixels, raw), expected, str(threshold))
+        self.assertEqual(train_mnist.grayscale_threshold_raw(50 / 255.0), 50)
+
+    def test_packed_bit_cache_matches_binarize_and_eval_batches(self) -> None:
+        rng = np.random.default_rng(5)
+        raw_x = rng.integers(0, 256, size=(37, 784), dtype=np.uint8)
+        raw_y = rng.integers(0, 10, size=37)
+        thresholds_raw = [0, 50, 254]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            built = train_mnist.build_packed_bit_cache(raw_x, thresholds_raw, Path(tmp))
+            reloaded = train_mnist.build_packed_bit_cache(raw_x, thresholds_raw, Path(tmp))
+            self.assertEqual(len(list(Path(tmp).glob("bits_*.npy"))), len(thresholds_raw))
+            for threshold_raw, packed, cached in zip(thresholds_raw, built, reloaded):
+                self.assertEqual(packed.shape, (37, 98))
+                np.testing.assert_array_equal(cached, packed)
+                for pixels, row in zip(raw_x, packed):
+                    np.testing.assert_array_equal(
+                        np.unpackbits(row, bitorder="little").astype(np.float32),
+                        train_mnist.binarize_grayscale(pixels, threshold_raw),
+                    )
+
+        dataset = train_mnist.SpectrumBinaryMnistDataset(
+            raw_x=raw_x,
+            raw_y=raw_y,
+            training=False,
+            augment_copies=0,
+            augment_mode="none",
+            threshold_values=[0.1, 0.5],
+            augment_strengths=[0.0],
+            seed=3,
+        )
+        batches = dataset.materialize_batches(16)
+        self.assertEqual([int(batch_y.shape[0]) for _, batch_y in batches], [16, 16, 16, 16, 10])
+        features = torch.cat([batch_x for batch_x, _ in batches])
+        labels = torch.cat([batch_y for _, batch_y in batches])
+        for index in range(len(dataset)):
+            item_x, item_y = dataset[index]
+            self.assertTrue(torch.equal(features[index], item_x))
+            self.assertEqual(int(labels[index]), int(item_y))
+
+    def test_batched_items_match_single_item_access(self) -> None:
+        rng = np.random.default_rng(9)
+        dataset = train_mnist.SpectrumBinaryMnistDataset(
+            raw_x=rng.integers(0, 256, size=(20, 784), dtype=np.uint8),
+            raw_y=rng.integers(0, 10, size=20),
+            training=True,
+            augment_copies=1,
+            augment_mode="strong",
+            threshold_values=[0.2, 0.6],
+            augment_strengths=[0.0, 0.7],
+            seed=13,
+        )
+        dataset.set_epoch(2)
+        indices = [int(index) for index in rng.permutation(len(dataset))[:48]]
+
+        loader = torch.utils.data.DataLoader(
+            torch.utils.data.Subset(dataset, indices),
+            batch_size=16,
+            collate_fn=train_mnist.collate_spectrum_batch,
+        )
+        batches = list(loader)
+        features, labels = dataset.get_batch(indices)
+        self.assertEqual(features.shape, (48, 784))
+        self.assertTrue(torch.equal(torch.cat([batch_x for batch_x, _ in batches]), features))
+        self.assertTrue(torch.equal(torch.cat([batch_y for _, batch_y in batches]), labels))
+        for row, index in enumerate(indices):
+            item_x, item_y = dataset[index]
+            self.assertTrue(torch.equal(features[row], item_x), index)
+            self.assertEqual(int(labels[row]), int(item_y))
+        with self.assertRaises(IndexError):
+            dataset.get_batch([len(dataset)])
+
+    def test_batch_augmentation_matches_scalar_augmentation(self) -> None:
+        rng = np.random.default_rng(21)
+        images = (rng.random((120, 784)) < 0.2).astype(np.float32)
+        images[::11] = 0.0
+        strengths = [(0.0, 0.3, 0.65, 1.0)[index % 4] for index in range(images.shape[0])]
+
+        for mode in ("strong", "extreme"):
+            expected = np.stack(
+                [
+                    train_mnist.random_binary_augmentation(bits, np.random.default_rng(index), mode, strength)
+                    for index, (bits, strength) in enumerate(zip(images, strengths))
+                ]
+            )
+            augmented = train_mnist.random_binary_augmentation_batch(
+                images,
+                [np.random.default_rng(index) for index in range(images.shape[0])],
+                mode,
+                strengths,
+            )
+            np.testing.assert_array_equal(augmented, expected, mode)
+
+    def test_packed_row_morphology_matches_shifted_maximum(self) -> None:
+        rng = np.random.default_rng(17)
+        images = (rng.random((24, 28, 28)) < 0.25).astype(np.float32)
+        radii = np.arange(24) % 4
+
+        def shifted_maximum(image: np.ndarray, radius: int) -> np.ndarray:
+            shifts = [
+                train_mnist.shift_binary_image(image, row_delta, col_delta)
+                for row_delta in range(-radius, radius + 1)
+                for col_delta in range(-radius, radius + 1)
+            ]
+            return np.max(shifts, axis=0)
+
+        dilated_rows = train_mnist.dilate_binary_rows(train_mnist.pack_binary_rows(images), radii)
+        eroded_rows = train_mnist.erode_binary_rows(train_mnist.pack_binary_rows(images), radii)
+        for image, radius, dilated, eroded in zip(images, radii, dilated_rows, eroded_rows):
+            expected_dilated = shifted_maximum(image, int(radius))
+            expected_eroded = 1.0 - shifted_maximum(1.0 - image, int(radius))
+            np.testing.assert_array_equal(train_mnist.dilate_binary_image(image, int(radius)), expected_dilated)
+            np.testing.assert_array_equal(train_mnist.erode_binary_image(image, int(radius)), expected_eroded)
+            np.testing.assert_array_equal(train_mnist.unpack_binary_rows(dilated), expected_dilated > 0.5)
+            np.testing.assert_array_equal(train_mnist.unpack_binary_rows(eroded), expected_eroded > 0.5)
+
+    def test_affine_gather_cache_snaps_parameters_and_evicts_least_recent(self) -> None:
+        cache = train_mnist.AffineGatherCache(max_entries=2, angle_step=5.0, scale_step=0.1, shear_step=0.1)
+        image = (np.random.default_rng(2).random((28, 28)) < 0.3).astype(np.float32)
+
+        on_grid = (10.0, 1.1, 0.9, 0.1, -0.2, 3.0, -2.0)
+        sources = cache.lookup(on_grid)
+        transform = train_mnist.build_affine_transform(*on_grid[:5])
+        np.testing.assert_array_equal(sources, train_mnist.affine_source_indices(transform, 3.0, -2.0))
+        np.testing.assert_array_equal(
+            train_mnist.gather_flat_pixels(image, sources),
+            train_mnist.apply_affine_nearest(image, transform, 3.0, -2.0),
+        )
+
+        np.testing.assert_array_equal(cache.lookup((11.0, 1.12, 0.88, 0.09, -0.21, 2.8, -2.3)), sources)
+        cache.lookup((0.0, 1.0, 1.0, 0.0, 0.0, 0.0, 0.0))
+        cache.lookup((20.0, 1.0, 1.0, 0.0, 0.0, 0.0, 0.0))
+        cache.lookup(on_grid)
+
+        stats = cache.stats()
+        self.assertEqual((stats["lookups"], stats["hits"], stats["evictions"], stats["entries"]), (5, 1, 2, 2))
+        self.assertAlmostEqual(stats["max_param_error"]["angle"], 1.0)
+        self.assertAlmostEqual(stats["max_param_error"]["col_shift"], 0.3)
+
+    def test_train_loader_batches_do_not_depend_on_worker_count(self) -> None:
+        rng = np.random.default_rng(4)
+        dataset = train_mnist.SpectrumBinaryMnistDataset(
+            raw_x=rng.integers(0, 256, size=(30, 784), dtype=np.uint8),
+            raw_y=rng.integers(0, 10, size=30),
+            training=True,
+            augment_copies=1,
+            augment_mode="strong",
+            threshold_values=[0.3],
+            augment_strengths=[0.0, 1.0],
+            seed=5,
+        )
+
+        epochs_by_workers = {}
+        for num_workers in (0, 2):
+            loader = train_mnist.build_train_loader(dataset, batch_size=16, seed=9, num_workers=num_workers)
+            epochs = []
+            for epoch in range(2):
+                dataset.set_epoch(epoch)
+                epochs.append(list(loader))
+            epochs_by_workers[num_workers] = epochs
+            del loader
+
+        single, multi = epochs_by_workers[0], epochs_by_workers[2]
+        for single_epoch, multi_epoch in zip(single, multi):
+            self.assertEqual(len(single_epoch), len(multi_epoch))
+            for (single_x, single_y), (multi_x, multi_y) in zip(single_epoch, multi_epoch):
+                self.assertTrue(torch.equal(single_x, multi_x))
+                self.assertTrue(torch.equal(single_y, multi_y))
+
+    def test_stochastic_sampling_draws_weighted_schedule_per_epoch(self) -> None:
+        rng = np.random.default_rng(6)
+        dataset = train_mnist.SpectrumBinaryMnistDataset(
+            raw_x=rng.integers(0, 256, size=(20, 784), dtype=np.uint8),
+            raw_y=rng.integers(0, 10, size=20),
+            training=True,
+            augment_copies=0,
+            augment_mode="strong",
+            threshold_values=[0.1, 0.3, 0.5],
+            augment_strengths=[0.0, 1.0],
+            seed=5,
+            sampling_mode="stochastic",
+            samples_per_epoch=50,
+            threshold_weights=[1.0, 0.0, 3.0],
+        )
+        self.assertEqual(len(dataset), 50)
+        self.assertEqual(dataset.sampling_policy()["threshold_weights"], [0.25, 0.0, 0.75])
+
+        first_draws = [draws.copy() for draws in dataset._schedule_draws(0)]
+        # 50 items over 20 base samples: two full passes, then half of a third.
+        self.assertTrue(np.array_equal(np.bincount(first_draws[0][:40], minlength=20), np.full(20, 2)))
+        self.assertTrue(np.array_equal(dataset.item_labels(0), dataset.raw_y[first_draws[0]]))
+        self.assertNotIn(1, first_draws[1])
+        self.assertFalse(all(np.array_equal(left, right) for left, right in zip(first_draws, dataset._schedule_draws(1))))
+
+        dataset.set_epoch(1)
+        batch_x, batch_y = dataset.get_batch(list(range(50)))
+        for index in (0, 17, 49):
+            item_x, item_y = dataset[index]
+            self.assertTrue(torch.equal(batch_x[index], item_x))
+            self.assertEqual(int(batch_y[index]), int(item_y))
+        self.assertTrue(np.array_equal(batch_y.numpy(), dataset.item_labels(1)))
+
+        with self.assertRaises(ValueError):
+            train_mnist.SpectrumBinaryMnistDataset(
+                raw_x=dataset.raw_x,
+                raw_y=dataset.raw_y,
+                training=True,
+                augment_copies=0,
+                augment_mode="strong",
+                threshold_values=[0.1],
+                augment_strengths=[1.0],
+                seed=5,
+                samples_per_epoch=10,
+            )
+
+    def test_short_stochastic_epochs_reach_every_base_sample(self) -> None:
+        rng = np.random.default_rng(7)
+        dataset = train_mnist.SpectrumBinaryMnistDataset(
+            raw_x=rng.integers(0, 256, size=(100, 784), dtype=np.uint8),
+            raw_y=np.arange(100) % 10,
+            training=True,
+            augment_copies=0,
+            augment_mode="none",
+            threshold_values=[0.3],
+            augment_strengths=[0.0],
+            seed=5,
+            sampling_mode="stochastic",
+            samples_per_epoch=10,
+        )
+        dealt = [dataset._schedule_draws(epoch)[0].copy() for epoch in range(10)]
+        self.assertFalse(np.array_equal(dealt[0], dealt[1]))
+        self.assertEqual(sorted(np.concatenate(dealt).tolist()), list(range(100)))
+
+        dataset.set_epoch(3)
+        _, labels = dataset.get_batch(range(10))
+        self.assertTrue(np.array_equal(labels.numpy(), dataset.raw_y[dealt[3]]))
+
+    def test_certified_fast_path_matches_sequential_kernel(self) -> None:
+        generator = torch.Generator().manual_seed(3)
+        bits = (torch.rand((96, 784), generator=generator) > 0.7).to(torch.float32)
+        bits[:4] = 1.0
+        w1 = torch.randint(-120, 120, (784, 16), generator=generator, dtype=torch.int32)
+        w1[:, 0] = 60
+        b1 = torch.randint(-2000, 2000, (16,), generator=generator, dtype=torch.int32)
+        w2 = torch.randint(-200, 200, (16, 10), generator=generator, dtype=torch.int32)
+        b2 = torch.randint(-2000, 2000, (10,), generator=generator, dtype=torch.int32)
+
+        stats: dict[str, int] = {}
+        fast = train_mnist.exact_q8_8_batch_inference(bits, w1, b1, w2, b2, stats)
+        reference = train_mnist.exact_q8_8_sequential_inference(bits, w1, b1, w2, b2)
+        self.assertEqual(fast.dtype, reference.dtype)
+        self.assertTrue(torch.equal(fast, reference))
+        self.assertEqual(stats["rows"], 96)
+        self.assertGreater(stats["fast_path_rows"], 0)
+        self.assertLess(stats["fast_path_rows"], 96)
+
+    def test_sparse_kernels_match_dense_inference(self) -> None:
+        generator = torch.Generator().manual_seed(8)
+        bits = (torch.rand((12, 784), generator=generator) > 0.75).to(torch.float32)
+        bits[0] = 0.0
+        bits[1] = 1.0
+        w1 = torch.randint(-900, 900, (784, 8), generator=generator, dtype=torch.int32)
+        b1 = torch.randint(-2000, 2000, (8,), generator=generator, dtype=torch.int32)
+        w2 = torch.randint(-3000, 3000, (8, 10), generator=generator, dtype=torch.int32)
+        b2 = torch.randint(-2000, 2000, (10,), generator=generator, dtype=torch.int32)
+
+        sparse = train_mnist.exact_q8_8_sparse_inference(bits, w1, b1, w2, b2)
+        self.assertTrue(torch.equal(sparse, train_mnist.exact_q8_8_sequential_inference(bits, w1, b1, w2, b2)))
+
+        lists = (w1.tolist(), b1.tolist(), w2.tolist(), b2.tolist())
+        for row in bits.to(torch.int64).tolist()[:4]:
+            self.assertEqual(
+                train_mnist.run_sparse_binary_inference(row, *lists),
+                train_mnist.run_quantized_inference(row, *lists),
+            )
+
+    def _train_tiny_model(
+        self,
+        accuracies: list[float],
+        eval_seconds: float = 0.0,
+        **train_kwargs: object,
+    ) -> tuple[train_mnist.QuantizedMnistMLP, float, int, int]:
+        rng = np.random.default_rng(2)
+        dataset = train_mnist.SpectrumBinaryMnistDataset(
+            raw_x=rng.integers(0, 256, size=(40, 784), dtype=np.uint8),
+            raw_y=rng.integers(0, 10, size=40),
+            training=True,
+            augment_copies=0,
+            augment_mode="strong",
+            threshold_values=[0.3],
+            augment_strengths=[1.0],
+            seed=5,
+        )
+        torch.manual_seed(0)
+        model = train_mnist.QuantizedMnistMLP(input_size=784, hidden_size=8, output_size=10)
+        loader = train_mnist.build_train_loader(dataset, batch_size=16, seed=9)
+        train_kwargs = {"epochs": 3, **train_kwargs}
+        remaining = iter(accuracies)
+
+        def slow_evaluate(*args: object, **kwargs: object) -> float:
+            # A slow evaluator lets async_eval train further epochs before each result lands.
+            time.sleep(eval_seconds)
+            return next(remaining)
+
+        with mock.patch.object(train_mnist, "evaluate_exact_q8_8_parameters", side_effect=slow_evaluate) as evaluate:
+            with mock.patch("builtins.print") as printed:
+                model, accuracy = train_mnist.train_model(
+                    model,
+                    loader,
+                    dataset,
+                    [dataset.get_batch(range(40))],
+                    learning_rate=1e-2,
+                    weight_decay=0.0,
+                    device=torch.device("cpu"),
+                    **train_kwargs,
+                )
+        # train_model prints one line per merged epoch.
+        return model, accuracy, evaluate.call_count, printed.call_count
+
+    def test_async_eval_selects_the_same_best_epoch(self) -> None:
+        results = {}
+        for async_eval in (False, True):
+            model, accuracy, _, _ = self._train_tiny_model([0.2, 0.6, 0.4], async_eval=async_eval)
+            results[async_eval] = (accuracy, model.state_dict())
+
+        self.assertEqual(results[False][0], 0.6)
+        self.assertEqual(results[True][0], 0.6)
+        for name, tensor in results[False][1].items():
+            self.assertTrue(torch.equal(tensor, results[True][1][name]))
+
+    def test_resume_continues_bit_identically(self) -> None:
+        full_model, full_accuracy, _, _ = self._train_tiny_model([0.1, 0.2, 0.3])
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self._train_tiny_model([0.1], epochs=1, checkpoint_dir=Path(temp_dir))
+            resumed_model, resumed_accuracy, calls, _ = self._train_tiny_model(
+                [0.2, 0.3],
+                checkpoint_dir=Path(temp_dir),
+                resume=True,
+            )
+
+        self.assertEqual(calls, 2)
+        self.assertEqual(resumed_accuracy, full_accuracy)
+        for name, tensor in full_model.state_dict().items():
+            self.assertTrue(torch.equal(tensor, resumed_model.state_dict()[name]))
+
+    def test_patience_stops_on_plateau(self) -> None:
+        for async_eval in (False, True):
+            with tempfile.TemporaryDirectory() as temp_dir:
+                _, accuracy, _, _ = self._train_tiny_model(
+                    [0.5, 0.505, 0.5, 0.9, 0.9, 0.9],
+                    epochs=6,
+                    patience=2,
+                    min_delta=0.01,
+                    async_eval=async_eval,
+                    checkpoint_dir=Path(temp_dir),
+                )
+                checkpoint = torch.load(Path(temp_dir) / train_mnist.CHECKPOINT_FILE, weights_only=True)
+            self.assertEqual(accuracy, 0.505)
+            self.assertTrue(checkpoint["stopped"])
+            self.assertEqual(checkpoint["next_epoch"], 3)
+
+    def test_async_patience_matches_sync_without_checkpoints(self) -> None:
+        results = {}
+        for async_eval in (False, True):
+            model, accuracy, evaluated, merged = self._train_tiny_model(
+                [0.5, 0.505, 0.5, 0.9, 0.9, 0.9],
+                eval_seconds=0.2 if async_eval else 0.0,
+                epochs=6,
+                patience=2,
+                min_delta=0.01,
+                async_eval=async_eval,
+            )
+            results[async_eval] = (accuracy, merged, evaluated, model.state_dict())
+
+        self.assertEqual(results[False][:3], (0.505, 3, 3))
+        self.assertEqual(results[True][:2], (0.505, 3))
+        # The slow evaluator means async_eval trained past the stop; those epochs are dropped.
+        self.assertGreater(results[True][2], 3)
+        for name, tensor in results[False][3].items():
+            self.assertTrue(torch.equal(tensor, results[True][3][name]))
+
+    def test_resume_rejects_a_mismatched_sampler_state(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self._train_tiny_model([0.1], epochs=1, checkpoint_dir=Path(temp_dir))
+            checkpoint_path = Path(temp_dir) / train_mnist.CHECKPOINT_FILE
+            checkpoint = torch.load(checkpoint_path, weights_only=True)
+            checkpoint["sampler_rng"] = None
+            torch.save(checkpoint, checkpoint_path)
+            with self.assertRaisesRegex(ValueError, "same loader settings"):
+                self._train_tiny_model([0.2, 0.3], checkpoint_dir=Path(temp_dir), resume=True)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,82 @@
+# ABOUTME: Times the vectorized segment rasterizer against the per-segment stroke_cells set union.
+# ABOUTME: Draws whole synthetic hand-drawn digits both ways and checks the painted masks are identical.
+
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+import sys
+import time
+
+import numpy as np
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from mnist_demo.brush_tools import rasterize_segments
+from mnist_demo.brush_tools import stroke_cells
+from mnist_demo.tools.benchmark_synthetic_handdrawn import DIGIT_TEMPLATES
+from mnist_demo.tools.benchmark_synthetic_handdrawn import IMAGE_SIDE
+from mnist_demo.tools.benchmark_synthetic_handdrawn import transform_points
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--digits", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1234)
+    return parser.parse_args()
+
+
+def stroke_cells_mask(starts: list[tuple[int, int]], stops: list[tuple[int, int]], radius: int) -> np.ndarray:
+    canvas = np.zeros((IMAGE_SIDE, IMAGE_SIDE), dtype=bool)
+    for start, stop in zip(starts, stops):
+        for row, col in stroke_cells(start, stop, rows=IMAGE_SIDE, cols=IMAGE_SIDE, radius=radius):
+            canvas[row, col] = True
+    return canvas
+
+
+def main() -> int:
+    args = parse_args()
+    if args.digits <= 0:
+        raise ValueError("digits must be positive")
+
+    rng = np.random.default_rng(args.seed)
+    digits: list[tuple[list[tuple[int, int]], list[tuple[int, int]], int]] = []
+    for index in range(args.digits):
+        starts: list[tuple[int, int]] = []
+        stops: list[tuple[int, int]] = []
+        for stroke in DIGIT_TEMPLATES[index % len(DIGIT_TEMPLATES)]:
+            points = [(int(round(row)), int(round(col))) for row, col in transform_points(stroke, rng)]
+            starts.extend(points[:-1])
+            stops.extend(points[1:])
+        digits.append((starts, stops, int(rng.integers(1, 3))))
+
+    started = time.perf_counter()
+    reference = [stroke_cells_mask(starts, stops, radius) for starts, stops, radius in digits]
+    stroke_cells_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    vectorized = [rasterize_segments(starts, stops, radius, (IMAGE_SIDE, IMAGE_SIDE)) for starts, stops, radius in digits]
+    rasterize_seconds = time.perf_counter() - started
+
+    mismatches = sum(int(not np.array_equal(left, right)) for left, right in zip(reference, vectorized))
+    print(
+        json.dumps(
+            {
+                "digits": args.digits,
+                "mismatches": mismatches,
+                "rasterize_segments_us_per_digit": (rasterize_seconds / args.digits) * 1e6,
+                "segments_per_digit": sum(len(starts) for starts, _, _ in digits) / args.digits,
+                "speedup": stroke_cells_seconds / rasterize_seconds,
+                "stroke_cells_us_per_digit": (stroke_cells_seconds / args.digits) * 1e6,
+            },
+            indent=2,
+            sort_keys=True,
+        )
+    )
+    return 0 if mismatches == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
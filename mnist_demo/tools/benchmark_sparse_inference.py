@@ -0,0 +1,111 @@
+# ABOUTME: Times the sparse active-pixel Q8.8 kernels against the dense 784-input loops on real and synthetic digits.
+# ABOUTME: Runs the scalar and batched paths both ways and checks hidden values and logits are identical.
+
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+import sys
+import time
+
+import numpy as np
+import torch
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from mnist_demo.mnist_dataset import MNIST_TRAIN_SAMPLES
+from mnist_demo.mnist_dataset import open_mnist_cache
+from mnist_demo.tools.benchmark_synthetic_handdrawn import MODEL_DIR
+from mnist_demo.tools.benchmark_synthetic_handdrawn import draw_digit_bits
+from mnist_demo.tools.benchmark_synthetic_handdrawn import load_quantized_model
+from mnist_demo.train_mnist import exact_q8_8_sequential_inference
+from mnist_demo.train_mnist import exact_q8_8_sparse_inference
+from mnist_demo.train_mnist import run_quantized_inference
+from mnist_demo.train_mnist import run_sparse_binary_inference
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", type=Path, default=MODEL_DIR, help="memh model directory or a single-file model container")
+    parser.add_argument("--mnist-cache-dir", type=Path, default=None, help="MNIST cache for real digits (defaults like mnist_dataset.py)")
+    parser.add_argument("--real-samples", type=int, default=500, help="MNIST test digits to run (0 skips real digits)")
+    parser.add_argument("--threshold-raw", type=int, default=50, help="pixels brighter than this raw value are lit")
+    parser.add_argument("--synthetic-samples-per-digit", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=1234)
+    return parser.parse_args()
+
+
+def measure(
+    digits: np.ndarray,
+    model: tuple[list[list[int]], list[int], list[list[int]], list[int]],
+    batch_size: int,
+) -> dict[str, object]:
+    w1, b1, w2, b2 = model
+    bit_lists = [[int(bit) for bit in row] for row in digits]
+
+    started = time.perf_counter()
+    dense = [run_quantized_inference(bits, w1, b1, w2, b2) for bits in bit_lists]
+    dense_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    sparse = [run_sparse_binary_inference(bits, w1, b1, w2, b2) for bits in bit_lists]
+    sparse_seconds = time.perf_counter() - started
+
+    tensors = [torch.tensor(values, dtype=torch.int32) for values in model]
+    batches = torch.from_numpy(digits.astype(np.float32)).split(batch_size)
+
+    started = time.perf_counter()
+    dense_logits = torch.cat([exact_q8_8_sequential_inference(batch, *tensors) for batch in batches])
+    dense_batch_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    sparse_logits = torch.cat([exact_q8_8_sparse_inference(batch, *tensors) for batch in batches])
+    sparse_batch_seconds = time.perf_counter() - started
+
+    count = digits.shape[0]
+    return {
+        "active_pixels_mean": float(digits.sum(axis=1).mean()),
+        "batch_dense_us_per_digit": (dense_batch_seconds / count) * 1e6,
+        "batch_mismatches": int((dense_logits != sparse_logits).any(dim=1).sum()),
+        "batch_sparse_us_per_digit": (sparse_batch_seconds / count) * 1e6,
+        "batch_speedup": dense_batch_seconds / sparse_batch_seconds,
+        "digits": count,
+        "scalar_dense_us_per_digit": (dense_seconds / count) * 1e6,
+        "scalar_mismatches": sum(int(left[:2] != right[:2]) for left, right in zip(dense, sparse)),
+        "scalar_sparse_us_per_digit": (sparse_seconds / count) * 1e6,
+        "scalar_speedup": dense_seconds / sparse_seconds,
+    }
+
+
+def main() -> int:
+    args = parse_args()
+    if args.synthetic_samples_per_digit <= 0 or args.batch_size <= 0:
+        raise ValueError("synthetic_samples_per_digit and batch_size must be positive")
+    if args.real_samples < 0:
+        raise ValueError("real_samples must be non-negative")
+
+    w1, b1, w2, b2, _ = load_quantized_model(args.model)
+    model = (w1, b1, w2, b2)
+
+    rng = np.random.default_rng(args.seed)
+    synthetic = np.array(
+        [draw_digit_bits(label, rng) for label in range(10) for _ in range(args.synthetic_samples_per_digit)],
+        dtype=np.uint8,
+    )
+    results: dict[str, object] = {"synthetic": measure(synthetic, model, args.batch_size)}
+
+    if args.real_samples:
+        pixels, _, _ = open_mnist_cache(args.mnist_cache_dir)
+        real = (np.asarray(pixels[MNIST_TRAIN_SAMPLES:MNIST_TRAIN_SAMPLES + args.real_samples]) > args.threshold_raw).astype(np.uint8)
+        results["real"] = measure(real, model, args.batch_size)
+
+    print(json.dumps(results, indent=2, sort_keys=True))
+    mismatches = sum(int(result["scalar_mismatches"]) + int(result["batch_mismatches"]) for result in results.values())
+    return 0 if mismatches == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
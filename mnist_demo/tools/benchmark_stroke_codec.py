@@ -0,0 +1,122 @@
+# ABOUTME: Replays synthetic hand-drawn strokes through the stroke-frame codec and reports link efficiency.
+# ABOUTME: Compares bytes per frame and frames per second at the UART baud rate against the legacy raw frame.
+
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+import sys
+import time
+
+import numpy as np
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from mnist_demo.brush_tools import Canvas
+from mnist_demo.mnist_tools import FRAME_BYTES
+from mnist_demo.mnist_tools import STROKE_PAYLOAD_DELTA
+from mnist_demo.mnist_tools import STROKE_PAYLOAD_RAW
+from mnist_demo.mnist_tools import STROKE_PAYLOAD_RLE
+from mnist_demo.mnist_tools import StrokeFrameEncoder
+from mnist_demo.mnist_tools import StrokeFrameReceiver
+from mnist_demo.tools.benchmark_synthetic_handdrawn import DIGIT_TEMPLATES
+from mnist_demo.tools.benchmark_synthetic_handdrawn import transform_points
+
+
+UART_BITS_PER_BYTE = 10  # 8N1: start bit, eight data bits, stop bit
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples-per-digit", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--baud", type=int, default=115200)
+    parser.add_argument("--keyframe-interval", type=int, default=32)
+    return parser.parse_args()
+
+
+def drawing_session_payloads(digit: int, rng: np.random.Generator) -> list[bytes]:
+    # One frame per drawn segment, the way the touchscreen streams a digit while it is being drawn.
+    brush_radius = int(rng.integers(1, 3))
+    canvas = Canvas()
+    payloads = [canvas.payload]
+    for stroke in DIGIT_TEMPLATES[digit]:
+        transformed = transform_points(stroke, rng)
+        for start, stop in zip(transformed[:-1], transformed[1:]):
+            start_rc = (int(round(start[0])), int(round(start[1])))
+            stop_rc = (int(round(stop[0])), int(round(stop[1])))
+            canvas.draw_stroke(start_rc, stop_rc, radius=brush_radius)
+            payloads.append(canvas.payload)
+    return payloads
+
+
+def measure(
+    sessions: list[list[bytes]],
+    *,
+    keyframe_interval: int,
+    allow_delta: bool,
+    baud: int,
+) -> dict[str, object]:
+    kinds = {STROKE_PAYLOAD_RAW: 0, STROKE_PAYLOAD_RLE: 0, STROKE_PAYLOAD_DELTA: 0}
+    stream = bytearray()
+    frame_count = 0
+    encoder = StrokeFrameEncoder(keyframe_interval=keyframe_interval, allow_delta=allow_delta)
+
+    started = time.perf_counter()
+    for payloads in sessions:
+        for payload in payloads:
+            frame = encoder.encode(payload)
+            kinds[frame[3]] += 1
+            stream.extend(frame)
+            frame_count += 1
+    encode_seconds = time.perf_counter() - started
+
+    receiver = StrokeFrameReceiver()
+    started = time.perf_counter()
+    decoded = receiver.feed(bytes(stream))
+    decode_seconds = time.perf_counter() - started
+    if decoded != [payload for payloads in sessions for payload in payloads]:
+        raise ValueError("stroke codec round trip mismatch")
+
+    bytes_per_frame = len(stream) / frame_count
+    return {
+        "bytes_per_frame": bytes_per_frame,
+        "link_frames_per_second": baud / UART_BITS_PER_BYTE / bytes_per_frame,
+        "payload_kinds": {"delta": kinds[STROKE_PAYLOAD_DELTA], "raw": kinds[STROKE_PAYLOAD_RAW], "rle": kinds[STROKE_PAYLOAD_RLE]},
+        "encode_frames_per_second": frame_count / encode_seconds,
+        "decode_frames_per_second": frame_count / decode_seconds,
+    }
+
+
+def main() -> int:
+    args = parse_args()
+    if args.samples_per_digit <= 0:
+        raise ValueError("samples_per_digit must be positive")
+
+    rng = np.random.default_rng(args.seed)
+    sessions = [
+        drawing_session_payloads(digit, rng)
+        for digit in range(10)
+        for _ in range(args.samples_per_digit)
+    ]
+    frame_count = sum(len(payloads) for payloads in sessions)
+
+    results = {
+        "baud": args.baud,
+        "frames": frame_count,
+        "keyframe_interval": args.keyframe_interval,
+        "legacy": {
+            "bytes_per_frame": FRAME_BYTES,
+            "link_frames_per_second": args.baud / UART_BITS_PER_BYTE / FRAME_BYTES,
+        },
+        "rle_only": measure(sessions, keyframe_interval=args.keyframe_interval, allow_delta=False, baud=args.baud),
+        "rle_delta": measure(sessions, keyframe_interval=args.keyframe_interval, allow_delta=True, baud=args.baud),
+    }
+    print(json.dumps(results, indent=2, sort_keys=True))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
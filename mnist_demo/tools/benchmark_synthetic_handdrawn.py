@@ -16,8 +16,11 @@ import numpy as np
 if __package__ in (None, ""):
     sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
 
-from mnist_demo.brush_tools import stroke_cells
-from mnist_demo.train_mnist import run_quantized_inference
+from mnist_demo.brush_tools import rasterize_polyline
+from mnist_demo.brush_tools import rasterize_segments
+from mnist_demo.mnist_tools import unflatten_weights_for_tiles
+from mnist_demo.model_container import open_model_container
+from mnist_demo.train_mnist import run_sparse_binary_inference
 
 
 IMAGE_SIDE = 28
@@ -50,6 +53,12 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--preview-per-digit", type=int, default=4)
     parser.add_argument("--seed", type=int, default=1234)
     parser.add_argument("--output-dir", type=Path, default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument(
+        "--model",
+        type=Path,
+        default=MODEL_DIR,
+        help="memh model directory or a single-file model container",
+    )
     return parser.parse_args()
 
 
@@ -103,26 +112,12 @@ def parse_s16_memh(path: Path) -> list[int]:
     return values
 
 
-def unflatten_weights_for_tiles(
-    flattened: list[int],
-    input_size: int,
-    output_size: int,
-    tile_width: int,
-) -> list[list[int]]:
-    matrix = [[0 for _ in range(output_size)] for _ in range(input_size)]
-    index = 0
-    for tile_start in range(0, output_size, tile_width):
-        tile_stop = min(tile_start + tile_width, output_size)
-        for input_index in range(input_size):
-            for output_index in range(tile_start, tile_stop):
-                matrix[input_index][output_index] = flattened[index]
-                index += 1
-    if index != len(flattened):
-        raise ValueError(f"unexpected flattened length: consumed {index}, input has {len(flattened)}")
-    return matrix
-
-
 def load_quantized_model(model_dir: Path) -> tuple[list[list[int]], list[int], list[list[int]], list[int], dict[str, object]]:
+    if model_dir.is_file():
+        container = open_model_container(model_dir)
+        w1, b1, w2, b2 = container.matrices()
+        return w1.tolist(), b1.tolist(), w2.tolist(), b2.tolist(), container.summary
+
     summary = json.loads((model_dir / "summary.json").read_text(encoding="ascii"))
     input_size = int(summary["input_size"])
     hidden_size = int(summary["hidden_size"])
@@ -199,16 +194,16 @@ def draw_digit_bits(
     brush_radius = int(rng.integers(1, 3))  # 3x3 to 5x5 footprint
     canvas = np.zeros((IMAGE_SIDE, IMAGE_SIDE), dtype=np.uint8)
 
+    starts: list[tuple[int, int]] = []
+    stops: list[tuple[int, int]] = []
     for stroke in DIGIT_TEMPLATES[digit]:
         transformed = transform_points(stroke, rng)
         for start, stop in zip(transformed[:-1], transformed[1:]):
             if rng.random() < 0.06:
                 continue  # simulate pen lift/drop segment
-            start_rc = (int(round(start[0])), int(round(start[1])))
-            stop_rc = (int(round(stop[0])), int(round(stop[1])))
-            cells = stroke_cells(start_rc, stop_rc, rows=IMAGE_SIDE, cols=IMAGE_SIDE, radius=brush_radius)
-            for row, col in cells:
-                canvas[row, col] = 1
+            starts.append((int(round(start[0])), int(round(start[1]))))
+            stops.append((int(round(stop[0])), int(round(stop[1]))))
+    canvas[rasterize_segments(starts, stops, brush_radius, (IMAGE_SIDE, IMAGE_SIDE))] = 1
 
     # Sparse dropout and noise to mimic touch jitter and frame imperfections.
     active = canvas == 1
@@ -224,12 +219,8 @@ def draw_digit_bits(
     if not np.any(canvas):
         # Fallback to a minimally transformed redraw if aggressive noise cleared everything.
         for stroke in DIGIT_TEMPLATES[digit]:
-            for start, stop in zip(stroke[:-1], stroke[1:]):
-                start_rc = (int(round(start[0])), int(round(start[1])))
-                stop_rc = (int(round(stop[0])), int(round(stop[1])))
-                cells = stroke_cells(start_rc, stop_rc, rows=IMAGE_SIDE, cols=IMAGE_SIDE, radius=1)
-                for row, col in cells:
-                    canvas[row, col] = 1
+            points = [(int(round(row)), int(round(col))) for row, col in stroke]
+            canvas[rasterize_polyline(points, 1, (IMAGE_SIDE, IMAGE_SIDE))] = 1
 
     return [int(value) for value in canvas.reshape(IMAGE_PIXELS).tolist()]
 
@@ -247,7 +238,7 @@ def main() -> int:
     output_dir.mkdir(parents=True, exist_ok=True)
     previews_dir.mkdir(parents=True, exist_ok=True)
 
-    w1, b1, w2, b2, model_summary = load_quantized_model(MODEL_DIR)
+    w1, b1, w2, b2, model_summary = load_quantized_model(args.model)
 
     confusion = [[0 for _ in range(10)] for _ in range(10)]
     rows: list[dict[str, object]] = []
@@ -255,7 +246,7 @@ def main() -> int:
     for label in range(10):
         for sample_index in range(args.samples_per_digit):
             bits = draw_digit_bits(label, rng)
-            _, logits, prediction = run_quantized_inference(bits=bits, w1=w1, b1=b1, w2=w2, b2=b2)
+            _, logits, prediction = run_sparse_binary_inference(bits=bits, w1=w1, b1=b1, w2=w2, b2=b2)
             confusion[label][prediction] += 1
 
             ones_count = int(sum(bits))
@@ -10,10 +10,15 @@ import struct
 import sys
 import zlib
 
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from mnist_demo.mnist_tools import PACKED_IMAGE_BYTES
+from mnist_demo.mnist_tools import unpack_binary_images
+
 
 IMAGE_SIZE = 28
 PIXELS = IMAGE_SIZE * IMAGE_SIZE
-PACKED_BYTES = PIXELS // 8
 SCALE = 12
 PROJECT_DIR = Path(__file__).resolve().parents[1]
 OUTPUT_DIR = PROJECT_DIR / "artifacts" / "previews" / "bitmask"
@@ -42,13 +47,9 @@ def read_bits_file(path: Path) -> list[int]:
 
 def read_bin_file(path: Path) -> list[int]:
     payload = path.read_bytes()
-    if len(payload) != PACKED_BYTES:
-        raise ValueError(f"{path} has {len(payload)} bytes, expected {PACKED_BYTES}")
-    bits: list[int] = []
-    for byte in payload:
-        for shift in range(8):
-            bits.append((byte >> shift) & 1)
-    return bits
+    if len(payload) != PACKED_IMAGE_BYTES:
+        raise ValueError(f"{path} has {len(payload)} bytes, expected {PACKED_IMAGE_BYTES}")
+    return unpack_binary_images(payload)[0].tolist()
 
 
 def safe_name(label: str) -> str:
@@ -1,5 +1,5 @@
 # ABOUTME: Exports labeled MNIST training/test datapoints as PNG previews for dataset quality inspection.
-# ABOUTME: Uses the same OpenML dataset and binary thresholding convention as the training pipeline.
+# ABOUTME: Uses the same cached MNIST dataset and binary thresholding convention as the training pipeline.
 
 from __future__ import annotations
 
@@ -8,10 +8,15 @@ import html
 import json
 from pathlib import Path
 import struct
+import sys
 import zlib
 
 import numpy as np
-from sklearn.datasets import fetch_openml
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from mnist_demo.mnist_dataset import load_mnist
 
 
 IMAGE_SIZE = 28
@@ -34,6 +39,7 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--pixel-threshold", type=float, default=0.0)
     parser.add_argument("--train-limit", type=int, default=0)
     parser.add_argument("--test-limit", type=int, default=0)
+    parser.add_argument("--mnist-cache-dir", type=Path, default=None)
     return parser.parse_args()
 
 
@@ -102,16 +108,9 @@ def load_train_test_limits(args: argparse.Namespace) -> tuple[int, int]:
     return train_limit, test_limit
 
 
-def fetch_mnist() -> tuple[np.ndarray, np.ndarray]:
-    features, labels = fetch_openml(
-        "mnist_784",
-        version=1,
-        as_frame=False,
-        return_X_y=True,
-        parser="liac-arff",
-    )
-    labels = labels.astype(np.int64)
-    return features, labels
+def fetch_mnist(cache_dir: Path | None = None) -> tuple[np.ndarray, np.ndarray]:
+    features, labels = load_mnist(cache_dir)
+    return features, labels.astype(np.int64)
 
 
 def select_examples(
@@ -178,7 +177,7 @@ def main() -> int:
     train_limit, test_limit = load_train_test_limits(args)
     args.output_dir.mkdir(parents=True, exist_ok=True)
 
-    features, labels = fetch_mnist()
+    features, labels = fetch_mnist(args.mnist_cache_dir)
 
     train_selected = select_examples(labels, 0, train_limit, args.per_digit_train)
     test_start = MNIST_TRAIN_SAMPLES
@@ -0,0 +1,85 @@
+# ABOUTME: Sweeps unified-buffer sizes for the tiled classifier and reports the best tile schedule for each.
+# ABOUTME: Lets UNIFIED_BUFFER_WIDTH be traded against per-inference load latency instead of sized by trial and error.
+
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+import sys
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from mnist_demo.mnist_tools import UbPlan
+from mnist_demo.mnist_tools import plan_unified_buffer
+from mnist_demo.mnist_tools import schedule_unified_buffer
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--layers", type=str, default="784x64,64x10", help="comma-separated INPUTxOUTPUT layer sizes")
+    parser.add_argument("--tile-width", type=int, default=2)
+    parser.add_argument("--widths", type=str, default="4096,8192,16384,32768,65536")
+    parser.add_argument(
+        "--reset-between-residencies",
+        action="store_true",
+        help="model a TPU reset before every residency, as the current RTL does",
+    )
+    parser.add_argument("--show-schedule", action="store_true", help="include per-residency UB address ranges")
+    return parser.parse_args()
+
+
+def plan_to_json(plan: UbPlan, *, show_schedule: bool) -> dict[str, object]:
+    result = {
+        "host_words_per_inference": plan.host_words_per_inference,
+        "input_loads_per_inference": plan.input_loads_per_inference,
+        "load_cycles_per_inference": plan.load_cycles_per_inference,
+        "peak_words": plan.peak_words,
+        "residencies_per_inference": plan.residencies_per_inference,
+        "tile_orders": list(plan.tile_orders),
+        "tiles_per_residency": list(plan.tiles_per_residency),
+        "unified_buffer_width": plan.unified_buffer_width,
+        "weight_tile_loads_per_inference": plan.weight_tile_loads_per_inference,
+        "weight_words_per_inference": plan.weight_words_per_inference,
+    }
+    if show_schedule:
+        result["residencies"] = [
+            {
+                "layer": residency.layer,
+                "loaded_words": residency.loaded_words,
+                "regions": [[region.kind, region.tile, region.start, region.stop] for region in residency.regions],
+                "tiles": list(residency.tiles),
+            }
+            for residency in plan.residencies
+        ]
+    return result
+
+
+def main() -> int:
+    args = parse_args()
+    layers = [tuple(int(size) for size in layer.split("x")) for layer in args.layers.split(",")]
+    widths = [int(width) for width in args.widths.split(",")]
+
+    baseline = schedule_unified_buffer(layers, max(widths), args.tile_width, reset_between_residencies=True)
+    plans = [
+        plan_unified_buffer(layers, width, args.tile_width, reset_between_residencies=args.reset_between_residencies)
+        for width in widths
+    ]
+    print(
+        json.dumps(
+            {
+                "layers": [list(layer) for layer in layers],
+                "rtl_baseline": plan_to_json(baseline, show_schedule=False),
+                "plans": [plan_to_json(plan, show_schedule=args.show_schedule) for plan in plans],
+                "tile_width": args.tile_width,
+            },
+            indent=2,
+            sort_keys=True,
+        )
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -4,38 +4,61 @@
 from __future__ import annotations
 
 import argparse
+from collections import OrderedDict
+from collections import deque
+from collections.abc import Iterable
+from collections.abc import Sequence
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
 import copy
+from dataclasses import dataclass
+import hashlib
 import json
+import os
 from pathlib import Path
 import sys
 
 import numpy as np
-from sklearn.datasets import fetch_openml
 import torch
 from torch import nn
 import torch.nn.functional as F
 from torch.utils.data import DataLoader
 from torch.utils.data import Dataset
+from torch.utils.data import RandomSampler
 
 if __package__ in (None, ""):
     sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
-from mnist_demo.mnist_tools import flatten_weights_for_tiles
+from mnist_demo.augment_shards import MaterializedAugmentDataset
+from mnist_demo.augment_shards import materialize_augment_shards
+from mnist_demo.mnist_dataset import MNIST_TEST_SAMPLES
+from mnist_demo.mnist_dataset import MNIST_TRAIN_SAMPLES
+from mnist_demo.mnist_dataset import load_mnist
+from mnist_demo.mnist_tools import PACKED_IMAGE_BYTES
 from mnist_demo.mnist_tools import pack_binary_image
-from mnist_demo.mnist_tools import quantize_q8_8
+from mnist_demo.mnist_tools import quantize_q8_8_array
+from mnist_demo.mnist_tools import tile_weight_matrix
 from mnist_demo.mnist_tools import to_u16_hex
+from mnist_demo.model_container import MODEL_CONTAINER_NAME
+from mnist_demo.model_container import write_model_container
 
 
-MNIST_TRAIN_SAMPLES = 60000
-MNIST_TEST_SAMPLES = 10000
 Q8_8_SHIFT = 8
 IMAGE_SIDE = 28
 IMAGE_PIXELS = IMAGE_SIDE * IMAGE_SIDE
 Q8_8_MIN = -128.0
 Q8_8_MAX = 32767.0 / 256.0
+# float32 intensity of every raw pixel value, exactly as the former astype(float32) / 255.0 path computed it
+GRAYSCALE_LEVELS = np.arange(256, dtype=np.float32) / 255.0
+ROW_MASK = np.uint32((1 << IMAGE_SIDE) - 1)
+# Destination pixel offsets from the image centre, columns then rows, as apply_affine_nearest uses them.
+AFFINE_DESTINATION_GRID = np.indices((IMAGE_SIDE, IMAGE_SIDE), dtype=np.float32)[::-1].reshape(2, IMAGE_PIXELS) - (
+    (IMAGE_SIDE - 1) / 2.0
+)
+AFFINE_PARAMETER_NAMES = ("angle", "scale_x", "scale_y", "shear_x", "shear_y", "row_shift", "col_shift")
 
 
-def parse_args() -> argparse.Namespace:
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser()
     parser.add_argument("--hidden-size", type=int, default=64)
     parser.add_argument("--tile-width", type=int, default=2)
@@ -68,7 +91,89 @@ def parse_args() -> argparse.Namespace:
         type=Path,
         default=Path("data/model/generated"),
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--mnist-cache-dir",
+        type=Path,
+        default=None,
+        help="memory-mapped MNIST cache built by mnist_dataset.py (defaults to $MNIST_DEMO_DATA_DIR or data/mnist)",
+    )
+    parser.add_argument(
+        "--bit-cache-dir",
+        type=Path,
+        default=None,
+        help="persist the per-threshold packed-bit tensors here, keyed by dataset hash and raw threshold",
+    )
+    parser.add_argument(
+        "--num-workers",
+        type=int,
+        default=0,
+        help="DataLoader worker processes for the training set; batches are identical for any count",
+    )
+    parser.add_argument("--prefetch-factor", type=int, default=2, help="batches each worker keeps in flight")
+    parser.add_argument(
+        "--affine-cache-size",
+        type=int,
+        default=0,
+        help="memoize up to this many snapped affine gather tables (0 keeps the exact per-sample affine)",
+    )
+    parser.add_argument(
+        "--affine-cache-steps",
+        type=str,
+        default="2.5,0.05,0.05",
+        help="snapping steps for angle in degrees, scale and shear; translation snaps to whole pixels",
+    )
+    parser.add_argument(
+        "--augment-shard-dir",
+        type=Path,
+        default=None,
+        help="stream training epochs from packed-bit shards materialized here for the same augmentation settings",
+    )
+    parser.add_argument(
+        "--materialize-epochs",
+        type=int,
+        default=0,
+        help="write this many augmented epochs into --augment-shard-dir and exit without training",
+    )
+    parser.add_argument("--materialize-jobs", type=int, default=1, help="processes used by --materialize-epochs")
+    parser.add_argument(
+        "--sampling-mode",
+        choices=SAMPLING_MODES,
+        default="cartesian",
+        help="cartesian expands every (threshold, strength) pair; stochastic draws one pair per sample each epoch",
+    )
+    parser.add_argument(
+        "--samples-per-epoch",
+        type=int,
+        default=0,
+        help="stochastic epoch length (0 uses train samples x (augment copies + 1))",
+    )
+    parser.add_argument(
+        "--async-eval",
+        action="store_true",
+        help="run each epoch's exact Q8.8 eval on a background thread while the next epoch trains",
+    )
+    parser.add_argument(
+        "--checkpoint-dir",
+        type=Path,
+        default=None,
+        help="write model, optimizer, RNG and epoch state here every --checkpoint-interval epochs",
+    )
+    parser.add_argument("--checkpoint-interval", type=int, default=1)
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue from the checkpoint in --checkpoint-dir (starts fresh when there is none)",
+    )
+    parser.add_argument(
+        "--patience",
+        type=int,
+        default=0,
+        help="stop after this many epochs without beating the best exact accuracy by --min-delta (0 disables)",
+    )
+    parser.add_argument("--min-delta", type=float, default=0.0)
+    parser.add_argument("--threshold-weights", type=str, default="", help="comma-separated stochastic threshold weights")
+    parser.add_argument("--strength-weights", type=str, default="", help="comma-separated stochastic strength weights")
+    return parser.parse_args(argv)
 
 
 def summarize_class_counts(labels: np.ndarray, num_classes: int) -> dict[str, int]:
@@ -127,15 +232,9 @@ def load_mnist_grayscale(
     test_limit: int,
     seed: int,
     split_mode: str,
+    cache_dir: Path | None = None,
 ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, dict[str, int], dict[str, int]]:
-    features, labels = fetch_openml(
-        "mnist_784",
-        version=1,
-        as_frame=False,
-        return_X_y=True,
-        parser="liac-arff",
-    )
-    features = (features.astype(np.float32) / 255.0).clip(0.0, 1.0)
+    features, labels = load_mnist(cache_dir)
     labels = labels.astype(np.int64)
 
     if train_limit <= 0 or train_limit > MNIST_TRAIN_SAMPLES:
@@ -195,40 +294,102 @@ def shift_binary_image(image: np.ndarray, row_shift: int, col_shift: int) -> np.
     return shifted
 
 
+def pack_binary_rows(images: np.ndarray) -> np.ndarray:
+    # (..., 28, 28) binary pixels to (..., 28) uint32 rows with column c in bit c.
+    padded = np.zeros(images.shape[:-1] + (32,), dtype=bool)
+    padded[..., :IMAGE_SIDE] = images if images.dtype == np.bool_ else images > 0.5
+    rows = np.packbits(padded.reshape(-1), bitorder="little").view("<u4")
+    return rows.reshape(images.shape[:-1]).astype(np.uint32)
+
+
+def unpack_binary_rows(rows: np.ndarray) -> np.ndarray:
+    row_bytes = rows.astype("<u4")[..., None].view(np.uint8)
+    return np.unpackbits(row_bytes, axis=-1, count=IMAGE_SIDE, bitorder="little").view(bool)
+
+
+def dilate_binary_rows(rows: np.ndarray, radius: int | np.ndarray) -> np.ndarray:
+    # Square dilation on packed rows: shift-or across columns, then across rows, with everything
+    # past the canvas edge treated as background. radius may vary per image in a (..., 28) stack.
+    per_image = np.ndim(radius) > 0
+    radius = np.asarray(radius, dtype=np.int64)[..., None]
+    max_radius = int(radius.max(initial=0))
+    across = rows.copy()
+    for offset in range(1, max_radius + 1):
+        shifted = ((rows << offset) & ROW_MASK) | (rows >> offset)
+        across |= np.where(radius >= offset, shifted, np.uint32(0)) if per_image else shifted
+    dilated = across.copy()
+    for offset in range(1, max_radius + 1):
+        shifted = np.zeros_like(across)
+        shifted[..., offset:] = across[..., :-offset]
+        shifted[..., :-offset] |= across[..., offset:]
+        dilated |= np.where(radius >= offset, shifted, np.uint32(0)) if per_image else shifted
+    return dilated
+
+
+def erode_binary_rows(rows: np.ndarray, radius: int | np.ndarray) -> np.ndarray:
+    return ~dilate_binary_rows(~rows & ROW_MASK, radius) & ROW_MASK
+
+
 def dilate_binary_image(image: np.ndarray, radius: int) -> np.ndarray:
     if radius <= 0:
         return image.copy()
-
-    dilated = np.zeros_like(image)
-    for row_delta in range(-radius, radius + 1):
-        for col_delta in range(-radius, radius + 1):
-            dilated = np.maximum(dilated, shift_binary_image(image, row_delta, col_delta))
-    return dilated
+    return unpack_binary_rows(dilate_binary_rows(pack_binary_rows(image), radius)).astype(image.dtype)
 
 
 def erode_binary_image(image: np.ndarray, radius: int) -> np.ndarray:
     if radius <= 0:
         return image.copy()
-    return 1.0 - dilate_binary_image(1.0 - image, radius)
+    return unpack_binary_rows(erode_binary_rows(pack_binary_rows(image), radius)).astype(image.dtype)
 
 
-def apply_affine_nearest(
-    image: np.ndarray,
+def build_affine_transform(
+    angle: float,
+    scale_x: float,
+    scale_y: float,
+    shear_x: float,
+    shear_y: float,
+) -> np.ndarray:
+    angle_rad = np.deg2rad(angle)
+    rotation = np.array(
+        [
+            [np.cos(angle_rad), -np.sin(angle_rad)],
+            [np.sin(angle_rad), np.cos(angle_rad)],
+        ],
+        dtype=np.float32,
+    )
+    shear = np.array(
+        [
+            [1.0, shear_x],
+            [shear_y, 1.0],
+        ],
+        dtype=np.float32,
+    )
+    scale = np.array(
+        [
+            [scale_x, 0.0],
+            [0.0, scale_y],
+        ],
+        dtype=np.float32,
+    )
+    return rotation @ shear @ scale
+
+
+def affine_source_indices(
     transform: np.ndarray,
     row_shift: float,
     col_shift: float,
+    destination_grid: np.ndarray = AFFINE_DESTINATION_GRID,
 ) -> np.ndarray:
-    center = (IMAGE_SIDE - 1) / 2.0
-    dst_rows, dst_cols = np.indices((IMAGE_SIDE, IMAGE_SIDE), dtype=np.float32)
-    centered_cols = dst_cols.ravel() - center - col_shift
-    centered_rows = dst_rows.ravel() - center - row_shift
-    dst_points = np.stack([centered_cols, centered_rows], axis=0)
-
+    # Flat source pixel for every destination point; IMAGE_PIXELS marks a source off the canvas.
     try:
         inverse_transform = np.linalg.inv(transform)
     except np.linalg.LinAlgError:
-        return image.copy()
+        inverse_transform = np.eye(2, dtype=np.float32)
+        row_shift = 0.0
+        col_shift = 0.0
 
+    center = (IMAGE_SIDE - 1) / 2.0
+    dst_points = destination_grid - np.array([[col_shift], [row_shift]], dtype=np.float32)
     src_points = inverse_transform @ dst_points
     src_cols = np.rint(src_points[0] + center).astype(np.int64)
     src_rows = np.rint(src_points[1] + center).astype(np.int64)
@@ -238,12 +399,116 @@ def apply_affine_nearest(
         & (src_cols >= 0)
         & (src_cols < IMAGE_SIDE)
     )
+    return np.where(valid, (src_rows * IMAGE_SIDE) + src_cols, IMAGE_PIXELS)
 
-    output = np.zeros_like(image)
-    output_flat = output.ravel()
-    valid_positions = np.flatnonzero(valid)
-    output_flat[valid_positions] = image[src_rows[valid], src_cols[valid]]
-    return output
+
+def gather_flat_pixels(image: np.ndarray, sources: np.ndarray) -> np.ndarray:
+    return np.append(image.ravel(), np.zeros(1, dtype=image.dtype))[sources].reshape(image.shape)
+
+
+def apply_affine_nearest(
+    image: np.ndarray,
+    transform: np.ndarray,
+    row_shift: float,
+    col_shift: float,
+) -> np.ndarray:
+    return gather_flat_pixels(image, affine_source_indices(transform, row_shift, col_shift))
+
+
+class AffineGatherCache:
+    # Snaps the linear part (angle, scale_x, scale_y, shear_x, shear_y) to a grid and memoizes its
+    # source-index table in a bounded LRU. Tables cover the canvas plus a max_shift margin, so the
+    # translation becomes a whole-pixel offset into them instead of two more key dimensions. Every
+    # audit_interval-th lookup also builds the exact table to measure how many source pixels the snapping moved.
+    def __init__(
+        self,
+        *,
+        max_entries: int = 8192,
+        angle_step: float = 2.5,
+        scale_step: float = 0.05,
+        shear_step: float = 0.05,
+        max_shift: int = 8,
+        audit_interval: int = 64,
+    ) -> None:
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        if min(angle_step, scale_step, shear_step) <= 0.0:
+            raise ValueError("affine cache steps must be positive")
+        if max_shift < 0 or audit_interval < 0:
+            raise ValueError("max_shift and audit_interval must be non-negative")
+        self.max_entries = max_entries
+        self.steps = (angle_step, scale_step, scale_step, shear_step, shear_step)
+        self.max_shift = max_shift
+        self.audit_interval = audit_interval
+        side = IMAGE_SIDE + (2 * max_shift)
+        self._grid = np.indices((side, side), dtype=np.float32)[::-1].reshape(2, side * side) - (
+            max_shift + ((IMAGE_SIDE - 1) / 2.0)
+        )
+        rows, cols = np.indices((IMAGE_SIDE, IMAGE_SIDE))
+        self._destinations = ((rows + max_shift) * side) + cols + max_shift
+        self._side = side
+        self._tables: OrderedDict[tuple[int, ...], np.ndarray] = OrderedDict()
+        self.lookups = 0
+        self.hits = 0
+        self.evictions = 0
+        self.bypassed = 0
+        self.audited_lookups = 0
+        self.audit_mismatched_sources = 0
+        self._max_error = [0.0] * len(AFFINE_PARAMETER_NAMES)
+        self._total_error = [0.0] * len(AFFINE_PARAMETER_NAMES)
+
+    def lookup(self, params: Sequence[float]) -> np.ndarray:
+        if len(params) != len(AFFINE_PARAMETER_NAMES):
+            raise ValueError(f"expected {len(AFFINE_PARAMETER_NAMES)} affine parameters, got {len(params)}")
+        self.lookups += 1
+        row_offset = int(round(params[5]))
+        col_offset = int(round(params[6]))
+        if max(abs(row_offset), abs(col_offset)) > self.max_shift:
+            self.bypassed += 1
+            return affine_source_indices(build_affine_transform(*params[:5]), params[5], params[6])
+
+        key = tuple(int(round(value / step)) for value, step in zip(params[:5], self.steps))
+        snapped = [bin_index * step for bin_index, step in zip(key, self.steps)] + [row_offset, col_offset]
+        for position, (value, center) in enumerate(zip(params, snapped)):
+            error = abs(value - center)
+            self._total_error[position] += error
+            self._max_error[position] = max(self._max_error[position], error)
+
+        table = self._tables.get(key)
+        if table is None:
+            table = affine_source_indices(build_affine_transform(*snapped[:5]), 0.0, 0.0, self._grid)
+            self._tables[key] = table
+            if len(self._tables) > self.max_entries:
+                self._tables.popitem(last=False)
+                self.evictions += 1
+        else:
+            self.hits += 1
+            self._tables.move_to_end(key)
+        sources = table[(self._destinations - (row_offset * self._side) - col_offset).ravel()]
+
+        if self.audit_interval and self.lookups % self.audit_interval == 0:
+            exact = affine_source_indices(build_affine_transform(*params[:5]), params[5], params[6])
+            self.audited_lookups += 1
+            self.audit_mismatched_sources += int(np.count_nonzero(exact != sources))
+        return sources
+
+    def stats(self) -> dict[str, object]:
+        lookups = max(1, self.lookups)
+        audited_pixels = max(1, self.audited_lookups * IMAGE_PIXELS)
+        mean_error = [total / lookups for total in self._total_error]
+        return {
+            "audit_source_mismatch_rate": self.audit_mismatched_sources / audited_pixels,
+            "audited_lookups": self.audited_lookups,
+            "bypassed": self.bypassed,
+            "entries": len(self._tables),
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups,
+            "hits": self.hits,
+            "lookups": self.lookups,
+            "max_param_error": dict(zip(AFFINE_PARAMETER_NAMES, self._max_error)),
+            "mean_param_error": dict(zip(AFFINE_PARAMETER_NAMES, mean_error)),
+            "steps": dict(zip(AFFINE_PARAMETER_NAMES, [*self.steps, 1.0, 1.0])),
+        }
 
 
 def apply_row_slant(image: np.ndarray, slant: int) -> np.ndarray:
@@ -297,11 +562,89 @@ def add_random_blobs(
     return blobbed
 
 
+@dataclass(frozen=True)
+class AugmentationLimits:
+    max_angle: float
+    scale_min: float
+    scale_max: float
+    max_shear: float
+    max_translate: float
+    max_slant: int
+    max_holes: int
+    max_hole_size: int
+    max_blobs: int
+    max_blob_size: int
+    drop_max: float
+    salt_max: float
+    pepper_max: float
+
+
+AUGMENT_MODE_LIMITS = {
+    "strong": AugmentationLimits(
+        max_angle=15.0,
+        scale_min=0.80,
+        scale_max=1.20,
+        max_shear=0.18,
+        max_translate=3.5,
+        max_slant=3,
+        max_holes=2,
+        max_hole_size=4,
+        max_blobs=1,
+        max_blob_size=2,
+        drop_max=0.08,
+        salt_max=0.015,
+        pepper_max=0.025,
+    ),
+    "extreme": AugmentationLimits(
+        max_angle=25.0,
+        scale_min=0.70,
+        scale_max=1.30,
+        max_shear=0.30,
+        max_translate=5.0,
+        max_slant=5,
+        max_holes=3,
+        max_hole_size=6,
+        max_blobs=2,
+        max_blob_size=3,
+        drop_max=0.18,
+        salt_max=0.03,
+        pepper_max=0.05,
+    ),
+}
+
+
+SAMPLING_MODES = ("cartesian", "stochastic")
+
+
+def augmentation_limits(mode: str, strength: float) -> AugmentationLimits:
+    if mode not in AUGMENT_MODE_LIMITS:
+        raise ValueError(f"unsupported augment_mode: {mode}")
+    base = AUGMENT_MODE_LIMITS[mode]
+    max_holes = int(round(base.max_holes * strength))
+    max_blobs = int(round(base.max_blobs * strength))
+    return AugmentationLimits(
+        max_angle=base.max_angle * strength,
+        scale_min=1.0 - ((1.0 - base.scale_min) * strength),
+        scale_max=1.0 + ((base.scale_max - 1.0) * strength),
+        max_shear=base.max_shear * strength,
+        max_translate=base.max_translate * strength,
+        max_slant=int(round(base.max_slant * strength)),
+        max_holes=max_holes,
+        max_hole_size=max(1, int(round(base.max_hole_size * max(strength, 0.25)))) if max_holes > 0 else 0,
+        max_blobs=max_blobs,
+        max_blob_size=max(1, int(round(base.max_blob_size * max(strength, 0.25)))) if max_blobs > 0 else 0,
+        drop_max=base.drop_max * strength,
+        salt_max=base.salt_max * strength,
+        pepper_max=base.pepper_max * strength,
+    )
+
+
 def random_binary_augmentation(
     flat_bits: np.ndarray,
     rng: np.random.Generator,
     mode: str,
     strength: float,
+    affine_cache: AffineGatherCache | None = None,
 ) -> np.ndarray:
     if flat_bits.shape[0] != IMAGE_PIXELS:
         raise ValueError(f"expected {IMAGE_PIXELS} pixels, got {flat_bits.shape[0]}")
@@ -311,49 +654,7 @@ def random_binary_augmentation(
     image = flat_bits.reshape(IMAGE_SIDE, IMAGE_SIDE).astype(np.float32, copy=True)
     original = image.copy()
 
-    if mode == "strong":
-        max_angle = 15.0
-        scale_min = 0.80
-        scale_max = 1.20
-        max_shear = 0.18
-        max_translate = 3.5
-        max_slant = 3
-        max_holes = 2
-        max_hole_size = 4
-        max_blobs = 1
-        max_blob_size = 2
-        drop_max = 0.08
-        salt_max = 0.015
-        pepper_max = 0.025
-    elif mode == "extreme":
-        max_angle = 25.0
-        scale_min = 0.70
-        scale_max = 1.30
-        max_shear = 0.30
-        max_translate = 5.0
-        max_slant = 5
-        max_holes = 3
-        max_hole_size = 6
-        max_blobs = 2
-        max_blob_size = 3
-        drop_max = 0.18
-        salt_max = 0.03
-        pepper_max = 0.05
-    max_angle *= strength
-    scale_span_low = (1.0 - scale_min) * strength
-    scale_span_high = (scale_max - 1.0) * strength
-    scale_min = 1.0 - scale_span_low
-    scale_max = 1.0 + scale_span_high
-    max_shear *= strength
-    max_translate *= strength
-    max_slant = int(round(max_slant * strength))
-    max_holes = int(round(max_holes * strength))
-    max_hole_size = max(1, int(round(max_hole_size * max(strength, 0.25)))) if max_holes > 0 else 0
-    max_blobs = int(round(max_blobs * strength))
-    max_blob_size = max(1, int(round(max_blob_size * max(strength, 0.25)))) if max_blobs > 0 else 0
-    drop_max *= strength
-    salt_max *= strength
-    pepper_max *= strength
+    limits = augmentation_limits(mode, strength)
 
     if rng.random() < 0.35:
         nonzero = np.argwhere(image > 0.5)
@@ -364,46 +665,28 @@ def random_binary_augmentation(
             col_shift = int(round(((IMAGE_SIDE - 1) / 2.0) - center_col))
             image = shift_binary_image(image, row_shift, col_shift)
 
-    angle = float(rng.uniform(-max_angle, max_angle))
-    angle_rad = np.deg2rad(angle)
-    scale_x = float(rng.uniform(scale_min, scale_max))
-    scale_y = float(rng.uniform(scale_min, scale_max))
-    shear_x = float(rng.uniform(-max_shear, max_shear))
-    shear_y = float(rng.uniform(-max_shear, max_shear))
-    row_shift_f = float(rng.uniform(-max_translate, max_translate))
-    col_shift_f = float(rng.uniform(-max_translate, max_translate))
-
-    rotation = np.array(
-        [
-            [np.cos(angle_rad), -np.sin(angle_rad)],
-            [np.sin(angle_rad), np.cos(angle_rad)],
-        ],
-        dtype=np.float32,
-    )
-    shear = np.array(
-        [
-            [1.0, shear_x],
-            [shear_y, 1.0],
-        ],
-        dtype=np.float32,
-    )
-    scale = np.array(
-        [
-            [scale_x, 0.0],
-            [0.0, scale_y],
-        ],
-        dtype=np.float32,
-    )
-    transform = rotation @ shear @ scale
-    image = apply_affine_nearest(
-        image=image,
-        transform=transform,
-        row_shift=row_shift_f,
-        col_shift=col_shift_f,
-    )
+    angle = float(rng.uniform(-limits.max_angle, limits.max_angle))
+    scale_x = float(rng.uniform(limits.scale_min, limits.scale_max))
+    scale_y = float(rng.uniform(limits.scale_min, limits.scale_max))
+    shear_x = float(rng.uniform(-limits.max_shear, limits.max_shear))
+    shear_y = float(rng.uniform(-limits.max_shear, limits.max_shear))
+    row_shift_f = float(rng.uniform(-limits.max_translate, limits.max_translate))
+    col_shift_f = float(rng.uniform(-limits.max_translate, limits.max_translate))
+
+    if affine_cache is None:
+        transform = build_affine_transform(angle, scale_x, scale_y, shear_x, shear_y)
+        image = apply_affine_nearest(
+            image=image,
+            transform=transform,
+            row_shift=row_shift_f,
+            col_shift=col_shift_f,
+        )
+    else:
+        sources = affine_cache.lookup((angle, scale_x, scale_y, shear_x, shear_y, row_shift_f, col_shift_f))
+        image = gather_flat_pixels(image, sources)
 
-    if max_slant > 0:
-        slant = int(rng.integers(-max_slant, max_slant + 1))
+    if limits.max_slant > 0:
+        slant = int(rng.integers(-limits.max_slant, limits.max_slant + 1))
         image = apply_row_slant(image, slant)
 
     if rng.random() < (0.90 * strength):
@@ -413,24 +696,24 @@ def random_binary_augmentation(
         erosion_radius = max(1, int(rng.integers(1, 3)))
         image = erode_binary_image(image, erosion_radius)
 
-    if max_holes > 0 and max_hole_size > 0:
+    if limits.max_holes > 0 and limits.max_hole_size > 0:
         image = carve_random_holes(
             image=image,
             rng=rng,
-            max_holes=max_holes,
-            max_size=max_hole_size,
+            max_holes=limits.max_holes,
+            max_size=limits.max_hole_size,
         )
-    if max_blobs > 0 and max_blob_size > 0:
+    if limits.max_blobs > 0 and limits.max_blob_size > 0:
         image = add_random_blobs(
             image=image,
             rng=rng,
-            max_blobs=max_blobs,
-            max_size=max_blob_size,
+            max_blobs=limits.max_blobs,
+            max_size=limits.max_blob_size,
         )
 
-    active_drop_prob = float(rng.uniform(0.0, drop_max))
-    salt_prob = float(rng.uniform(0.0, salt_max))
-    pepper_prob = float(rng.uniform(0.0, pepper_max))
+    active_drop_prob = float(rng.uniform(0.0, limits.drop_max))
+    salt_prob = float(rng.uniform(0.0, limits.salt_max))
+    pepper_prob = float(rng.uniform(0.0, limits.pepper_max))
 
     active_mask = image > 0.5
     if active_drop_prob > 0:
@@ -448,6 +731,179 @@ def random_binary_augmentation(
     return image.reshape(IMAGE_PIXELS)
 
 
+def _flat_sources(src_rows: np.ndarray, src_cols: np.ndarray) -> np.ndarray:
+    valid = (src_rows >= 0) & (src_rows < IMAGE_SIDE) & (src_cols >= 0) & (src_cols < IMAGE_SIDE)
+    return np.where(valid, (src_rows * IMAGE_SIDE) + src_cols, IMAGE_PIXELS)
+
+
+def _gather_binary_batch(images: np.ndarray, sources: np.ndarray) -> np.ndarray:
+    # Nearest-neighbour pull from each image in (B, 28, 28) through flat source indices; IMAGE_PIXELS
+    # reads the background pixel appended after the last real one.
+    batch_size = images.shape[0]
+    padded = np.zeros((batch_size, IMAGE_PIXELS + 1), dtype=bool)
+    padded[:, :IMAGE_PIXELS] = images.reshape(batch_size, IMAGE_PIXELS)
+    sources = np.broadcast_to(sources.reshape(-1, IMAGE_PIXELS), (batch_size, IMAGE_PIXELS))
+    return np.take_along_axis(padded, sources, axis=1).reshape(images.shape)
+
+
+def _rectangle_masks(rectangles: np.ndarray) -> np.ndarray:
+    # rectangles is (B, K, 4) of row, height, col, width; zero-height slots paint nothing.
+    rows = np.arange(IMAGE_SIDE)
+    row_start = rectangles[:, :, 0, None]
+    col_start = rectangles[:, :, 2, None]
+    in_rows = (rows >= row_start) & (rows < row_start + rectangles[:, :, 1, None])
+    in_cols = (rows >= col_start) & (rows < col_start + rectangles[:, :, 3, None])
+    return (in_rows[:, :, :, None] & in_cols[:, :, None, :]).any(axis=1)
+
+
+def _draw_rectangles(rng: np.random.Generator, max_count: int, max_size: int, slots: np.ndarray) -> None:
+    for slot in range(int(rng.integers(0, max_count + 1))):
+        height = int(rng.integers(1, max_size + 1))
+        width = int(rng.integers(1, max_size + 1))
+        slots[slot] = (
+            int(rng.integers(0, IMAGE_SIDE - height + 1)),
+            height,
+            int(rng.integers(0, IMAGE_SIDE - width + 1)),
+            width,
+        )
+
+
+def random_binary_augmentation_batch(
+    flat_bits: np.ndarray,
+    rngs: Sequence[np.random.Generator],
+    mode: str,
+    strengths: Sequence[float],
+    affine_cache: AffineGatherCache | None = None,
+) -> np.ndarray:
+    # Draws every image's parameters from its own generator in the order random_binary_augmentation
+    # does, then applies each stage to the whole (B, 28, 28) stack, so row i matches the scalar call.
+    if flat_bits.ndim != 2 or flat_bits.shape[1] != IMAGE_PIXELS:
+        raise ValueError(f"expected [B, {IMAGE_PIXELS}] pixels")
+    batch_size = flat_bits.shape[0]
+    if len(rngs) != batch_size or len(strengths) != batch_size:
+        raise ValueError("need one generator and one strength per image")
+
+    output = flat_bits.astype(np.float32, copy=True)
+    if mode == "none":
+        return output
+    active = np.flatnonzero(np.asarray(strengths, dtype=np.float64) > 0.0)
+    if active.size == 0:
+        return output
+    count = active.size
+
+    limits_by_strength = {
+        strength: augmentation_limits(mode, strength)
+        for strength in {float(strengths[index]) for index in active}
+    }
+    limits = [limits_by_strength[float(strengths[index])] for index in active]
+    recenter = np.zeros(count, dtype=bool)
+    affine = np.zeros((count, 7), dtype=np.float64)
+    slants = np.zeros(count, dtype=np.int64)
+    dilation_radii = np.zeros(count, dtype=np.int64)
+    erosion_radii = np.zeros(count, dtype=np.int64)
+    holes = np.zeros((count, max(item.max_holes for item in limits), 4), dtype=np.int64)
+    blobs = np.zeros((count, max(item.max_blobs for item in limits), 4), dtype=np.int64)
+    noise_probs = np.zeros((count, 3), dtype=np.float64)
+    noise_draws = np.ones((count, 3, IMAGE_SIDE, IMAGE_SIDE), dtype=np.float64)
+    affine_bounds = {}
+    for strength, item in limits_by_strength.items():
+        affine_low = [-item.max_angle, item.scale_min, item.scale_min, -item.max_shear, -item.max_shear]
+        affine_high = [item.max_angle, item.scale_max, item.scale_max, item.max_shear, item.max_shear]
+        affine_bounds[strength] = (
+            np.array(affine_low + [-item.max_translate, -item.max_translate]),
+            np.array(affine_high + [item.max_translate, item.max_translate]),
+            np.array([item.drop_max, item.salt_max, item.pepper_max]),
+        )
+
+    for slot, (index, item) in enumerate(zip(active, limits)):
+        # Array-valued uniform() and random() consume the stream exactly like the scalar calls in sequence.
+        rng = rngs[index]
+        strength = float(strengths[index])
+        affine_low, affine_high, noise_high = affine_bounds[strength]
+        recenter[slot] = rng.random() < 0.35
+        affine[slot] = rng.uniform(affine_low, affine_high)
+        if item.max_slant > 0:
+            slants[slot] = rng.integers(-item.max_slant, item.max_slant + 1)
+        if rng.random() < (0.90 * strength):
+            dilation_radii[slot] = rng.integers(1, 3)
+        if rng.random() < (0.30 * strength):
+            erosion_radii[slot] = rng.integers(1, 3)
+        if item.max_holes > 0 and item.max_hole_size > 0:
+            _draw_rectangles(rng, item.max_holes, item.max_hole_size, holes[slot])
+        if item.max_blobs > 0 and item.max_blob_size > 0:
+            _draw_rectangles(rng, item.max_blobs, item.max_blob_size, blobs[slot])
+        noise_probs[slot] = rng.uniform(0.0, noise_high)
+        drawn_stages = noise_probs[slot] > 0
+        noise_draws[slot, drawn_stages] = rng.random((int(drawn_stages.sum()), IMAGE_SIDE, IMAGE_SIDE))
+
+    images = flat_bits[active].reshape(count, IMAGE_SIDE, IMAGE_SIDE) > 0.5
+    rows, cols = np.indices((IMAGE_SIDE, IMAGE_SIDE))
+    center = (IMAGE_SIDE - 1) / 2.0
+
+    pixel_counts = images.sum(axis=(1, 2))
+    recenter &= pixel_counts > 0
+    divisor = np.maximum(pixel_counts, 1)
+    center_rows = (images * rows).sum(axis=(1, 2)) / divisor
+    center_cols = (images * cols).sum(axis=(1, 2)) / divisor
+    row_shift = np.where(recenter, np.rint(center - center_rows), 0).astype(np.int64)
+    col_shift = np.where(recenter, np.rint(center - center_cols), 0).astype(np.int64)
+    recentered = _flat_sources(rows - row_shift[:, None, None], cols - col_shift[:, None, None])
+    images = _gather_binary_batch(images, recentered)
+
+    if affine_cache is not None:
+        sources = np.stack([affine_cache.lookup(params) for params in affine.tolist()])
+    else:
+        angle_rad = np.deg2rad(affine[:, 0])
+        cos = np.cos(angle_rad)
+        sin = np.sin(angle_rad)
+        ones = np.ones(count)
+        zeros = np.zeros(count)
+        rotation = np.stack([cos, -sin, sin, cos], axis=1).astype(np.float32).reshape(count, 2, 2)
+        shear = np.stack([ones, affine[:, 3], affine[:, 4], ones], axis=1).astype(np.float32).reshape(count, 2, 2)
+        scale = np.stack([affine[:, 1], zeros, zeros, affine[:, 2]], axis=1).astype(np.float32).reshape(count, 2, 2)
+        transform = rotation @ shear @ scale
+        invertible = np.ones(count, dtype=bool)
+        try:
+            inverse = np.linalg.inv(transform)
+        except np.linalg.LinAlgError:
+            # apply_affine_nearest leaves a singular transform's image untouched, so find those one by one.
+            inverse = np.zeros_like(transform)
+            for slot in range(count):
+                try:
+                    inverse[slot] = np.linalg.inv(transform[slot])
+                except np.linalg.LinAlgError:
+                    invertible[slot] = False
+        dst_points = AFFINE_DESTINATION_GRID - affine[:, [6, 5], None].astype(np.float32)
+        src_points = inverse @ dst_points
+        src_cols = np.rint(src_points[:, 0] + center).astype(np.int64).reshape(count, IMAGE_SIDE, IMAGE_SIDE)
+        src_rows = np.rint(src_points[:, 1] + center).astype(np.int64).reshape(count, IMAGE_SIDE, IMAGE_SIDE)
+        src_rows[~invertible] = rows
+        src_cols[~invertible] = cols
+        sources = _flat_sources(src_rows, src_cols)
+    images = _gather_binary_batch(images, sources)
+
+    row_ratio = (np.arange(IMAGE_SIDE) - center) / center
+    slant_shift = np.rint(row_ratio[None, :] * slants[:, None]).astype(np.int64)
+    slanted = _flat_sources(rows[None, :, :], cols[None, :, :] - slant_shift[:, :, None])
+    images = _gather_binary_batch(images, slanted)
+
+    packed_rows = dilate_binary_rows(pack_binary_rows(images), dilation_radii)
+    images = unpack_binary_rows(erode_binary_rows(packed_rows, erosion_radii))
+    if holes.shape[1]:
+        images &= ~_rectangle_masks(holes)
+    if blobs.shape[1]:
+        images |= _rectangle_masks(blobs)
+
+    images &= ~(noise_draws[:, 0] < noise_probs[:, 0, None, None])
+    images |= noise_draws[:, 1] < noise_probs[:, 1, None, None]
+    images &= ~(noise_draws[:, 2] < noise_probs[:, 2, None, None])
+
+    # An image the augmentation wiped out entirely keeps its original pixels.
+    painted = images.any(axis=(1, 2))
+    output[active[painted]] = images[painted].reshape(-1, IMAGE_PIXELS)
+    return output
+
+
 def build_threshold_schedule(args: argparse.Namespace) -> tuple[list[float], float]:
     if args.pixel_threshold is not None:
         threshold = float(args.pixel_threshold)
@@ -489,11 +945,57 @@ def build_augmentation_strengths(args: argparse.Namespace) -> list[float]:
     return [float(value) for value in np.linspace(0.0, 1.0, num=levels)]
 
 
-def binarize_grayscale(flat_pixels: np.ndarray, threshold: float) -> np.ndarray:
+def grayscale_threshold_raw(threshold: float) -> int:
+    # Largest raw value whose float32 intensity is <= the float32 threshold, so raw > result
+    # matches the float comparison bit for bit. -1 keeps every pixel, 255 drops all of them.
+    clipped_threshold = np.float32(min(max(float(threshold), 0.0), 1.0))
+    return int(np.count_nonzero(GRAYSCALE_LEVELS <= clipped_threshold)) - 1
+
+
+def binarize_grayscale(flat_pixels: np.ndarray, threshold_raw: int) -> np.ndarray:
     if flat_pixels.shape[0] != IMAGE_PIXELS:
         raise ValueError(f"expected {IMAGE_PIXELS} pixels, got {flat_pixels.shape[0]}")
-    clipped_threshold = min(max(float(threshold), 0.0), 1.0)
-    return (flat_pixels > clipped_threshold).astype(np.float32)
+    if flat_pixels.dtype != np.uint8:
+        raise ValueError(f"expected uint8 pixels, got {flat_pixels.dtype}")
+    return (flat_pixels > threshold_raw).astype(np.float32)
+
+
+def schedule_weights(weights: Sequence[float] | None, count: int, name: str) -> list[float] | None:
+    if weights is None or len(weights) == 0:
+        return None
+    if len(weights) != count:
+        raise ValueError(f"{name} needs {count} values, got {len(weights)}")
+    if min(weights) < 0.0 or sum(weights) <= 0.0:
+        raise ValueError(f"{name} must be non-negative with a positive sum")
+    total = float(sum(weights))
+    return [float(weight) / total for weight in weights]
+
+
+def build_packed_bit_cache(
+    raw_x: np.ndarray,
+    thresholds_raw: list[int],
+    cache_dir: Path | None = None,
+) -> list[np.ndarray]:
+    dataset_hash = ""
+    if cache_dir is not None:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        dataset_hash = hashlib.sha256(memoryview(np.ascontiguousarray(raw_x)).cast("B")).hexdigest()[:16]
+
+    packed: list[np.ndarray] = []
+    for threshold_raw in thresholds_raw:
+        path = cache_dir / f"bits_{dataset_hash}_gt{threshold_raw}.npy" if cache_dir is not None else None
+        if path is not None and path.is_file():
+            packed.append(np.load(path, mmap_mode="r"))
+            continue
+        bits = np.packbits(raw_x > threshold_raw, axis=1, bitorder="little")
+        if path is not None:
+            # Renamed into place so concurrent trainers sharing the cache never read a partial file.
+            partial = path.with_name(f"{path.stem}.{os.getpid()}.partial")
+            with partial.open("wb") as handle:
+                np.save(handle, bits)
+            partial.replace(path)
+        packed.append(bits)
+    return packed
 
 
 class SpectrumBinaryMnistDataset(Dataset[tuple[torch.Tensor, torch.Tensor]]):
@@ -508,9 +1010,17 @@ class SpectrumBinaryMnistDataset(Dataset[tuple[torch.Tensor, torch.Tensor]]):
         threshold_values: list[float],
         augment_strengths: list[float],
         seed: int,
+        bit_cache_dir: Path | None = None,
+        affine_cache: AffineGatherCache | None = None,
+        sampling_mode: str = "cartesian",
+        samples_per_epoch: int | None = None,
+        threshold_weights: Sequence[float] | None = None,
+        strength_weights: Sequence[float] | None = None,
     ) -> None:
         if raw_x.ndim != 2 or raw_x.shape[1] != IMAGE_PIXELS:
             raise ValueError(f"expected [N, {IMAGE_PIXELS}] grayscale inputs")
+        if raw_x.dtype != np.uint8:
+            raise ValueError(f"expected uint8 grayscale inputs, got {raw_x.dtype}")
         if raw_y.ndim != 1 or raw_y.shape[0] != raw_x.shape[0]:
             raise ValueError("labels must align with raw_x")
         if augment_copies < 0:
@@ -519,6 +1029,14 @@ class SpectrumBinaryMnistDataset(Dataset[tuple[torch.Tensor, torch.Tensor]]):
             raise ValueError("threshold_values must be non-empty")
         if not augment_strengths:
             raise ValueError("augment_strengths must be non-empty")
+        if sampling_mode not in SAMPLING_MODES:
+            raise ValueError(f"unsupported sampling_mode: {sampling_mode}")
+        if sampling_mode == "stochastic" and not training:
+            raise ValueError("stochastic sampling only applies to training datasets")
+        if sampling_mode == "cartesian" and (samples_per_epoch is not None or threshold_weights or strength_weights):
+            raise ValueError("samples_per_epoch and schedule weights need sampling_mode='stochastic'")
+        if samples_per_epoch is not None and samples_per_epoch <= 0:
+            raise ValueError("samples_per_epoch must be positive")
 
         self.raw_x = raw_x
         self.raw_y = raw_y
@@ -526,45 +1044,182 @@ class SpectrumBinaryMnistDataset(Dataset[tuple[torch.Tensor, torch.Tensor]]):
         self.augment_copies = augment_copies
         self.augment_mode = augment_mode
         self.threshold_values = [float(value) for value in threshold_values]
+        self.thresholds_raw = [grayscale_threshold_raw(value) for value in self.threshold_values]
+        self.packed_bits = build_packed_bit_cache(raw_x, self.thresholds_raw, bit_cache_dir)
         self.augment_strengths = [float(value) for value in augment_strengths]
+        self.affine_cache = affine_cache
         self.seed = seed
-        self.epoch = 0
+        # Shared memory, so DataLoader workers (persistent or not) see set_epoch from the main process.
+        self._epoch = torch.zeros((), dtype=torch.int64).share_memory_()
         self.threshold_count = len(self.threshold_values)
         self.augment_count = len(self.augment_strengths)
         self.replica_count = (augment_copies + 1) if training else 1
+        self.sampling_mode = sampling_mode
+        self.threshold_weights = schedule_weights(threshold_weights, self.threshold_count, "threshold_weights")
+        self.strength_weights = schedule_weights(strength_weights, self.augment_count, "strength_weights")
+        self.samples_per_epoch = samples_per_epoch or int(raw_y.shape[0] * self.replica_count)
+        self._draws_epoch = -1
+        self._draws = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+    @property
+    def epoch(self) -> int:
+        return int(self._epoch)
 
     def set_epoch(self, epoch: int) -> None:
-        self.epoch = max(0, int(epoch))
+        self._epoch.fill_(max(0, int(epoch)))
+
+    def materialize_batches(self, batch_size: int) -> list[tuple[torch.Tensor, torch.Tensor]]:
+        # Same items and order as iterating an unshuffled DataLoader, without re-unpacking them every epoch.
+        if self.training:
+            raise ValueError("only eval datasets have fixed inputs to materialize")
+        if batch_size <= 0:
+            raise ValueError("batch_size must be positive")
+        features, labels = self.get_batch(range(len(self)))
+        return list(zip(features.split(batch_size), labels.split(batch_size)))
 
     def __len__(self) -> int:
+        if self.sampling_mode == "stochastic":
+            return self.samples_per_epoch
         return int(self.raw_y.shape[0] * self.threshold_count * self.augment_count * self.replica_count)
 
-    def __getitem__(self, index: int) -> tuple[torch.Tensor, torch.Tensor]:
+    def item_labels(self, epoch: int | None = None) -> np.ndarray:
+        epoch = self.epoch if epoch is None else epoch
+        return np.asarray(self.raw_y, dtype=np.uint8)[self._sample_indices(np.arange(len(self)), epoch)]
+
+    def sampling_policy(self) -> dict[str, object]:
+        return {
+            "mode": self.sampling_mode,
+            "samples_per_epoch": len(self),
+            "strength_weights": self.strength_weights,
+            "threshold_weights": self.threshold_weights,
+        }
+
+    def _schedule_draws(self, epoch: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # One (base sample, threshold, strength) draw per item per epoch, shared by every batch and worker
+        # of that epoch.
+        if self._draws_epoch != epoch:
+            rng = np.random.default_rng([self.seed, epoch])
+            self._draws = (
+                self._deal_base_samples(epoch),
+                rng.choice(self.threshold_count, size=len(self), p=self.threshold_weights),
+                rng.choice(self.augment_count, size=len(self), p=self.strength_weights),
+            )
+            self._draws_epoch = epoch
+        return self._draws
+
+    def _deal_base_samples(self, epoch: int) -> np.ndarray:
+        # Epochs deal consecutive stretches of a stream of per-pass permutations, so an epoch shorter
+        # than the train set still reaches every base sample within ceil(base / samples_per_epoch) epochs.
         base_count = int(self.raw_y.shape[0])
-        sample_index = index % base_count
-        combo_index = index // base_count
-        threshold_index = combo_index % self.threshold_count
-        combo_index //= self.threshold_count
-        strength_index = combo_index % self.augment_count
-        replica_index = combo_index // self.augment_count
+        positions = epoch * len(self) + np.arange(len(self), dtype=np.int64)
+        passes = positions // base_count
+        samples = np.empty(len(self), dtype=np.int64)
+        for pass_index in np.unique(passes):
+            rows = passes == pass_index
+            # Three entropy words keep these streams apart from the [seed, epoch] schedule streams.
+            order = np.random.default_rng([self.seed, int(pass_index), 0]).permutation(base_count)
+            samples[rows] = order[positions[rows] % base_count]
+        return samples
+
+    def _sample_indices(self, index_array: np.ndarray, epoch: int) -> np.ndarray:
+        if self.sampling_mode == "stochastic":
+            return self._schedule_draws(epoch)[0][index_array]
+        return index_array % int(self.raw_y.shape[0])
+
+    def augmentation_key(self) -> str:
+        # Everything get_batch output depends on: two datasets with the same key yield identical epochs.
+        digest = hashlib.sha256()
+        digest.update(memoryview(np.ascontiguousarray(self.raw_x)).cast("B"))
+        digest.update(memoryview(np.ascontiguousarray(self.raw_y, dtype=np.uint8)).cast("B"))
+        settings = {
+            "affine_cache": None if self.affine_cache is None else [*self.affine_cache.steps, self.affine_cache.max_shift],
+            "augment_copies": self.augment_copies,
+            "augment_mode": self.augment_mode,
+            "augment_strengths": self.augment_strengths,
+            "sampling": self.sampling_policy(),
+            "seed": self.seed,
+            "thresholds_raw": self.thresholds_raw,
+            "training": self.training,
+        }
+        digest.update(json.dumps(settings, sort_keys=True).encode("ascii"))
+        return digest.hexdigest()[:24]
+
+    def get_batch(self, indices: Sequence[int], epoch: int | None = None) -> tuple[torch.Tensor, torch.Tensor]:
+        index_array = np.asarray(indices, dtype=np.int64)
+        if index_array.ndim != 1:
+            raise ValueError("indices must be one-dimensional")
+        if index_array.size and (index_array.min() < 0 or index_array.max() >= len(self)):
+            raise IndexError(f"dataset index out of range for length {len(self)}")
+
+        epoch = self.epoch if epoch is None else epoch
+        base_count = int(self.raw_y.shape[0])
+        sample_index = self._sample_indices(index_array, epoch)
+        if self.sampling_mode == "stochastic":
+            _, threshold_draws, strength_draws = self._schedule_draws(epoch)
+            threshold_index = threshold_draws[index_array]
+            strength_index = strength_draws[index_array]
+        else:
+            combo_index = index_array // base_count
+            threshold_index = combo_index % self.threshold_count
+            strength_index = (combo_index // self.threshold_count) % self.augment_count
+
+        packed = np.empty((index_array.shape[0], PACKED_IMAGE_BYTES), dtype=np.uint8)
+        for threshold, threshold_bits in enumerate(self.packed_bits):
+            rows = threshold_index == threshold
+            packed[rows] = threshold_bits[sample_index[rows]]
+        bits = np.unpackbits(packed, axis=1, count=IMAGE_PIXELS, bitorder="little").astype(np.float32)
+
+        if self.training and self.augment_mode != "none":
+            # Each item keeps its own seed, so a batch matches the same indices drawn one at a time.
+            strengths = np.asarray(self.augment_strengths, dtype=np.float64)[strength_index]
+            seed_base = self.seed + (epoch * max(1, len(self)))
+            rows = np.flatnonzero(strengths > 0.0)
+            bits[rows] = random_binary_augmentation_batch(
+                bits[rows],
+                rngs=[np.random.default_rng(seed_base + int(index_array[row])) for row in rows],
+                mode=self.augment_mode,
+                strengths=strengths[rows].tolist(),
+                affine_cache=self.affine_cache,
+            )
 
-        rng_seed = self.seed + (self.epoch * max(1, len(self))) + index
-        rng = np.random.default_rng(rng_seed)
+        return torch.from_numpy(bits), torch.from_numpy(self.raw_y[sample_index].astype(np.int64))
 
-        threshold = self.threshold_values[threshold_index]
-        strength = self.augment_strengths[strength_index]
+    def __getitems__(self, indices: list[int]) -> tuple[torch.Tensor, torch.Tensor]:
+        return self.get_batch(indices)
 
-        bits = binarize_grayscale(self.raw_x[sample_index], threshold)
+    def __getitem__(self, index: int) -> tuple[torch.Tensor, torch.Tensor]:
+        features, labels = self.get_batch([index])
+        return features[0], labels[0]
 
-        if self.training and self.augment_mode != "none" and strength > 0.0:
-            bits = random_binary_augmentation(bits, rng=rng, mode=self.augment_mode, strength=strength)
-        elif self.training and replica_index > 0 and self.augment_mode != "none" and strength == 0.0:
-            bits = bits.copy()
 
-        return (
-            torch.from_numpy(bits.astype(np.float32, copy=False)),
-            torch.tensor(int(self.raw_y[sample_index]), dtype=torch.long),
-        )
+def collate_spectrum_batch(batch: tuple[torch.Tensor, torch.Tensor]) -> tuple[torch.Tensor, torch.Tensor]:
+    # SpectrumBinaryMnistDataset.__getitems__ already returns stacked tensors.
+    return batch
+
+
+def build_train_loader(
+    dataset: SpectrumBinaryMnistDataset | MaterializedAugmentDataset,
+    *,
+    batch_size: int,
+    seed: int,
+    num_workers: int = 0,
+    prefetch_factor: int = 2,
+) -> DataLoader[tuple[torch.Tensor, torch.Tensor]]:
+    # The shuffle gets its own generator: the global torch RNG is also drawn for every new loader
+    # iterator, which happens each epoch without workers but only once with persistent workers.
+    if num_workers < 0:
+        raise ValueError("num_workers must be non-negative")
+    sampler = RandomSampler(dataset, generator=torch.Generator().manual_seed(seed))
+    return DataLoader(
+        dataset,
+        batch_size=batch_size,
+        sampler=sampler,
+        num_workers=num_workers,
+        drop_last=False,
+        collate_fn=collate_spectrum_batch,
+        persistent_workers=num_workers > 0,
+        prefetch_factor=prefetch_factor if num_workers > 0 else None,
+    )
 
 
 def fake_quantize_q8_8_tensor(tensor: torch.Tensor) -> torch.Tensor:
@@ -621,7 +1276,7 @@ def extract_quantized_parameters(
     return w1, b1, w2, b2
 
 
-def exact_q8_8_batch_inference(
+def exact_q8_8_sequential_inference(
     bits_batch: torch.Tensor,
     w1: torch.Tensor,
     b1: torch.Tensor,
@@ -637,7 +1292,10 @@ def exact_q8_8_batch_inference(
 
     hidden = sat_add_tensor(hidden_acc, b1.unsqueeze(0))
     hidden = torch.clamp(hidden, min=0, max=0x7FFF)
+    return _exact_q8_8_output_layer(hidden, w2, b2)
+
 
+def _exact_q8_8_output_layer(hidden: torch.Tensor, w2: torch.Tensor, b2: torch.Tensor) -> torch.Tensor:
     logits_acc = torch.zeros((hidden.shape[0], w2.shape[1]), dtype=torch.int32)
     for hidden_index in range(hidden.shape[1]):
         products = wrap_s16_tensor((hidden[:, hidden_index:hidden_index + 1] * w2[hidden_index].unsqueeze(0)) >> Q8_8_SHIFT)
@@ -646,16 +1304,80 @@ def exact_q8_8_batch_inference(
     return sat_add_tensor(logits_acc, b2.unsqueeze(0))
 
 
-def evaluate_exact_q8_8_accuracy(
-    model: QuantizedMnistMLP,
-    data_loader: DataLoader[tuple[torch.Tensor, torch.Tensor]],
+def exact_q8_8_sparse_inference(
+    bits_batch: torch.Tensor,
+    w1: torch.Tensor,
+    b1: torch.Tensor,
+    w2: torch.Tensor,
+    b2: torch.Tensor,
+) -> torch.Tensor:
+    # A dark pixel contributes a zero product, which a saturating add leaves unchanged, so the
+    # hidden accumulation only has to visit lit pixels, in ascending order, padded to the busiest row.
+    active = bits_batch > 0.5
+    active_counts = active.sum(dim=1)
+    width = int(active_counts.max()) if active.shape[0] else 0
+    active_pixels = torch.argsort((~active).to(torch.int8), dim=1, stable=True)[:, :width]
+    valid = torch.arange(width).unsqueeze(0) < active_counts.unsqueeze(1)
+    w1_rows = wrap_s16_tensor(w1)
+
+    hidden_acc = torch.zeros((bits_batch.shape[0], w1.shape[1]), dtype=torch.int32)
+    for slot in range(width):
+        products = w1_rows[active_pixels[:, slot]] * valid[:, slot:slot + 1]
+        hidden_acc = sat_add_tensor(hidden_acc, products)
+
+    hidden = sat_add_tensor(hidden_acc, b1.unsqueeze(0))
+    hidden = torch.clamp(hidden, min=0, max=0x7FFF)
+    return _exact_q8_8_output_layer(hidden, w2, b2)
+
+
+def _unsaturated(terms_positive: torch.Tensor, terms_total: torch.Tensor) -> torch.Tensor:
+    # Every partial sum of the terms lies between the negative-only and positive-only sums, so when
+    # both fit in s16 the hardware's saturating adds never clip and the plain sum is exact.
+    return ((terms_positive <= 0x7FFF) & ((terms_total - terms_positive) >= -0x8000)).all(dim=1)
+
+
+def exact_q8_8_batch_inference(
+    bits_batch: torch.Tensor,
+    w1: torch.Tensor,
+    b1: torch.Tensor,
+    w2: torch.Tensor,
+    b2: torch.Tensor,
+    stats: dict[str, int] | None = None,
+) -> torch.Tensor:
+    # Bit inputs are 0 or 1.0 in Q8.8, so each hidden term is exactly the s16 weight. Rows whose
+    # accumulations provably never saturate take an int64 matmul; the rest run the sparse kernel.
+    active = (bits_batch > 0.5).to(torch.int64)
+    w1_wide = wrap_s16_tensor(w1.to(torch.int64))
+    hidden_sums = active @ torch.cat([w1_wide, torch.clamp(w1_wide, min=0)], dim=1)
+    hidden_acc, hidden_positive = hidden_sums.split(w1.shape[1], dim=1)
+    certified = _unsaturated(hidden_positive, hidden_acc)
+
+    hidden = torch.clamp(hidden_acc + b1.to(torch.int64).unsqueeze(0), min=0, max=0x7FFF)
+    products = wrap_s16_tensor((hidden.unsqueeze(2) * w2.to(torch.int64).unsqueeze(0)) >> Q8_8_SHIFT)
+    logits_acc = products.sum(dim=1)
+    certified &= _unsaturated(torch.clamp(products, min=0).sum(dim=1), logits_acc)
+
+    logits = torch.clamp(logits_acc + b2.to(torch.int64).unsqueeze(0), min=-0x8000, max=0x7FFF).to(torch.int32)
+    fallback = torch.nonzero(~certified).flatten()
+    if fallback.numel():
+        logits[fallback] = exact_q8_8_sparse_inference(bits_batch[fallback], w1, b1, w2, b2)
+    if stats is not None:
+        stats["rows"] = stats.get("rows", 0) + int(bits_batch.shape[0])
+        stats["fast_path_rows"] = stats.get("fast_path_rows", 0) + int(bits_batch.shape[0] - fallback.numel())
+    return logits
+
+
+def evaluate_exact_q8_8_parameters(
+    parameters: tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor],
+    batches: Iterable[tuple[torch.Tensor, torch.Tensor]],
+    stats: dict[str, int] | None = None,
 ) -> float:
-    w1, b1, w2, b2 = extract_quantized_parameters(model)
+    w1, b1, w2, b2 = parameters
     correct = 0
     total = 0
 
-    for batch_x, batch_y in data_loader:
-        logits = exact_q8_8_batch_inference(batch_x, w1, b1, w2, b2)
+    for batch_x, batch_y in batches:
+        logits = exact_q8_8_batch_inference(batch_x, w1, b1, w2, b2, stats)
         predictions = torch.argmax(logits, dim=1)
         correct += int((predictions == batch_y.to(torch.int64)).sum().item())
         total += int(batch_y.shape[0])
@@ -663,17 +1385,58 @@ def evaluate_exact_q8_8_accuracy(
     return (correct / total) if total else 0.0
 
 
+def evaluate_exact_q8_8_accuracy(
+    model: QuantizedMnistMLP,
+    batches: Iterable[tuple[torch.Tensor, torch.Tensor]],
+    stats: dict[str, int] | None = None,
+) -> float:
+    return evaluate_exact_q8_8_parameters(extract_quantized_parameters(model), batches, stats)
+
+
+@dataclass
+class PendingEvaluation:
+    epoch: int
+    loss: float
+    state: dict[str, torch.Tensor]
+    stats: dict[str, int]
+    accuracy: Future[float]
+
+
+CHECKPOINT_FILE = "checkpoint.pt"
+
+
+def save_training_checkpoint(path: Path, checkpoint: dict[str, object]) -> None:
+    # Written beside the target and renamed, so a crash mid-save keeps the previous checkpoint.
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(f"{path.name}.partial")
+    torch.save(checkpoint, partial)
+    partial.replace(path)
+
+
 def train_model(
     model: QuantizedMnistMLP,
     train_loader: DataLoader[tuple[torch.Tensor, torch.Tensor]],
-    train_dataset: SpectrumBinaryMnistDataset,
-    test_loader: DataLoader[tuple[torch.Tensor, torch.Tensor]],
+    train_dataset: SpectrumBinaryMnistDataset | MaterializedAugmentDataset,
+    eval_batches: list[tuple[torch.Tensor, torch.Tensor]],
     *,
     epochs: int,
     learning_rate: float,
     weight_decay: float,
     device: torch.device,
+    async_eval: bool = False,
+    checkpoint_dir: Path | None = None,
+    checkpoint_interval: int = 1,
+    resume: bool = False,
+    patience: int = 0,
+    min_delta: float = 0.0,
 ) -> tuple[QuantizedMnistMLP, float]:
+    if checkpoint_interval <= 0:
+        raise ValueError("checkpoint_interval must be positive")
+    if patience < 0:
+        raise ValueError("patience must be non-negative")
+    if resume and checkpoint_dir is None:
+        raise ValueError("resume needs a checkpoint_dir")
+
     optimizer = torch.optim.AdamW(
         model.parameters(),
         lr=learning_rate,
@@ -681,46 +1444,133 @@ def train_model(
     )
     criterion = nn.CrossEntropyLoss()
     model.to(device)
+    sampler_generator = getattr(train_loader.sampler, "generator", None)
 
     best_accuracy = -1.0
     best_state: dict[str, torch.Tensor] | None = None
-
-    for epoch in range(epochs):
-        model.train()
-        train_dataset.set_epoch(epoch)
-        running_loss = 0.0
-        batch_count = 0
-
-        for batch_x, batch_y in train_loader:
-            batch_x = batch_x.to(device)
-            batch_y = batch_y.to(device)
-
-            optimizer.zero_grad(set_to_none=True)
-            logits = model(batch_x)
-            loss = criterion(logits, batch_y)
-            loss.backward()
-            optimizer.step()
-
-            running_loss += float(loss.item())
-            batch_count += 1
-
-        test_accuracy = evaluate_exact_q8_8_accuracy(model, test_loader)
+    stale_epochs = 0
+    stopped = False
+    start_epoch = 0
+    checkpoint_path = None if checkpoint_dir is None else checkpoint_dir / CHECKPOINT_FILE
+    if resume and checkpoint_path is not None and checkpoint_path.is_file():
+        checkpoint = torch.load(checkpoint_path, weights_only=True)
+        if (checkpoint["sampler_rng"] is None) != (sampler_generator is None):
+            raise ValueError(
+                f"checkpoint {checkpoint_path} was saved with a different train loader sampler; "
+                "resume with the same loader settings"
+            )
+        model.load_state_dict(checkpoint["model"])
+        optimizer.load_state_dict(checkpoint["optimizer"])
+        torch.set_rng_state(checkpoint["torch_rng"])
+        if sampler_generator is not None:
+            sampler_generator.set_state(checkpoint["sampler_rng"])
+        train_dataset.set_epoch(checkpoint["dataset_epoch"])
+        best_accuracy = checkpoint["best_accuracy"]
+        best_state = checkpoint["best_state"]
+        stale_epochs = checkpoint["stale_epochs"]
+        stopped = checkpoint["stopped"]
+        start_epoch = checkpoint["next_epoch"]
+
+    # Exact eval scores a snapshot of the quantized parameters. With async_eval it runs on a
+    # background thread while the next epoch trains; results are still merged in epoch order.
+    evaluator = ThreadPoolExecutor(max_workers=1) if async_eval else None
+    pending: deque[PendingEvaluation] = deque()
+
+    def merge(evaluation: PendingEvaluation) -> None:
+        nonlocal best_accuracy, best_state, stale_epochs, stopped
+        test_accuracy = evaluation.accuracy.result()
+        stale_epochs = 0 if test_accuracy > best_accuracy + min_delta else stale_epochs + 1
         if test_accuracy > best_accuracy:
             best_accuracy = test_accuracy
-            best_state = copy.deepcopy(model.state_dict())
+            best_state = evaluation.state
+        stopped = patience > 0 and stale_epochs >= patience
 
         print(
             json.dumps(
                 {
-                    "epoch": epoch + 1,
+                    "epoch": evaluation.epoch + 1,
                     "epochs": epochs,
-                    "loss": (running_loss / batch_count) if batch_count else 0.0,
+                    "exact_eval_fast_path_fraction": evaluation.stats.get("fast_path_rows", 0)
+                    / max(1, evaluation.stats.get("rows", 0)),
+                    "loss": evaluation.loss,
+                    "stopped_early": stopped,
                     "test_accuracy": test_accuracy,
                 },
                 sort_keys=True,
             )
         )
 
+    def merge_pending(wait: bool) -> None:
+        # Once patience runs out, later epochs (already trained under async eval) are dropped
+        # so the outcome matches a synchronous run that stopped at the same epoch.
+        while pending and not stopped and (wait or pending[0].accuracy.done()):
+            merge(pending.popleft())
+        if stopped:
+            pending.clear()
+
+    try:
+        for epoch in range(start_epoch, epochs):
+            if stopped:
+                break
+            model.train()
+            train_dataset.set_epoch(epoch)
+            running_loss = 0.0
+            batch_count = 0
+
+            for batch_x, batch_y in train_loader:
+                batch_x = batch_x.to(device)
+                batch_y = batch_y.to(device)
+
+                optimizer.zero_grad(set_to_none=True)
+                logits = model(batch_x)
+                loss = criterion(logits, batch_y)
+                loss.backward()
+                optimizer.step()
+
+                running_loss += float(loss.item())
+                batch_count += 1
+
+            parameters = extract_quantized_parameters(model)
+            eval_stats: dict[str, int] = {}
+            if evaluator is None:
+                accuracy: Future[float] = Future()
+                accuracy.set_result(evaluate_exact_q8_8_parameters(parameters, eval_batches, eval_stats))
+            else:
+                accuracy = evaluator.submit(evaluate_exact_q8_8_parameters, parameters, eval_batches, eval_stats)
+            pending.append(
+                PendingEvaluation(
+                    epoch=epoch,
+                    loss=(running_loss / batch_count) if batch_count else 0.0,
+                    state=copy.deepcopy(model.state_dict()),
+                    stats=eval_stats,
+                    accuracy=accuracy,
+                )
+            )
+            merge_pending(wait=False)
+
+            if checkpoint_path is not None and ((epoch + 1) % checkpoint_interval == 0 or epoch + 1 == epochs or stopped):
+                merge_pending(wait=True)
+                save_training_checkpoint(
+                    checkpoint_path,
+                    {
+                        "best_accuracy": best_accuracy,
+                        "best_state": best_state,
+                        "dataset_epoch": train_dataset.epoch,
+                        "model": model.state_dict(),
+                        "next_epoch": epoch + 1,
+                        "optimizer": optimizer.state_dict(),
+                        "sampler_rng": None if sampler_generator is None else sampler_generator.get_state(),
+                        "stale_epochs": stale_epochs,
+                        "stopped": stopped,
+                        "torch_rng": torch.get_rng_state(),
+                    },
+                )
+
+        merge_pending(wait=True)
+    finally:
+        if evaluator is not None:
+            evaluator.shutdown(cancel_futures=True)
+
     if best_state is None:
         raise RuntimeError("training did not produce any model state")
 
@@ -729,14 +1579,35 @@ def train_model(
 
 
 def quantize_matrix(matrix: np.ndarray) -> list[list[int]]:
-    return [
-        [quantize_q8_8(float(value)) for value in row]
-        for row in matrix.tolist()
-    ]
+    quantized, _, _ = quantize_q8_8_array(matrix)
+    return quantized.tolist()
 
 
 def quantize_vector(vector: np.ndarray) -> list[int]:
-    return [quantize_q8_8(float(value)) for value in vector.tolist()]
+    quantized, _, _ = quantize_q8_8_array(vector)
+    return quantized.tolist()
+
+
+def quantize_model_parameters(
+    model: QuantizedMnistMLP,
+) -> tuple[dict[str, np.ndarray], dict[str, dict[str, int]]]:
+    tensors = {
+        "w1": model.fc1.weight.transpose(0, 1),
+        "b1": model.fc1.bias,
+        "w2": model.fc2.weight.transpose(0, 1),
+        "b2": model.fc2.bias,
+    }
+    quantized: dict[str, np.ndarray] = {}
+    saturation: dict[str, dict[str, int]] = {}
+    for name, tensor in tensors.items():
+        values, saturated_high, saturated_low = quantize_q8_8_array(tensor)
+        quantized[name] = values
+        saturation[name] = {
+            "saturated_high": saturated_high,
+            "saturated_low": saturated_low,
+            "values": int(values.size),
+        }
+    return quantized, saturation
 
 
 def write_memh(path: Path, values: list[int]) -> None:
@@ -803,6 +1674,37 @@ def run_quantized_inference(
     return hidden_values, logits, prediction
 
 
+def run_sparse_binary_inference(
+    bits: list[int],
+    w1: list[list[int]],
+    b1: list[int],
+    w2: list[list[int]],
+    b2: list[int],
+) -> tuple[list[int], list[int], int]:
+    # Same results as run_quantized_inference: q8_8_mul(0x0100, w) is wrap_s16(w) and zero products
+    # never move a saturating accumulator, so only lit pixels and nonzero hidden units are visited.
+    active_rows = [w1[input_index] for input_index, bit in enumerate(bits) if bit]
+
+    hidden_values: list[int] = []
+    for hidden_index in range(len(b1)):
+        acc = 0
+        for row in active_rows:
+            acc = sat_add16(acc, wrap_s16(row[hidden_index]))
+        biased = sat_add16(acc, b1[hidden_index])
+        hidden_values.append(max(0, biased))
+
+    active_hidden = [(value, w2[hidden_index]) for hidden_index, value in enumerate(hidden_values) if value]
+    logits: list[int] = []
+    for output_index in range(len(b2)):
+        acc = 0
+        for value, row in active_hidden:
+            acc = sat_add16(acc, q8_8_mul(value, row[output_index]))
+        logits.append(sat_add16(acc, b2[output_index]))
+
+    prediction = int(np.argmax(np.array(logits, dtype=np.int64)))
+    return hidden_values, logits, prediction
+
+
 def export_model(
     model: QuantizedMnistMLP,
     output_dir: Path,
@@ -824,18 +1726,22 @@ def export_model(
     learning_rate: float,
     weight_decay: float,
     epochs: int,
+    sampling_policy: dict[str, object],
 ) -> None:
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    q_w1, q_b1, q_w2, q_b2 = extract_quantized_parameters(model)
-    w1 = q_w1.to(torch.int32).tolist()
-    b1 = q_b1.to(torch.int32).tolist()
-    w2 = q_w2.to(torch.int32).tolist()
-    b2 = q_b2.to(torch.int32).tolist()
+    quantized, saturation = quantize_model_parameters(model)
+    w1 = quantized["w1"].tolist()
+    b1 = quantized["b1"].tolist()
+    w2 = quantized["w2"].tolist()
+    b2 = quantized["b2"].tolist()
 
-    write_memh(output_dir / "w1_tiled_q8_8.memh", flatten_weights_for_tiles(w1, tile_width))
+    w1_tiled = tile_weight_matrix(quantized["w1"], tile_width)
+    w2_tiled = tile_weight_matrix(quantized["w2"], tile_width)
+
+    write_memh(output_dir / "w1_tiled_q8_8.memh", w1_tiled.tolist())
     write_memh(output_dir / "b1_q8_8.memh", b1)
-    write_memh(output_dir / "w2_tiled_q8_8.memh", flatten_weights_for_tiles(w2, tile_width))
+    write_memh(output_dir / "w2_tiled_q8_8.memh", w2_tiled.tolist())
     write_memh(output_dir / "b2_q8_8.memh", b2)
 
     sample_bytes = list(pack_binary_image(sample_bits))
@@ -854,38 +1760,48 @@ def export_model(
     (output_dir / "sample_expected_prediction_0.txt").write_text(f"{prediction}\n", encoding="ascii")
     (output_dir / "sample_label_0.txt").write_text(f"{sample_label}\n", encoding="ascii")
 
-    write_summary(
-        output_dir / "summary.json",
+    summary = {
+        "accuracy": accuracy,
+        "augment_copies": augment_copies,
+        "augment_levels": len(augment_strengths),
+        "augment_mode": augment_mode,
+        "augment_strengths": augment_strengths,
+        "effective_train_samples": effective_train_samples,
+        "epochs": epochs,
+        "eval_threshold": eval_threshold,
+        "hidden_size": len(b1),
+        "input_size": len(w1),
+        "learning_rate": learning_rate,
+        "optimizer": "adamw",
+        "output_size": len(b2),
+        "q8_8_aware_training": True,
+        "q8_8_saturation": saturation,
+        "sampling": sampling_policy,
+        "split_mode": split_mode,
+        "test_class_counts": test_class_counts,
+        "test_limit": test_limit,
+        "threshold_values": threshold_values,
+        "tile_width": tile_width,
+        "train_class_counts": train_class_counts,
+        "train_limit": train_limit,
+        "training_backend": "pytorch",
+        "weight_decay": weight_decay,
+    }
+    write_summary(output_dir / "summary.json", summary)
+    write_model_container(
+        output_dir / MODEL_CONTAINER_NAME,
         {
-            "accuracy": accuracy,
-            "augment_copies": augment_copies,
-            "augment_levels": len(augment_strengths),
-            "augment_mode": augment_mode,
-            "augment_strengths": augment_strengths,
-            "effective_train_samples": effective_train_samples,
-            "epochs": epochs,
-            "eval_threshold": eval_threshold,
-            "hidden_size": len(b1),
-            "input_size": len(w1),
-            "learning_rate": learning_rate,
-            "optimizer": "adamw",
-            "output_size": len(b2),
-            "q8_8_aware_training": True,
-            "split_mode": split_mode,
-            "test_class_counts": test_class_counts,
-            "test_limit": test_limit,
-            "threshold_values": threshold_values,
-            "tile_width": tile_width,
-            "train_class_counts": train_class_counts,
-            "train_limit": train_limit,
-            "training_backend": "pytorch",
-            "weight_decay": weight_decay,
+            "w1_tiled": w1_tiled,
+            "b1": quantized["b1"],
+            "w2_tiled": w2_tiled,
+            "b2": quantized["b2"],
         },
+        (output_dir / "summary.json").read_bytes(),
     )
 
 
-def main() -> None:
-    args = parse_args()
+def main(argv: Sequence[str] | None = None) -> None:
+    args = parse_args(argv)
     threshold_values, eval_threshold = build_threshold_schedule(args)
     augment_strengths = build_augmentation_strengths(args)
 
@@ -897,8 +1813,19 @@ def main() -> None:
         test_limit=args.test_limit,
         seed=args.seed,
         split_mode=args.split_mode,
+        cache_dir=args.mnist_cache_dir,
     )
 
+    affine_cache = None
+    if args.affine_cache_size > 0:
+        angle_step, scale_step, shear_step = (float(value) for value in args.affine_cache_steps.split(","))
+        affine_cache = AffineGatherCache(
+            max_entries=args.affine_cache_size,
+            angle_step=angle_step,
+            scale_step=scale_step,
+            shear_step=shear_step,
+        )
+
     train_dataset = SpectrumBinaryMnistDataset(
         raw_x=train_x,
         raw_y=train_y,
@@ -908,7 +1835,31 @@ def main() -> None:
         threshold_values=threshold_values,
         augment_strengths=augment_strengths,
         seed=args.seed + 101,
+        bit_cache_dir=args.bit_cache_dir,
+        affine_cache=affine_cache,
+        sampling_mode=args.sampling_mode,
+        samples_per_epoch=args.samples_per_epoch or None,
+        threshold_weights=[float(value) for value in args.threshold_weights.split(",") if value],
+        strength_weights=[float(value) for value in args.strength_weights.split(",") if value],
     )
+    if args.materialize_epochs > 0:
+        if args.augment_shard_dir is None:
+            raise ValueError("--materialize-epochs needs --augment-shard-dir")
+        manifest = materialize_augment_shards(
+            train_dataset,
+            args.augment_shard_dir,
+            args.materialize_epochs,
+            jobs=args.materialize_jobs,
+        )
+        print(json.dumps(manifest, sort_keys=True))
+        return
+
+    train_source: SpectrumBinaryMnistDataset | MaterializedAugmentDataset = train_dataset
+    if args.augment_shard_dir is not None:
+        train_source = MaterializedAugmentDataset(args.augment_shard_dir, train_dataset.augmentation_key())
+        if train_source.epochs < args.max_iter:
+            raise ValueError(f"shards hold {train_source.epochs} epochs, --max-iter asks for {args.max_iter}")
+
     test_dataset = SpectrumBinaryMnistDataset(
         raw_x=test_x,
         raw_y=test_y,
@@ -918,22 +1869,17 @@ def main() -> None:
         threshold_values=[eval_threshold],
         augment_strengths=[0.0],
         seed=args.seed + 202,
+        bit_cache_dir=args.bit_cache_dir,
     )
 
-    train_loader = DataLoader(
-        train_dataset,
-        batch_size=args.batch_size,
-        shuffle=True,
-        num_workers=0,
-        drop_last=False,
-    )
-    test_loader = DataLoader(
-        test_dataset,
+    train_loader = build_train_loader(
+        train_source,
         batch_size=args.batch_size,
-        shuffle=False,
-        num_workers=0,
-        drop_last=False,
+        seed=args.seed,
+        num_workers=args.num_workers,
+        prefetch_factor=args.prefetch_factor,
     )
+    eval_batches = test_dataset.materialize_batches(args.batch_size)
 
     model = QuantizedMnistMLP(
         input_size=IMAGE_PIXELS,
@@ -945,21 +1891,31 @@ def main() -> None:
     model, accuracy = train_model(
         model=model,
         train_loader=train_loader,
-        train_dataset=train_dataset,
-        test_loader=test_loader,
+        train_dataset=train_source,
+        eval_batches=eval_batches,
         epochs=args.max_iter,
         learning_rate=args.learning_rate,
         weight_decay=args.weight_decay,
         device=device,
+        async_eval=args.async_eval,
+        checkpoint_dir=args.checkpoint_dir,
+        checkpoint_interval=args.checkpoint_interval,
+        resume=args.resume,
+        patience=args.patience,
+        min_delta=args.min_delta,
     )
 
-    sample_bits = binarize_grayscale(test_x[0], eval_threshold).astype(np.int64).tolist()
+    sample_bits = binarize_grayscale(test_x[0], grayscale_threshold_raw(eval_threshold)).astype(np.int64).tolist()
     sample_label = int(test_y[0])
     effective_train_samples = int(len(train_dataset))
-    effective_train_counts = scale_class_counts(
-        train_counts,
-        len(threshold_values) * len(augment_strengths) * (args.augment_copies + 1),
-    )
+    if args.sampling_mode == "stochastic":
+        # Each epoch deals its own base samples; report the first one's class mix.
+        effective_train_counts = summarize_class_counts(train_dataset.item_labels(0), 10)
+    else:
+        effective_train_counts = scale_class_counts(
+            train_counts,
+            len(threshold_values) * len(augment_strengths) * (args.augment_copies + 1),
+        )
 
     export_model(
         model=model,
@@ -982,12 +1938,16 @@ def main() -> None:
         learning_rate=args.learning_rate,
         weight_decay=args.weight_decay,
         epochs=args.max_iter,
+        sampling_policy=train_dataset.sampling_policy(),
     )
 
+    # Workers hold their own copies of the cache, so only single-process runs can report it.
+    affine_cache_stats = affine_cache.stats() if affine_cache is not None and args.num_workers == 0 else None
     print(
         json.dumps(
             {
                 "accuracy": float(accuracy),
+                "affine_cache": affine_cache_stats,
                 "augment_copies": args.augment_copies,
                 "augment_levels": len(augment_strengths),
                 "augment_mode": args.augment_mode,
@@ -1000,6 +1960,7 @@ def main() -> None:
                 "optimizer": "adamw",
                 "output_dir": str(args.output_dir),
                 "q8_8_aware_training": True,
+                "sampling": train_dataset.sampling_policy(),
                 "split_mode": args.split_mode,
                 "test_class_counts": test_counts,
                 "test_limit": args.test_limit,